@@ -0,0 +1,161 @@
+"""
+Unification of one literal against many candidate literals at once.
+
+The top symbols of the arguments of the candidates are kept in columns of
+integers, so most candidates that can't unify with a query are filtered
+out by comparing columns, before a single unification is tried. The
+columns are compared with NumPy when it's installed, and with plain
+Python otherwise.
+"""
+from array import array
+
+from index import symbol
+from sentence import Not
+from substitution import Bindings
+from unification import unify
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The code of a Variable in the columns
+VARIABLE = -1
+# The code of a symbol of a query that no candidate has
+UNKNOWN = -2
+
+
+class LiteralBatch(object):
+    """
+    A list of literals that are unified with queries as a whole.
+
+    Each literal gets the code of its sign and predicate, and the codes of
+    the top symbols of its arguments, one column per argument position.
+    The literals of each predicate are listed apart, and a query is only
+    compared with the column entries of those literals: entries that are
+    neither a Variable nor the symbol of the query at that position rule a
+    literal out. The others are unified with the query one by one, with
+    one Bindings that is undone after each of them.
+
+    With the backend 'numpy' the columns are compared as NumPy arrays, and
+    with 'array' in Python loops. The default is 'numpy' if it's installed.
+    """
+    BACKENDS = ('numpy', 'array')
+
+    def __init__(self, literals=(), backend=None):
+        if backend is None:
+            backend = 'array' if numpy is None else 'numpy'
+        if backend not in self.BACKENDS:
+            raise ValueError("Unknown backend: {}".format(backend))
+        if backend == 'numpy' and numpy is None:
+            raise ValueError("The numpy backend needs NumPy")
+        self.backend = backend
+        self.literals = []
+        # The code of each symbol, and of each sign and predicate
+        self.codes = {}
+        # The positions of the literals of each predicate code
+        self.predicates = {}
+        self.columns = []
+        # The columns and predicate positions as NumPy arrays, while no
+        # literal is appended
+        self.arrays = None
+        for literal in literals:
+            self.append(literal)
+
+    def __len__(self):
+        return len(self.literals)
+
+    def __getitem__(self, i):
+        return self.literals[i]
+
+    def __iter__(self):
+        return iter(self.literals)
+
+    def _code(self, key):
+        return self.codes.setdefault(key, len(self.codes))
+
+    def append(self, literal):
+        """Add a literal and return its position"""
+        position = len(self.literals)
+        negated = isinstance(literal, Not)
+        atom = literal.content[0] if negated else literal
+        predicate = self._code((negated, symbol(atom)))
+        self.predicates.setdefault(predicate, array('q')).append(position)
+        while len(self.columns) < len(atom.content):
+            # Earlier literals have no argument at this position
+            self.columns.append(array('i', [VARIABLE]) * position)
+        for i, column in enumerate(self.columns):
+            if i < len(atom.content):
+                key = symbol(atom.content[i])
+                column.append(
+                    VARIABLE if key is None else self._code(key)
+                )
+            else:
+                column.append(VARIABLE)
+        self.literals.append(literal)
+        self.arrays = None
+        return position
+
+    def _query(self, literal):
+        """Get the predicate code and the argument codes of a query"""
+        negated = isinstance(literal, Not)
+        atom = literal.content[0] if negated else literal
+        predicate = self.codes.get((negated, symbol(atom)))
+        codes = []
+        for cont in atom.content:
+            key = symbol(cont)
+            codes.append(
+                VARIABLE if key is None else self.codes.get(key, UNKNOWN)
+            )
+        return predicate, codes
+
+    def candidates(self, literal):
+        """
+        Get the positions of the literals with the same sign that might
+        unify with literal, in increasing order.
+        """
+        predicate, codes = self._query(literal)
+        if predicate not in self.predicates:
+            return []
+        if self.backend == 'numpy':
+            return self._candidates_numpy(predicate, codes)
+        positions = self.predicates[predicate]
+        for column, code in zip(self.columns, codes):
+            if code != VARIABLE:
+                positions = [
+                    i for i in positions
+                    if column[i] == code or column[i] == VARIABLE
+                ]
+        return list(positions)
+
+    def _candidates_numpy(self, predicate, codes):
+        if self.arrays is None:
+            self.arrays = (
+                [numpy.array(column, dtype=numpy.int32)
+                 for column in self.columns],
+                {code: numpy.array(positions, dtype=numpy.int64)
+                 for code, positions in self.predicates.items()}
+            )
+        columns, predicates = self.arrays
+        positions = predicates[predicate]
+        for column, code in zip(columns, codes):
+            if code != VARIABLE:
+                entries = column[positions]
+                positions = positions[
+                    (entries == code) | (entries == VARIABLE)
+                ]
+        return positions.tolist()
+
+    def unifiers(self, literal):
+        """
+        Get the position and the most general unifier, a Substitution, of
+        each literal with the same sign that unifies with literal. The
+        literals must not share Variables with literal.
+        """
+        bindings = Bindings()
+        unifiers = []
+        for i in self.candidates(literal):
+            if unify(literal, self.literals[i], bindings) is not None:
+                unifiers.append((i, bindings.substitution()))
+                bindings.undo()
+        return unifiers
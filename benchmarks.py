@@ -0,0 +1,356 @@
+#! /usr/bin/env python3
+"""
+Benchmarks on synthetic problems that scale with a size.
+
+Run this file to measure all benchmarks, save the results as JSON and
+compare them to an earlier run:
+
+    python3 benchmarks.py --save new.json --compare old.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from time import perf_counter
+
+from batch import LiteralBatch
+from resolution import prove
+from sentence import (
+    Variable, Function, Predicate, Not, And, Or, Implies, ForAll, Exists,
+    cnf_cache
+)
+from substitution import Substitution
+from unification import unify, variables
+
+# Generators
+
+
+def nested_quantifiers(depth):
+    """
+    Get a sentence with depth alternating quantifiers, each over an
+    implication from the quantified Variable to the rest, and a
+    disjunction. Its size and number of clauses grow linearly with depth.
+    """
+    variables = [Variable('x' + str(i)) for i in range(depth)]
+    sentence = Predicate('P', *variables) if variables else Predicate('P')
+    for i in range(depth - 1, -1, -1):
+        x = variables[i]
+        body = And(
+            Implies(Predicate('Q' + str(i), x), sentence),
+            Or(Predicate('R' + str(i), x), Predicate('S' + str(i), x))
+        )
+        sentence = (ForAll if i % 2 == 0 else Exists)(x, body)
+    return sentence
+
+
+def variable_chain(length):
+    """
+    Get two Predicates that unify by binding each of length Variables to the
+    next, and the last one to a constant.
+    """
+    variables = [Variable('x' + str(i)) for i in range(length)]
+    return (
+        Predicate('P', *variables),
+        Predicate('P', *(variables[1:] + ['a']))
+    )
+
+
+def wide_term(width, depth):
+    """
+    Get a Function term in which every Function has width arguments, nested
+    depth deep, with Variables at the bottom, and the same term with
+    constants instead of Variables.
+    """
+    terms = [Variable('x' + str(i)) for i in range(width)]
+    constants = ['c' + str(i) for i in range(width)]
+    for level in range(depth):
+        name = 'F' + str(level)
+        terms = [Function(name, *terms)] * width
+        constants = [Function(name, *constants)] * width
+    return terms[0], constants[0]
+
+
+def pigeonhole(holes):
+    """
+    Get the axioms that holes + 1 pigeons sit in holes holes, without two
+    pigeons in one hole. They are inconsistent.
+    """
+    pigeons = range(holes + 1)
+    axioms = [
+        Or(*(Predicate('In', 'p' + str(p), 'h' + str(h))
+             for h in range(holes)))
+        for p in pigeons
+    ]
+    for h in range(holes):
+        for p in pigeons:
+            for q in range(p + 1, holes + 1):
+                axioms.append(Not(And(
+                    Predicate('In', 'p' + str(p), 'h' + str(h)),
+                    Predicate('In', 'p' + str(q), 'h' + str(h))
+                )))
+    return axioms
+
+
+def transitive_chain(length):
+    """
+    Get the axioms of a transitive relation with a chain of length steps,
+    and the goal that the ends of the chain are related.
+    """
+    x, y, z = Variable('x'), Variable('y'), Variable('z')
+    axioms = [ForAll(x, ForAll(y, ForAll(z, Implies(
+        And(Predicate('R', x, y), Predicate('R', y, z)), Predicate('R', x, z)
+    ))))]
+    axioms.extend(
+        Predicate('R', 'c' + str(i), 'c' + str(i + 1)) for i in range(length)
+    )
+    return axioms, Predicate('R', 'c0', 'c' + str(length))
+
+
+def candidate_literals(count):
+    """
+    Get count literals of three predicates over varied terms, and a query
+    literal that unifies with some of them.
+    """
+    x = Variable('x')
+    literals = []
+    for i in range(count):
+        term = 'c' + str(i % 7)
+        for j in range(i % 4):
+            term = Function('F' + str((i + j) % 3), term, 'c' + str(j))
+        argument = x if i % 5 == 0 else Function('G', 'c' + str(i % 3))
+        literals.append(Predicate('P' + str(i % 3), term, argument))
+    y, z = Variable('y'), Variable('z')
+    return literals, Predicate('P0', Function('F1', y, 'c1'), z)
+
+
+# Benchmarks
+# Each takes a size and returns a function that runs the workload once.
+
+
+def bench_cnf(size):
+    sentence = nested_quantifiers(size)
+
+    def run():
+        # Convert from scratch every time
+        cnf_cache.clear()
+        return sentence.cnf()
+    return run
+
+
+def bench_cnf_definitional(size):
+    sentence = nested_quantifiers(size)
+
+    def run():
+        cnf_cache.clear()
+        return sentence.cnf('definitional')
+    return run
+
+
+def bench_clauses(size):
+    sentence = nested_quantifiers(size)
+
+    def run():
+        cnf_cache.clear()
+        return sentence.clauses()
+    return run
+
+
+def bench_substitution(size):
+    variables = [Variable('x' + str(i)) for i in range(size + 1)]
+    pairs = list(zip(variables, variables[1:]))
+    return lambda: Substitution(pairs)
+
+
+def bench_substitute(size):
+    term, _ = wide_term(4, size)
+    atom = Predicate('P', term)
+    substitution = Substitution(
+        {x: 'c' + x.name[1:] for x in variables(term)}
+    )
+    return lambda: atom.substitute(substitution)
+
+
+def bench_unify_chain(size):
+    left, right = variable_chain(size)
+    return lambda: unify(left, right)
+
+
+def bench_unify_wide(size):
+    left, right = wide_term(4, size)
+    left, right = Predicate('P', left), Predicate('P', right)
+    return lambda: unify(left, right)
+
+
+def bench_unify_batch(size):
+    literals, query = candidate_literals(size)
+    batch = LiteralBatch(literals)
+    return lambda: batch.unifiers(query)
+
+
+def bench_pigeonhole(size):
+    axioms = pigeonhole(size)
+    return lambda: prove(axioms, max_inferences=100000)
+
+
+def bench_transitive(size):
+    axioms, goal = transitive_chain(size)
+    return lambda: prove(axioms, goal, max_inferences=100000)
+
+
+# The name, function and default sizes of each benchmark
+BENCHMARKS = {
+    'cnf': (bench_cnf, (4, 16, 64)),
+    'cnf_definitional': (bench_cnf_definitional, (4, 16, 64)),
+    'clauses': (bench_clauses, (4, 16, 64)),
+    'substitution': (bench_substitution, (10, 50, 200)),
+    'substitute': (bench_substitute, (2, 4, 6)),
+    'unify_chain': (bench_unify_chain, (10, 100, 1000)),
+    'unify_wide': (bench_unify_wide, (2, 4, 6)),
+    'unify_batch': (bench_unify_batch, (100, 1000, 10000)),
+    'pigeonhole': (bench_pigeonhole, (1, 2)),
+    'transitive': (bench_transitive, (1, 2, 3)),
+}
+
+# Measurement
+
+
+def percentile(sorted_values, fraction):
+    """Get the value below which fraction of sorted_values lie"""
+    if not sorted_values:
+        return 0.
+    position = fraction * (len(sorted_values) - 1)
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + \
+        (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def measure(run, repeat=5, min_seconds=0.):
+    """
+    Call run at least repeat times, and until min_seconds have passed.
+
+    Return the number of runs, their total seconds, the runs per second,
+    latency percentiles in seconds, and the peak memory in bytes that one
+    more run allocated, which is traced separately so the tracing doesn't
+    slow down the timed runs.
+    """
+    latencies = []
+    start = perf_counter()
+    while len(latencies) < repeat or perf_counter() - start < min_seconds:
+        before = perf_counter()
+        run()
+        latencies.append(perf_counter() - before)
+    total = sum(latencies)
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    run()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    if not tracing:
+        tracemalloc.stop()
+    latencies.sort()
+    return {
+        'runs': len(latencies),
+        'seconds': total,
+        'throughput': len(latencies) / total if total else float('inf'),
+        'p50': percentile(latencies, .5),
+        'p90': percentile(latencies, .9),
+        'p99': percentile(latencies, .99),
+        'max': latencies[-1],
+        'peak_memory': peak,
+    }
+
+
+def run_suite(names=None, sizes=None, repeat=5, min_seconds=0., out=None):
+    """
+    Measure the benchmarks with the given names, all by default, at the
+    given sizes or their default sizes. Return the results by
+    "name/size", and print a line for each to out if it's given.
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        bench, default_sizes = BENCHMARKS[name]
+        for size in sizes or default_sizes:
+            key = "{}/{}".format(name, size)
+            results[key] = stats = measure(bench(size), repeat, min_seconds)
+            if out is not None:
+                print("{:24} {:>9.1f}/s  p50 {:>9.3f}ms  p99 {:>9.3f}ms  "
+                      "peak {:>8.1f}KiB".format(
+                          key, stats['throughput'], stats['p50'] * 1e3,
+                          stats['p99'] * 1e3, stats['peak_memory'] / 1024
+                      ), file=out)
+    return results
+
+
+def save(results, path):
+    """Store results as JSON, with the Python version and the time"""
+    with open(path, 'w') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    """Get the results stored in path by save()"""
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(old, new, threshold=.1, metrics=('p50', 'peak_memory')):
+    """
+    Get the regressions from old to new results: the key, metric, old and
+    new value of each metric that grew by more than threshold, as a
+    fraction. Benchmarks that are in only one of them are ignored.
+    """
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        for metric in metrics:
+            before, after = old[key][metric], new[key][metric]
+            if after > before * (1 + threshold):
+                regressions.append((key, metric, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('names', nargs='*',
+                        help="benchmarks to run, all by default: " +
+                        ", ".join(BENCHMARKS))
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help="sizes instead of the default ones")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="minimal number of runs")
+    parser.add_argument('--min-seconds', type=float, default=0.,
+                        help="minimal time spent on each benchmark")
+    parser.add_argument('--save', help="store the results as JSON")
+    parser.add_argument('--compare',
+                        help="compare to results stored with --save")
+    parser.add_argument('--threshold', type=float, default=.1,
+                        help="relative growth counted as a regression")
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error("Unknown benchmark: {}".format(name))
+    results = run_suite(
+        args.names, args.sizes, args.repeat, args.min_seconds, sys.stdout
+    )
+    if args.save:
+        save(results, args.save)
+    if args.compare:
+        regressions = compare(load(args.compare), results, args.threshold)
+        for key, metric, before, after in regressions:
+            print("Regression in {} {}: {:.6g} -> {:.6g}".format(
+                key, metric, before, after
+            ))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
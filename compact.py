@@ -0,0 +1,175 @@
+from array import array
+
+from sentence import Equality, Function, Not, Predicate, Variable
+
+PREDICATE = 0
+FUNCTION = 1
+CONSTANT = 2
+EQUALITY = 3
+
+
+class Signature(object):
+    """
+    A table that numbers symbols: each distinct kind, name and arity of a
+    predicate, function or constant gets its own small integer.
+    """
+
+    def __init__(self, symbols=()):
+        self.symbols = []
+        self.numbers = {}
+        for symbol in symbols:
+            self.number(*symbol)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __getitem__(self, number):
+        """Get the kind, name and arity of a symbol"""
+        return self.symbols[number]
+
+    def __getstate__(self):
+        # The numbers follow from the order of the symbols
+        return self.symbols
+
+    def __setstate__(self, symbols):
+        self.__init__(symbols)
+
+    def number(self, kind, name, arity=0):
+        """Get the number of a symbol, adding it if it's new"""
+        symbol = (kind, name, arity)
+        number = self.numbers.get(symbol)
+        if number is None:
+            number = self.numbers[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return number
+
+
+def encode(literals, signature, data=None):
+    """
+    Append the encoding of a clause to data, an array('i'), and return it.
+
+    Each literal is its Predicate number, or the bitwise inverse of that
+    number when it's negated, followed by the arguments in preorder.
+    Functions and constants are their symbol numbers and Variables are the
+    bitwise inverse of the order in which they first occur, so clauses that
+    only differ in their Variables usually encode the same.
+    """
+    if data is None:
+        data = array('i')
+    variables = {}
+    encoded = []
+    for lit in literals:
+        negated = isinstance(lit, Not)
+        atom = lit.content[0] if negated else lit
+        kind = EQUALITY if isinstance(atom, Equality) else PREDICATE
+        number = signature.number(kind, atom.name, len(atom.content))
+        codes = [~number if negated else number]
+        stack = list(reversed(atom.content))
+        while stack:
+            term = stack.pop()
+            if isinstance(term, Variable):
+                codes.append(term)
+            elif isinstance(term, Function):
+                codes.append(signature.number(
+                    FUNCTION, term.name, len(term.content)
+                ))
+                stack.extend(reversed(term.content))
+            else:
+                codes.append(signature.number(CONSTANT, term))
+        encoded.append(codes)
+    # Order the literals ignoring their Variables, then number the Variables
+    encoded.sort(key=lambda codes: [
+        -1 if isinstance(code, Variable) else code for code in codes
+    ])
+    for codes in encoded:
+        for code in codes:
+            if isinstance(code, Variable):
+                code = ~variables.setdefault(code, len(variables))
+            data.append(code)
+    return data
+
+
+def decode(data, signature, start=0, end=None):
+    """
+    Get the literals of a clause encoded in data[start:end], with fresh
+    Variables.
+    """
+    if end is None:
+        end = len(data)
+    variables = {}
+    literals = []
+    i = start
+    while i < end:
+        code = data[i]
+        negated = code < 0
+        atom_kind, name, arity = signature[~code if negated else code]
+        # Each frame is the name, arity and arguments read so far of a term
+        frames = [[name, arity, []]]
+        i += 1
+        while True:
+            name, arity, arguments = frames[-1]
+            if len(arguments) == arity:
+                frames.pop()
+                if not frames:
+                    break
+                frames[-1][2].append(Function(name, *arguments))
+                continue
+            code = data[i]
+            i += 1
+            if code < 0:
+                variable = variables.get(code)
+                if variable is None:
+                    variable = variables[code] = Variable("x" + str(~code))
+                arguments.append(variable)
+                continue
+            kind, name, arity = signature[code]
+            if kind == CONSTANT:
+                arguments.append(name)
+            else:
+                frames.append([name, arity, []])
+        if atom_kind == EQUALITY:
+            atom = Equality(*arguments)
+        else:
+            atom = Predicate(name, *arguments)
+        literals.append(Not(atom) if negated else atom)
+    return literals
+
+
+class ClauseArray(object):
+    """
+    A list of clauses, all encoded in one flat array of integers.
+
+    Clauses are converted from and to lists of literals on the way in and
+    out. Use raw() to copy or compare clauses without decoding them.
+    """
+
+    def __init__(self, signature=None, clauses=()):
+        self.signature = Signature() if signature is None else signature
+        self.data = array('i')
+        self.offsets = array('q', [0])
+        for clause in clauses:
+            self.append(clause)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return decode(
+            self.data, self.signature, self.offsets[i], self.offsets[i + 1]
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, literals):
+        """Add a clause and return its position"""
+        encode(literals, self.signature, self.data)
+        self.offsets.append(len(self.data))
+        return len(self) - 1
+
+    def raw(self, i):
+        """Get the encoding of a clause"""
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
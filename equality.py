@@ -0,0 +1,165 @@
+"""
+Rules for built-in equality: the positions of subterms in literals, and
+demodulation, the rewriting of terms with oriented unit equalities.
+"""
+from index import DiscriminationTree
+from ordering import GREATER, LESS, KBO
+from sentence import Equality, Function, Not, RecursiveObject, Variable
+from unification import match
+
+
+def subterms(atom):
+    """
+    Get each subterm of the arguments of atom that isn't a Variable, with
+    its path: the positions of the arguments that lead to it.
+    """
+    stack = [(cont, (i, )) for i, cont in enumerate(atom.content)]
+    while stack:
+        term, path = stack.pop()
+        if isinstance(term, Variable):
+            continue
+        yield term, path
+        if isinstance(term, RecursiveObject):
+            stack.extend(
+                (cont, path + (i, )) for i, cont in enumerate(term.content)
+            )
+
+
+def replace(literal, path, term):
+    """Get literal with the subterm of its atom at path replaced by term"""
+    if isinstance(literal, Not):
+        return Not(replace(literal.content[0], path, term))
+    # The objects along the path, then copies of them from the bottom up
+    along = [literal]
+    for i in path[:-1]:
+        along.append(along[-1].content[i])
+    for parent, i in zip(reversed(along), reversed(path)):
+        content = list(parent.content)
+        content[i] = term
+        term = parent.copy(content)
+    return term
+
+
+def instantiate(term, substitution):
+    """Apply a substitution, a dict, to a term"""
+    if isinstance(term, Function):
+        return term.substitute(substitution)
+    return substitution.get(term, term)
+
+
+class Rewriter(object):
+    """
+    A set of rewrite rules, each from a unit equality whose one side is
+    greater than the other one in ordering, a KBO by default.
+
+    The left hand sides are stored in a DiscriminationTree, so only rules
+    that might match a term are ever tried on it. Since every rule makes a
+    term smaller in the ordering, rewriting always ends.
+    """
+
+    def __init__(self, ordering=None):
+        self.ordering = KBO() if ordering is None else ordering
+        self.index = DiscriminationTree()
+
+    def __len__(self):
+        return len(self.index)
+
+    def orient(self, clause):
+        """
+        Get the rule of a clause, its greater side and its smaller side, or
+        None if it's not an orientable unit equality.
+        """
+        if len(clause.literals) != 1:
+            return None
+        lit, = clause.literals
+        if type(lit) is not Equality:
+            return None
+        left, right = lit.content
+        order = self.ordering.compare(left, right)
+        if order == GREATER:
+            return left, right
+        elif order == LESS:
+            return right, left
+        return None
+
+    def add(self, clause):
+        """Add the rule of clause, and return whether it has one"""
+        rule = self.orient(clause)
+        if rule is None:
+            return False
+        self.index.insert(rule[0], rule + (clause, ))
+        return True
+
+    def remove(self, clause):
+        rule = self.orient(clause)
+        if rule is not None:
+            self.index.remove(rule[0], rule + (clause, ))
+
+    def step(self, term):
+        """
+        Rewrite term at the top with a rule. Get the new term and the clause
+        of the rule, or None if no rule applies.
+        """
+        for left, right, clause in self.index.generalisations(term):
+            substitution = match(left, term)
+            if substitution is not None:
+                return instantiate(right, substitution), clause
+        return None
+
+    def normalize(self, term, used):
+        """
+        Get the normal form of term, and add the clauses of the rules that
+        were used to the set used.
+        """
+        # The normal form of each subterm, and the term each subterm was
+        # rewritten to, while that one is normalized
+        root, done, rewritten = term, {}, {}
+        stack = [root]
+        while stack:
+            term = stack[-1]
+            if term in done:
+                stack.pop()
+                continue
+            if term in rewritten:
+                stack.pop()
+                done[term] = done[rewritten.pop(term)]
+                continue
+            if isinstance(term, Variable):
+                stack.pop()
+                done[term] = term
+                continue
+            new = term
+            if isinstance(term, RecursiveObject):
+                todo = [cont for cont in term.content if cont not in done]
+                if todo:
+                    stack.extend(todo)
+                    continue
+                content = [done[cont] for cont in term.content]
+                if content != list(term.content):
+                    new = term.copy(content)
+            step = self.step(new)
+            if step is None:
+                stack.pop()
+                done[term] = new
+                continue
+            rewritten[term], clause = step
+            used.add(clause)
+            stack.append(rewritten[term])
+        return done[root]
+
+    def literals(self, literals, used):
+        """
+        Get the normal forms of literals, and add the clauses of the rules
+        that were used to the set used.
+        """
+        if not len(self):
+            return literals
+        new = []
+        for lit in literals:
+            negated = isinstance(lit, Not)
+            atom = lit.content[0] if negated else lit
+            normal = atom.copy([
+                self.normalize(cont, used) for cont in atom.content
+            ])
+            new.append(Not(normal) if negated else normal)
+        return new
@@ -0,0 +1,212 @@
+from sentence import Variable, RecursiveObject, Not
+
+
+def symbol(term):
+    """
+    Get the key of the top symbol of a term: None for a Variable, the name
+    and arity for a Function or Predicate, and the term itself for constants.
+    """
+    if isinstance(term, Variable):
+        return None
+    elif isinstance(term, RecursiveObject):
+        return (term.name, len(term.content))
+    else:
+        return term
+
+
+def flatten(term):
+    """
+    Get the keys of all subterms of a term in preorder, and for each subterm
+    the position right after it.
+    """
+    keys, arities, stack = [], [], [term]
+    while stack:
+        term = stack.pop()
+        keys.append(symbol(term))
+        if isinstance(term, RecursiveObject):
+            arities.append(len(term.content))
+            stack.extend(reversed(term.content))
+        else:
+            arities.append(0)
+    ends, stack = [0] * len(keys), []
+    for i in range(len(keys) - 1, -1, -1):
+        end = i + 1
+        for _ in range(arities[i]):
+            end = stack.pop()
+        ends[i] = end
+        stack.append(end)
+    return keys, ends
+
+
+class _Node(object):
+    __slots__ = ('arity', 'children', 'values')
+
+    def __init__(self, arity=0):
+        self.arity = arity
+        self.children = {}
+        self.values = set()
+
+
+class DiscriminationTree(object):
+    """
+    An index of terms, which retrieves candidates that might unify with, be
+    a generalisation of, or be an instance of a query term.
+
+    Terms are stored along the path of their symbols in preorder, with all
+    variables sharing one key. Retrieval only looks at symbols, so it may
+    return values for terms that don't actually unify, e.g. because of
+    repeated variables; it never misses one that does.
+    """
+    UNIFIABLE = 'unifiable'
+    GENERALISATIONS = 'generalisations'
+    INSTANCES = 'instances'
+
+    def __init__(self):
+        self.root = _Node()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, term, value):
+        """Store value under term"""
+        node = self.root
+        stack = [term]
+        while stack:
+            term = stack.pop()
+            key = symbol(term)
+            child = node.children.get(key)
+            if child is None:
+                if isinstance(term, RecursiveObject):
+                    child = _Node(len(term.content))
+                else:
+                    child = _Node()
+                node.children[key] = child
+            node = child
+            if isinstance(term, RecursiveObject):
+                stack.extend(reversed(term.content))
+        if value not in node.values:
+            node.values.add(value)
+            self.size += 1
+
+    def remove(self, term, value):
+        """Remove value stored under term, if it's there"""
+        path = [(None, self.root)]
+        for key in flatten(term)[0]:
+            child = path[-1][1].children.get(key)
+            if child is None:
+                return
+            path.append((key, child))
+        node = path[-1][1]
+        if value not in node.values:
+            return
+        node.values.discard(value)
+        self.size -= 1
+        # Prune nodes that lead nowhere anymore
+        for (_, parent), (key, child) in zip(path[-2::-1], path[:0:-1]):
+            if child.values or child.children:
+                break
+            del parent.children[key]
+
+    def retrieve(self, term, mode=UNIFIABLE):
+        """Get the values stored under terms that might match term"""
+        keys, ends = flatten(term)
+        query_variables = mode != self.GENERALISATIONS
+        index_variables = mode != self.INSTANCES
+        n = len(keys)
+        stack = [(self.root, 0)]
+        while stack:
+            node, i = stack.pop()
+            if i == n:
+                yield from node.values
+                continue
+            key = keys[i]
+            if key is None and query_variables:
+                # Skip one whole term in the index
+                for skipped in self._skip(node):
+                    stack.append((skipped, i + 1))
+                continue
+            child = node.children.get(key)
+            if child is not None:
+                stack.append((child, i + 1))
+            if key is not None and index_variables:
+                child = node.children.get(None)
+                if child is not None:
+                    # Skip one whole term in the query
+                    stack.append((child, ends[i]))
+
+    @staticmethod
+    def _skip(node):
+        """Get all nodes exactly one term below node"""
+        stack = [(node, 1)]
+        while stack:
+            node, todo = stack.pop()
+            if todo == 0:
+                yield node
+            else:
+                for child in node.children.values():
+                    stack.append((child, todo - 1 + child.arity))
+
+    def unifiable(self, term):
+        return self.retrieve(term, self.UNIFIABLE)
+
+    def generalisations(self, term):
+        return self.retrieve(term, self.GENERALISATIONS)
+
+    def instances(self, term):
+        return self.retrieve(term, self.INSTANCES)
+
+
+class LiteralIndex(object):
+    """
+    An index of literals, which keeps positive and negated literals in two
+    separate DiscriminationTrees of their Predicates.
+
+    The first level of each tree is the predicate symbol and arity, so
+    literals of other predicates are never even looked at.
+    """
+
+    def __init__(self):
+        self.positive = DiscriminationTree()
+        self.negative = DiscriminationTree()
+
+    def __len__(self):
+        return len(self.positive) + len(self.negative)
+
+    def _tree(self, literal):
+        if isinstance(literal, Not):
+            return self.negative, literal.content[0]
+        else:
+            return self.positive, literal
+
+    def insert(self, literal, value):
+        tree, atom = self._tree(literal)
+        tree.insert(atom, value)
+
+    def remove(self, literal, value):
+        tree, atom = self._tree(literal)
+        tree.remove(atom, value)
+
+    def unifiable(self, literal):
+        """
+        Get the values of literals with the same sign that might unify with
+        literal.
+        """
+        tree, atom = self._tree(literal)
+        return tree.unifiable(atom)
+
+    def generalisations(self, literal):
+        """
+        Get the values of literals with the same sign that might be more
+        general than literal.
+        """
+        tree, atom = self._tree(literal)
+        return tree.generalisations(atom)
+
+    def instances(self, literal):
+        """
+        Get the values of literals with the same sign that might be instances
+        of literal.
+        """
+        tree, atom = self._tree(literal)
+        return tree.instances(atom)
@@ -0,0 +1,107 @@
+"""
+Opt-in counters and timers for the hot paths.
+
+Instrumented code only checks whether current is None before doing anything
+else, so while instrumentation is disabled it costs next to nothing. Enable
+it for a block of code with
+
+    with instrument.collecting() as stats:
+        prove(axioms, goal)
+    print(stats)
+
+The events are:
+
+    unify.success, unify.failure    calls of unification.unify
+    compress.iterations             passes of Substitution._compress
+    cnf.<phase>                     seconds spent in each phase of cnf()
+    cnf.clauses                     seconds spent in clausify()
+    clauses.generated               clauses inferred by a Prover
+    clauses.kept                    clauses added to the passive set
+    clauses.discarded               tautologies and subsumed clauses
+    preprocess.<step>               seconds spent in each preprocessing step
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+# The Stats being collected, or None when instrumentation is disabled
+current = None
+
+
+class Stats(object):
+    """
+    Counters and timers by event name. Every callback is called with the
+    name and the increment or the seconds of each event as it happens.
+    """
+
+    def __init__(self, callbacks=()):
+        self.counters = defaultdict(int)
+        self.timers = defaultdict(float)
+        self.callbacks = list(callbacks)
+
+    def __repr__(self):
+        lines = ["{}: {}".format(name, value)
+                 for name, value in sorted(self.counters.items())]
+        lines.extend("{}: {:.6f}s".format(name, value)
+                     for name, value in sorted(self.timers.items()))
+        return "\n".join(lines)
+
+    def count(self, name, increment=1):
+        self.counters[name] += increment
+        for callback in self.callbacks:
+            callback(name, increment)
+
+    def time(self, name, seconds):
+        self.timers[name] += seconds
+        for callback in self.callbacks:
+            callback(name, seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Time the block of a with statement"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.time(name, perf_counter() - start)
+
+    def reset(self):
+        self.counters.clear()
+        self.timers.clear()
+
+
+def enable(stats=None):
+    """Start collecting into stats, or new Stats, and return them"""
+    global current
+    current = Stats() if stats is None else stats
+    return current
+
+
+def disable():
+    """Stop collecting and return the Stats collected so far"""
+    global current
+    stats, current = current, None
+    return stats
+
+
+@contextmanager
+def collecting(stats=None):
+    """Collect into stats, or new Stats, within a with statement"""
+    global current
+    previous = current
+    try:
+        yield enable(stats)
+    finally:
+        current = previous
+
+
+def timed(name, function, *args):
+    """Call function with args, and time it if instrumentation is enabled"""
+    stats = current
+    if stats is None:
+        return function(*args)
+    start = perf_counter()
+    try:
+        return function(*args)
+    finally:
+        stats.time(name, perf_counter() - start)
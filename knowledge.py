@@ -0,0 +1,169 @@
+from itertools import count
+
+from resolution import Clause, Prover, Result, clausify
+from sentence import Not
+from util import LRUCache
+
+
+class KnowledgeBase(object):
+    """
+    A set of axioms that many goals are proved from.
+
+    Each axiom is clausified once, when it's added, and its clauses join a
+    Prover that saturates the axioms up to presaturation inferences after
+    every change. Each query goes on from a copy of that Prover, so the
+    inferences between axioms are drawn only once for all queries.
+
+    Every clause is supported by the axioms it was derived from. Retracting
+    an axiom only drops the clauses it supports. Proofs and saturations are
+    cached until a change could alter them: adding an axiom keeps the
+    proofs, and retracting one keeps the saturations and the proofs it
+    doesn't support.
+
+    The options are the keyword arguments of Prover.
+    """
+
+    def __init__(self, axioms=(), max_inferences=10000, presaturation=1000,
+                 mode='distributive', cache_size=1024, **options):
+        self.max_inferences = max_inferences
+        self.presaturation = presaturation
+        self.mode = mode
+        self.options = options
+        self.axioms = {}
+        # The input clauses of each axiom
+        self.inputs = {}
+        self.ids = count()
+        # The support of each clause, as a frozenset of axiom ids
+        self.supports = {}
+        self.prover = Prover(max_inferences, **options)
+        # The refutation of the axioms, once they turn out inconsistent
+        self.refutation = None
+        # Whether the Prover got clauses since it last saturated them
+        self.changed = False
+        self.cache = LRUCache(cache_size)
+        for axiom in axioms:
+            self.add(axiom)
+
+    def __len__(self):
+        return len(self.axioms)
+
+    def __contains__(self, id):
+        return id in self.axioms
+
+    def add(self, axiom):
+        """Add an axiom, and get its id to retract it with"""
+        id = next(self.ids)
+        self.axioms[id] = axiom
+        support = frozenset((id, ))
+        self.inputs[id] = clauses = [
+            Clause(literals) for literals in clausify(axiom, self.mode)
+        ]
+        for clause in clauses:
+            self.supports[clause] = support
+            self.prover.add(clause)
+        self.changed = True
+        # New axioms never undo a proof
+        self._invalidate(lambda result: not result)
+        return id
+
+    def retract(self, id):
+        """Remove the axiom with id, and all clauses derived from it"""
+        del self.axioms[id]
+        del self.inputs[id]
+        survivors = [
+            clause for clause in self.prover.clauses()
+            if id not in self.support(clause)
+        ]
+        if self.refutation is not None and \
+                id in self.support(self.refutation.clause):
+            self.refutation = None
+        # Clauses that were subsumed by dropped ones are gone, so the input
+        # clauses and the survivors are saturated again. Most of what that
+        # derives is subsumed by the survivors.
+        self.prover = Prover(self.max_inferences, **self.options)
+        kept = set(survivors)
+        survivors.extend(
+            clause for clauses in self.inputs.values() for clause in clauses
+            if clause not in kept
+        )
+        for clause in survivors:
+            self.prover.add(clause)
+        self.changed = True
+
+        def stale(result):
+            # Fewer axioms never make a goal provable
+            if result.status == Result.SATURATED:
+                return False
+            return not result or id in self.support(result.clause)
+        self._invalidate(stale)
+        self.supports = {
+            clause: support for clause, support in self.supports.items()
+            if id not in support
+        }
+
+    def support(self, clause):
+        """Get the ids of the axioms clause was derived from"""
+        supports = self.supports
+        root, stack = clause, [clause]
+        while stack:
+            clause = stack[-1]
+            if clause in supports:
+                stack.pop()
+                continue
+            todo = [p for p in clause.parents if p not in supports]
+            if todo:
+                stack.extend(todo)
+                continue
+            stack.pop()
+            # Negated goals support nothing
+            supports[clause] = frozenset().union(
+                *(supports[p] for p in clause.parents)
+            )
+        return supports[root]
+
+    def _invalidate(self, stale):
+        """Drop the cached results for which stale is true"""
+        for goal, result in list(self.cache.items.items()):
+            if stale(result):
+                del self.cache[goal]
+
+    def _presaturate(self):
+        if not self.changed:
+            return
+        self.changed = False
+        if self.refutation is None:
+            result = self.prover.run(self.presaturation)
+            if result:
+                self.refutation = result
+
+    def query(self, goal, max_inferences=None):
+        """
+        Try to prove goal from the axioms, like prove(), and get the Result.
+        Refutations and saturations are cached, see KnowledgeBase.
+        """
+        result = self.cache.get(goal)
+        if result is not None:
+            return result
+        prover = self.prover_for(goal)
+        if prover is None:
+            result = self.refutation
+        else:
+            result = prover.run(max_inferences)
+        # Unknown results depend on max_inferences
+        if result.status != Result.UNKNOWN:
+            self.cache[goal] = result
+        return result
+
+    def prover_for(self, goal):
+        """
+        Get a Prover that goes on from the saturated axioms with the negated
+        goal, to run separately. Get None if the axioms are inconsistent,
+        see refutation.
+        """
+        self._presaturate()
+        if self.refutation is not None:
+            return None
+        prover = self.prover.copy()
+        for literals in clausify(Not(goal), self.mode):
+            prover.add(Clause(literals, rule='negated goal'))
+        return prover
@@ -0,0 +1,165 @@
+import weakref
+
+from index import symbol
+from sentence import Not, RecursiveObject, Variable
+
+GREATER = '>'
+LESS = '<'
+EQUAL = '='
+INCOMPARABLE = None
+
+
+class KBO(object):
+    """
+    A Knuth-Bendix ordering on terms and atoms: a term is greater than
+    another one if it weighs more, or weighs the same and its top symbol
+    comes later in the precedence, or has the same top symbol and greater
+    arguments from left to right. Either way, it must have at least as many
+    occurrences of every Variable.
+
+    Symbols weigh their weight in weights, 1 by default, and Variables
+    weigh 1. The precedence maps names to ranks, 0 by default; symbols of
+    equal rank are ordered by arity and name. The weight and Variable counts
+    of each term are computed only once, since terms are interned, and kept
+    for as long as the term lives.
+    """
+
+    def __init__(self, precedence=None, weights=None):
+        self.precedence = dict(precedence or {})
+        self.weights = dict(weights or {})
+        for name, weight in self.weights.items():
+            # Lighter symbols could make a term greater than its instances
+            if weight < 1:
+                raise ValueError(
+                    "Symbols must weigh at least 1: {} weighs {}".format(
+                        name, weight
+                    ))
+        # The weight and Variable counts of each term that isn't a Variable
+        # or a constant, which are cheaper to count again
+        self.summaries = weakref.WeakKeyDictionary()
+
+    def __reduce__(self):
+        # Copies start without summaries, which can't be pickled
+        return KBO, (self.precedence, self.weights)
+
+    def rank(self, term):
+        """Get the key of the top symbol of term in the precedence"""
+        key = symbol(term)
+        if isinstance(term, RecursiveObject):
+            name, arity = key
+        else:
+            name, arity = key, 0
+        return (self.precedence.get(name, 0), arity, str(name),
+                type(term).__name__)
+
+    def summary(self, term):
+        """Get the weight and the Variable counts of a term"""
+        if isinstance(term, Variable):
+            return 1, {term: 1}
+        weights = self.weights
+        if not isinstance(term, RecursiveObject):
+            return weights.get(term, 1), {}
+        summaries = self.summaries
+        root, stack = term, [term]
+        while stack:
+            term = stack[-1]
+            if term in summaries:
+                stack.pop()
+                continue
+            todo = [
+                cont for cont in term.content
+                if isinstance(cont, RecursiveObject) and cont not in summaries
+            ]
+            if todo:
+                stack.extend(todo)
+                continue
+            stack.pop()
+            weight, counts = weights.get(term.name, 1), {}
+            for cont in term.content:
+                if isinstance(cont, RecursiveObject):
+                    cont_weight, cont_counts = summaries[cont]
+                    weight += cont_weight
+                    for variable, n in cont_counts.items():
+                        counts[variable] = counts.get(variable, 0) + n
+                elif isinstance(cont, Variable):
+                    weight += 1
+                    counts[cont] = counts.get(cont, 0) + 1
+                else:
+                    weight += weights.get(cont, 1)
+            summaries[term] = weight, counts
+        return summaries[root]
+
+    def compare(self, left, right):
+        """
+        Compare two terms, or two atoms. Get GREATER, LESS, EQUAL or
+        INCOMPARABLE.
+        """
+        may_greater = may_less = True
+        # Terms with the same weight and top symbol are compared by their
+        # first different arguments, in this loop rather than recursively
+        while True:
+            # Constants are equal strings, not necessarily the same object
+            if left == right:
+                return EQUAL
+            if isinstance(left, Variable) or isinstance(right, Variable):
+                if isinstance(right, Variable) and may_greater and \
+                        right in self.summary(left)[1]:
+                    return GREATER
+                if isinstance(left, Variable) and may_less and \
+                        left in self.summary(right)[1]:
+                    return LESS
+                return INCOMPARABLE
+            left_weight, left_counts = self.summary(left)
+            right_weight, right_counts = self.summary(right)
+            may_greater = may_greater and all(
+                left_counts.get(variable, 0) >= n
+                for variable, n in right_counts.items()
+            )
+            may_less = may_less and all(
+                right_counts.get(variable, 0) >= n
+                for variable, n in left_counts.items()
+            )
+            if not (may_greater or may_less):
+                return INCOMPARABLE
+            if left_weight == right_weight:
+                left_rank, right_rank = self.rank(left), self.rank(right)
+                if left_rank == right_rank:
+                    # The same symbol. Equal constants or equal arguments
+                    # would have made them the same object.
+                    left, right = next(
+                        pair for pair in zip(left.content, right.content)
+                        if pair[0] != pair[1]
+                    )
+                    continue
+                greater = left_rank > right_rank
+            else:
+                greater = left_weight > right_weight
+            if greater:
+                return GREATER if may_greater else INCOMPARABLE
+            return LESS if may_less else INCOMPARABLE
+
+    def compare_literals(self, left, right):
+        """
+        Compare two literals by their atoms. A negative literal is greater
+        than the positive literal of the same atom.
+        """
+        left_negative, right_negative = isinstance(left, Not), \
+            isinstance(right, Not)
+        if left_negative:
+            left = left.content[0]
+        if right_negative:
+            right = right.content[0]
+        order = self.compare(left, right)
+        if order == EQUAL and left_negative != right_negative:
+            return GREATER if left_negative else LESS
+        return order
+
+    def maximal(self, literals):
+        """Get the literals that no other literal is greater than"""
+        literals = list(literals)
+        return [
+            lit for lit in literals if not any(
+                self.compare_literals(other, lit) == GREATER
+                for other in literals if other is not lit
+            )
+        ]
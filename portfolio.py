@@ -0,0 +1,113 @@
+import os
+from multiprocessing import Pool, TimeoutError
+from time import perf_counter
+
+from compact import ClauseArray
+from ordering import KBO
+from preprocess import STEPS, preprocess
+from resolution import Clause, Prover, Result, clausify, has_equality
+from sentence import Not
+
+# Keyword arguments of Prover for each strategy of the default portfolio
+STRATEGIES = [
+    {'selection': 'lightest', 'ordering': KBO()},
+    {'selection': 'lightest', 'ordering': KBO(),
+     'literal_selection': 'negative'},
+    {'selection': (1, 4), 'ordering': KBO()},
+    {'selection': 'lightest'},
+    {'selection': 'fifo'},
+    {'selection': 'lightest', 'subsumption': False},
+    {'selection': 'fifo', 'subsumption': False},
+]
+
+# The problem of a worker process, set once when it starts
+_problem = None
+
+
+def _load(clauses, goals):
+    global _problem
+    _problem = clauses, goals
+
+
+def _attempt(job):
+    number, strategy, max_inferences = job
+    clauses, goals = _problem
+    options = dict(strategy)
+    options.setdefault('equality', has_equality(clauses))
+    prover = Prover(max_inferences, **options)
+    first_goal = len(clauses) - goals
+    for i, literals in enumerate(clauses):
+        if i < first_goal:
+            prover.add(Clause(literals))
+        else:
+            prover.add(Clause(literals, rule='negated goal'))
+    return number, prover.run()
+
+
+def prove_portfolio(axioms, goal=None, strategies=STRATEGIES, processes=None,
+                    max_inferences=10000, mode='distributive', timeout=None,
+                    preprocessing=True):
+    """
+    Try to prove goal from axioms like prove(), with each of strategies, a
+    list of keyword arguments of Prover, in its own process. Equality is
+    built in when the problem has any, unless a strategy says otherwise.
+
+    The problem is clausified and preprocessed once, with preprocessing
+    like in prove(), and sent to each process once as a ClauseArray. The
+    first refutation, or saturation, wins and the other attempts are
+    cancelled. The Result has the winning strategy as its strategy
+    attribute, or None when no attempt finished within timeout seconds or
+    max_inferences, and the report of preprocess() as its preprocessing
+    attribute.
+    """
+    start = perf_counter()
+    inputs = [
+        Clause(clause) for axiom in axioms for clause in clausify(axiom, mode)
+    ]
+    if goal is not None:
+        inputs.extend(
+            Clause(clause, rule='negated goal')
+            for clause in clausify(Not(goal), mode)
+        )
+    if preprocessing is True:
+        preprocessing = STEPS
+    inputs, report = preprocess(inputs, preprocessing or ())
+    # The negated goal goes last
+    inputs.sort(key=lambda clause: clause.rule == 'negated goal')
+    clauses = ClauseArray()
+    for clause in inputs:
+        clauses.append(clause.literals)
+    goals = sum(clause.rule == 'negated goal' for clause in inputs)
+    if processes is None:
+        processes = min(len(strategies), os.cpu_count() or 1)
+    jobs = [
+        (number, strategy, max_inferences)
+        for number, strategy in enumerate(strategies)
+    ]
+    best = Result(Result.UNKNOWN)
+    best.strategy = None
+    pool = Pool(processes, _load, (clauses, goals))
+    try:
+        attempts = pool.imap_unordered(_attempt, jobs)
+        for _ in jobs:
+            if timeout is None:
+                number, result = attempts.next()
+            else:
+                remaining = timeout - (perf_counter() - start)
+                try:
+                    number, result = attempts.next(max(remaining, 0))
+                except TimeoutError:
+                    break
+            if result.status != Result.UNKNOWN:
+                result.strategy = strategies[number]
+                best = result
+                break
+            best.inferences = max(best.inferences, result.inferences)
+    finally:
+        pool.terminate()
+        pool.join()
+    if best.status == Result.SATURATED and report.get('relevance'):
+        best.status = Result.UNKNOWN
+    best.preprocessing = report
+    best.seconds = perf_counter() - start
+    return best
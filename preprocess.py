@@ -0,0 +1,245 @@
+"""
+Simplification of clause sets before search.
+
+Each step removes clauses that can't help a refutation: tautologies,
+duplicates, clauses with pure literals, and clauses subsumed by others.
+Unit clauses also cut the literals they resolve away from other clauses.
+None of these steps change whether the clauses are satisfiable.
+
+The relevance filter is different: it keeps only the clauses whose
+symbols are reachable from the negated goal, like SInE, so a proof may be
+lost along with them. It only runs when asked for.
+"""
+from collections import defaultdict
+
+import instrument
+from index import LiteralIndex, flatten, symbol
+from resolution import Clause, atom, complement
+from sentence import Equality, Not
+from subsumption import SubsumptionIndex
+from unification import match
+
+# The steps preprocess() runs by default, in the order they run in
+STEPS = ('tautologies', 'duplicates', 'pure', 'units', 'subsumption')
+# Every step, in the order they run in
+ORDER = ('tautologies', 'duplicates', 'relevance', 'pure', 'units',
+         'subsumption')
+
+
+def preprocess(clauses, steps=STEPS, depth=None, tolerance=1.):
+    """
+    Simplify clauses, a list of Clause objects, with each of steps, names
+    in ORDER. Clauses with the rule 'negated goal' are the goal for the
+    relevance filter, see relevant() for depth and tolerance.
+
+    Get the remaining clauses, in their order, and a report: a dict with
+    the number of clauses each step removed, and the number of clauses
+    unit simplification shortened as 'simplified'.
+    """
+    for step in steps:
+        if step not in ORDER:
+            raise ValueError("Unknown step: {}".format(step))
+    functions = {
+        'tautologies': tautology_free,
+        'duplicates': unique,
+        'relevance': lambda clauses: relevant(clauses, depth, tolerance),
+        'pure': pure,
+        'units': unit_simplified,
+        'subsumption': subsumption_reduced,
+    }
+    clauses = list(clauses)
+    report = {}
+    for step in ORDER:
+        if step not in steps:
+            continue
+        before = len(clauses)
+        clauses = instrument.timed(
+            'preprocess.' + step, functions[step], clauses
+        )
+        report[step] = before - len(clauses)
+        if step == 'units':
+            report['simplified'] = sum(
+                clause.rule == 'unit simplification' for clause in clauses
+            )
+    return clauses, report
+
+
+def tautology_free(clauses):
+    """Get clauses without tautologies"""
+    return [clause for clause in clauses if not clause.is_tautology()]
+
+
+def unique(clauses):
+    """Get clauses without the ones whose literals an earlier one has"""
+    seen = set()
+    kept = []
+    for clause in clauses:
+        if clause.literals not in seen:
+            seen.add(clause.literals)
+            kept.append(clause)
+    return kept
+
+
+def symbols(literals):
+    """
+    Get the keys of the symbols in literals, see index.symbol, except for
+    that of equality.
+    """
+    keys = set()
+    for lit in literals:
+        predicate = atom(lit)
+        found, _ = flatten(predicate)
+        if type(predicate) is Equality:
+            found = found[1:]
+        keys.update(key for key in found if key is not None)
+    return keys
+
+
+def relevant(clauses, depth=None, tolerance=1.):
+    """
+    Get the clauses that are relevant to the goal, the clauses with the
+    rule 'negated goal', in the manner of SInE.
+
+    Each clause is triggered by its rarest symbols: those in at most
+    tolerance times as many clauses as its rarest one. The symbols of the
+    goal are relevant, and so are the symbols of each clause that a
+    relevant symbol triggers, up to depth steps away from the goal, or any
+    number of steps if depth is None. Clauses without symbols are always
+    relevant. Without a goal every clause is.
+    """
+    if not any(clause.rule == 'negated goal' for clause in clauses):
+        return list(clauses)
+    keys = [symbols(clause.literals) for clause in clauses]
+    occurrences = defaultdict(int)
+    for found in keys:
+        for key in found:
+            occurrences[key] += 1
+    # The clauses each symbol triggers
+    triggered = defaultdict(list)
+    for i, found in enumerate(keys):
+        if found:
+            rarest = min(occurrences[key] for key in found)
+            for key in found:
+                if occurrences[key] <= tolerance * rarest:
+                    triggered[key].append(i)
+    chosen = {
+        i for i, clause in enumerate(clauses)
+        if clause.rule == 'negated goal' or not keys[i]
+    }
+    reached = set().union(*(
+        keys[i] for i, clause in enumerate(clauses)
+        if clause.rule == 'negated goal'
+    ))
+    frontier, steps = reached, 0
+    while frontier and (depth is None or steps < depth):
+        new = set()
+        for key in frontier:
+            for i in triggered[key]:
+                if i not in chosen:
+                    chosen.add(i)
+                    new.update(keys[i] - reached)
+        reached |= new
+        frontier, steps = new, steps + 1
+    return [clause for i, clause in enumerate(clauses) if i in chosen]
+
+
+def pure(clauses):
+    """
+    Get clauses without the ones with a pure literal, one whose predicate
+    never occurs with the other sign. Removing those can make others pure
+    in turn. Equalities are never pure.
+    """
+    # The number of literals of each sign and predicate in kept clauses
+    counts = defaultdict(int)
+    for clause in clauses:
+        for lit in clause.literals:
+            counts[isinstance(lit, Not), symbol(atom(lit))] += 1
+
+    def is_pure(lit):
+        negated = isinstance(lit, Not)
+        return type(atom(lit)) is not Equality and \
+            not counts[not negated, symbol(atom(lit))]
+
+    removed = set()
+    changed = True
+    while changed:
+        changed = False
+        for i, clause in enumerate(clauses):
+            if i not in removed and any(map(is_pure, clause.literals)):
+                removed.add(i)
+                changed = True
+                for lit in clause.literals:
+                    counts[isinstance(lit, Not), symbol(atom(lit))] -= 1
+    return [clause for i, clause in enumerate(clauses) if i not in removed]
+
+
+def unit_simplified(clauses):
+    """
+    Get clauses simplified with their unit clauses until nothing changes:
+    clauses with an instance of a unit are dropped, and literals whose
+    complement is an instance of a unit are cut from the others. A cut
+    clause has the rule 'unit simplification', and the clause and units it
+    came from as its parents.
+    """
+    clauses = list(clauses)
+    units = LiteralIndex()
+
+    def unit_for(lit, clause):
+        """Get a unit clause other than clause that lit is an instance of"""
+        for unit_lit, unit in units.generalisations(lit):
+            if unit is not clause and match(unit_lit, lit) is not None:
+                return unit
+        return None
+
+    for clause in clauses:
+        if len(clause.literals) == 1:
+            lit, = clause.literals
+            units.insert(lit, (lit, clause))
+    changed = True
+    while changed:
+        changed = False
+        for i, clause in enumerate(clauses):
+            if clause is None:
+                continue
+            if any(unit_for(lit, clause) is not None
+                   for lit in clause.literals):
+                clauses[i] = None
+                if len(clause.literals) == 1:
+                    lit, = clause.literals
+                    units.remove(lit, (lit, clause))
+                changed = True
+                continue
+            parents, kept = [clause], []
+            for lit in clause.literals:
+                unit = unit_for(complement(lit), clause)
+                if unit is None:
+                    kept.append(lit)
+                else:
+                    parents.append(unit)
+            if len(parents) == 1:
+                continue
+            if len(clause.literals) == 1:
+                lit, = clause.literals
+                units.remove(lit, (lit, clause))
+            clauses[i] = clause = Clause(
+                kept, tuple(parents), 'unit simplification'
+            )
+            if len(kept) == 1:
+                units.insert(kept[0], (kept[0], clause))
+            changed = True
+    return [clause for clause in clauses if clause is not None]
+
+
+def subsumption_reduced(clauses):
+    """
+    Get clauses without the ones another one subsumes. Of clauses that
+    subsume each other, like variants, the first one is kept.
+    """
+    index = SubsumptionIndex()
+    for clause in clauses:
+        if next(index.subsuming(clause), None) is not None:
+            continue
+        for other in index.subsumed(clause):
+            index.remove(other)
+        index.insert(clause)
+    return [clause for clause in clauses if clause in index]
@@ -0,0 +1,843 @@
+from heapq import heapify, heappop, heappush
+from itertools import count
+from time import perf_counter
+
+import instrument
+from equality import Rewriter, replace, subterms
+from index import DiscriminationTree, LiteralIndex
+from ordering import LESS
+from sentence import Variable, RecursiveObject, And, Or, Not, Equality
+from substitution import Bindings, Substitution
+from subsumption import SubsumptionIndex
+from unification import unify
+from util import forgiving_join
+
+
+def clausify(sentence, mode='distributive'):
+    """
+    Convert a sentence to a list of clauses, each a frozenset of literals.
+    See Sentence.cnf for the modes.
+    """
+    if mode == 'distributive':
+        return list(instrument.timed('cnf.clauses', sentence.clauses))
+    cnf = sentence.cnf(mode)
+    conjuncts = cnf.content if isinstance(cnf, And) else (cnf, )
+    return [
+        frozenset(conj.content if isinstance(conj, Or) else (conj, ))
+        for conj in conjuncts
+    ]
+
+
+def complement(literal):
+    """Get the negation of a literal, without double negation"""
+    if isinstance(literal, Not):
+        return literal.content[0]
+    else:
+        return Not(literal)
+
+
+def atom(literal):
+    """Get the Predicate of a literal"""
+    return literal.content[0] if isinstance(literal, Not) else literal
+
+
+def has_equality(clauses):
+    """Check whether any of clauses, lists of literals, has an Equality"""
+    return any(
+        type(atom(lit)) is Equality for literals in clauses for lit in literals
+    )
+
+
+def weight(literals, weights=None):
+    """
+    Get the number of symbols and Variables in literals. With weights, a
+    dict, each symbol counts as the weight of its name instead, 1 by
+    default.
+    """
+    weight, stack = 0, list(literals)
+    while stack:
+        term = stack.pop()
+        if isinstance(term, Not):
+            term = term.content[0]
+        if weights is None or isinstance(term, Variable):
+            weight += 1
+        elif isinstance(term, RecursiveObject):
+            weight += weights.get(term.name, 1)
+        else:
+            weight += weights.get(term, 1)
+        if isinstance(term, RecursiveObject):
+            stack.extend(term.content)
+    return weight
+
+
+class Clause(object):
+    """
+    A disjunction of literals, which are Predicate or Not(Predicate) objects.
+
+    A clause remembers the clauses and the rule it was derived with, so a
+    refutation can be traced back to the input.
+    """
+    __slots__ = ('literals', 'parents', 'rule')
+
+    def __init__(self, literals, parents=(), rule='input'):
+        self.literals = frozenset(literals)
+        self.parents = parents
+        self.rule = rule
+
+    def __len__(self):
+        return len(self.literals)
+
+    def __iter__(self):
+        return iter(self.literals)
+
+    def __repr__(self):
+        if not self.literals:
+            return "□"
+        return forgiving_join(" ∨ ", self.literals)
+
+    def free_variables(self):
+        return {x for lit in self.literals for x in lit.free_variables()}
+
+    def weight(self, weights=None):
+        """
+        Get the number of symbols and Variables in this clause, with each
+        symbol counting as its weight in weights if given.
+        """
+        return weight(self.literals, weights)
+
+    def is_tautology(self):
+        return any(
+            lit.content[0] in self.literals
+            for lit in self.literals if isinstance(lit, Not)
+        ) or any(
+            lit.content[0] == lit.content[1]
+            for lit in self.literals if type(lit) is Equality
+        )
+
+    def renamed(self):
+        """
+        Get the literals of this clause with all variables replaced by fresh
+        ones.
+        """
+        renaming = Substitution(
+            {x: Variable(x.name) for x in self.free_variables()}
+        )
+        return [lit.substitute(renaming) for lit in self.literals]
+
+
+class Resolvent(object):
+    """
+    A derived clause that isn't built yet: the literals it is an instance
+    of, from its parents, and the Bindings that instantiate them.
+
+    The literals are shared with the parents, so a Resolvent costs nothing
+    but a copy of the Bindings. Most derived clauses are discarded, so they
+    are only built by clause() once they are kept.
+    """
+    __slots__ = ('literals', 'bindings', 'parents', 'rule')
+
+    def __init__(self, literals, bindings, parents=(), rule='resolution'):
+        self.literals = literals
+        self.bindings = bindings
+        self.parents = parents
+        self.rule = rule
+
+    def __repr__(self):
+        return repr(self.clause())
+
+    def distinct(self):
+        """Get the literals that stay distinct once instantiated"""
+        equal = self.bindings.equal
+        distinct = []
+        for lit in self.literals:
+            if not any(equal(lit, other) for other in distinct):
+                distinct.append(lit)
+        return distinct
+
+    def weight(self, weights=None):
+        """Get the Clause.weight() of the instantiated clause"""
+        size = self.bindings.size
+        return sum(size(atom(lit), weights) for lit in self.distinct())
+
+    def is_tautology(self):
+        equal = self.bindings.equal
+        positive = [lit for lit in self.literals if not isinstance(lit, Not)]
+        return any(
+            equal(lit.content[0], other)
+            for lit in self.literals if isinstance(lit, Not)
+            for other in positive
+        ) or any(
+            equal(*lit.content) for lit in positive if type(lit) is Equality
+        )
+
+    def clause(self):
+        """Instantiate the literals, and get the Clause"""
+        bindings = self.bindings
+        return Clause(
+            {bindings[lit] for lit in self.literals}, self.parents, self.rule
+        )
+
+
+class Result(object):
+    """
+    The outcome of a proof search. An unknown Result may name the limit
+    that was reached as its budget, when going on can't help.
+    """
+    REFUTATION = 'refutation'
+    SATURATED = 'saturated'
+    UNKNOWN = 'unknown'
+
+    def __init__(self, status, clause=None, inferences=0, seconds=0.,
+                 budget=None):
+        self.status = status
+        self.clause = clause
+        self.inferences = inferences
+        self.seconds = seconds
+        self.budget = budget
+
+    def __bool__(self):
+        return self.status == self.REFUTATION
+
+    def __repr__(self):
+        return "Result({}, inferences={}, seconds={:.3f})".format(
+            self.status, self.inferences, self.seconds
+        )
+
+    def proof(self):
+        """
+        Get the clauses of the refutation, each after the clauses it was
+        derived from.
+        """
+        if self.clause is None:
+            return []
+        proof, seen, stack = [], set(), [(self.clause, False)]
+        while stack:
+            clause, expanded = stack.pop()
+            if expanded:
+                proof.append(clause)
+            elif clause not in seen:
+                seen.add(clause)
+                stack.append((clause, True))
+                stack.extend((p, False) for p in reversed(clause.parents))
+        return proof
+
+
+class ClauseQueue(object):
+    """
+    The passive clauses of a Prover, in a heap by age and a heap by weight.
+
+    Of every age_picks + weight_picks clauses that are picked, age_picks
+    are the oldest ones and weight_picks the lightest ones, so light
+    clauses go first while heavy ones still get their turn. The empty
+    clause, the only one that weighs 0, is always picked first. Each clause
+    is weighed once, by the Prover, before it's pushed.
+
+    With a max_size, there are at most that many evictable clauses: pushing
+    one more evicts the heaviest evictable clause, and the youngest of
+    those. The number of evicted clauses is kept in evicted.
+
+    A clause that is picked or removed stays in the other heaps until it
+    comes up there, and is skipped then. The heaps are rebuilt when most of
+    their entries are such leftovers.
+    """
+
+    def __init__(self, age_picks=1, weight_picks=0, max_size=None):
+        if age_picks < 0 or weight_picks < 0 or \
+                not age_picks + weight_picks:
+            raise ValueError("Pick ratio {}:{} picks nothing".format(
+                age_picks, weight_picks
+            ))
+        self.age_picks = age_picks
+        self.weight_picks = weight_picks
+        self.max_size = max_size
+        # Entries are (weight, age, clause, evictable), in the heaps by
+        # (age, entry), (weight, age, entry) and, if they're evictable,
+        # (-weight, -age, entry)
+        self.entries = {}
+        self.evictable = 0
+        self.by_age = []
+        self.by_weight = []
+        self.heaviest = []
+        self.age = count()
+        self.picks = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, clause):
+        return clause in self.entries
+
+    def __iter__(self):
+        """Get the clauses, oldest first"""
+        for entry in sorted(self.entries.values(), key=lambda entry: entry[1]):
+            yield entry[2]
+
+    def items(self):
+        """
+        Get the clause, weight, age and whether it's evictable of each
+        clause, in no order.
+        """
+        return [
+            (clause, weight, age, evictable)
+            for weight, age, clause, evictable in self.entries.values()
+        ]
+
+    def copy(self):
+        new = ClauseQueue(self.age_picks, self.weight_picks, self.max_size)
+        for item in self.items():
+            new.push(*item)
+        # Later clauses must still be younger than these ones
+        new.age = count(next(self.age))
+        new.picks = self.picks
+        new.evicted = self.evicted
+        return new
+
+    def push(self, clause, weight, age=None, evictable=True):
+        """
+        Add a clause of weight, as the youngest one unless age is given.
+        Get the clause that was evicted to make room, or None.
+        """
+        if age is None:
+            age = next(self.age)
+        evictable = evictable and self.max_size is not None
+        entry = weight, age, clause, evictable
+        self.entries[clause] = entry
+        heappush(self.by_age, (age, entry))
+        heappush(self.by_weight, (weight, age, entry))
+        if not evictable:
+            return None
+        heappush(self.heaviest, (-weight, -age, entry))
+        self.evictable += 1
+        if self.evictable <= self.max_size:
+            return None
+        evicted = self._pop(self.heaviest)
+        self.evicted += 1
+        return evicted
+
+    def _pop(self, heap):
+        """Remove the first live entry of heap, and get its clause"""
+        entries = self.entries
+        while True:
+            entry = heappop(heap)[-1]
+            clause = entry[2]
+            if entries.get(clause) is entry:
+                self.remove(clause)
+                return clause
+
+    def _compact(self):
+        live = len(self.entries)
+        for heap in (self.by_age, self.by_weight, self.heaviest):
+            if len(heap) > 2 * live + 64:
+                heap[:] = [
+                    item for item in heap
+                    if self.entries.get(item[-1][2]) is item[-1]
+                ]
+                heapify(heap)
+
+    def pop(self):
+        """Remove the clause that is picked next, and get it"""
+        if not self.entries:
+            raise IndexError("pop from an empty ClauseQueue")
+        empty = self.empty_clause()
+        if empty is not None:
+            self.remove(empty)
+            return empty
+        turn = self.picks % (self.age_picks + self.weight_picks)
+        self.picks += 1
+        if turn < self.age_picks:
+            return self._pop(self.by_age)
+        return self._pop(self.by_weight)
+
+    def empty_clause(self):
+        """Get the empty clause if it's queued, None otherwise"""
+        by_weight, entries = self.by_weight, self.entries
+        # Drop leftovers, so the lightest clause is on top
+        while by_weight and entries.get(by_weight[0][-1][2]) is not \
+                by_weight[0][-1]:
+            heappop(by_weight)
+        if by_weight and by_weight[0][0] == 0:
+            return by_weight[0][-1][2]
+        return None
+
+    def remove(self, clause):
+        """Remove a clause, and return whether it was there"""
+        entry = self.entries.pop(clause, None)
+        if entry is None:
+            return False
+        if entry[3]:
+            self.evictable -= 1
+        self._compact()
+        return True
+
+
+class Prover(object):
+    """
+    A given-clause saturation engine for binary resolution and factoring.
+
+    Clauses are first added to the passive set. Each step moves one given
+    clause from the passive to the active set, after drawing all inferences
+    between the given clause and the active clauses. The literals of the
+    active clauses are kept in a LiteralIndex, so only literals that might
+    unify are ever tried.
+
+    With subsumption, new clauses that are subsumed by a kept clause are
+    discarded (forward subsumption), and kept clauses that are subsumed by a
+    new given clause are retired (backward subsumption).
+
+    The passive clauses are kept in a ClauseQueue. The selection decides
+    which passive clause is given next: the oldest ('fifo'), the one with
+    the smallest Clause.weight() ('lightest'), or a pair of the number of
+    oldest and lightest clauses to alternate between, such as (1, 4).
+    Symbols weigh their weight in symbol_weights, 1 by default, which must
+    be at least 1 so only the empty clause weighs 0. Clauses heavier than
+    max_weight are discarded, unless it's None. The number of those is
+    kept in too_heavy: once a clause was discarded that way, running out
+    of passive clauses proves nothing.
+
+    With max_passive, the heaviest passive clauses are evicted to keep at
+    most that many. With regenerate, all inferences between the active
+    clauses are drawn again once the passive set runs out after evictions,
+    which brings back the evicted clauses that are still needed. Otherwise
+    the search ends without a result then.
+
+    Inferences produce Resolvents, which are only built into Clauses when
+    they are neither tautologies nor too heavy.
+
+    Inferences only use the eligible literals of a clause. With the
+    literal_selection 'negative', that is the heaviest negative literal of
+    a clause that has one. Otherwise, with an ordering such as a KBO, it's
+    the maximal literals, and without one all literals.
+
+    With equality, Equality literals are reasoned about with paramodulation,
+    equality resolution and equality factoring. Clauses are rewritten with
+    the oriented unit equalities among the active clauses (demodulation)
+    when they are added and again when they are given. The sides of
+    eligible Equality literals and the subterms of eligible literals are
+    kept in DiscriminationTrees, so only subterms that might unify are
+    tried.
+    """
+    # The number of oldest and of lightest clauses each selection picks
+    SELECTIONS = {'fifo': (1, 0), 'lightest': (0, 1)}
+    LITERAL_SELECTIONS = ('maximal', 'negative')
+
+    def __init__(self, max_inferences=10000, subsumption=True,
+                 selection='fifo', max_weight=None, ordering=None,
+                 literal_selection='maximal', equality=False,
+                 symbol_weights=None, max_passive=None, regenerate=True):
+        if isinstance(selection, str):
+            if selection not in self.SELECTIONS:
+                raise ValueError("Unknown selection: {}".format(selection))
+            ratio = self.SELECTIONS[selection]
+        else:
+            selection = ratio = tuple(selection)
+            if len(ratio) != 2:
+                raise ValueError("Unknown selection: {}".format(selection))
+        if literal_selection not in self.LITERAL_SELECTIONS:
+            raise ValueError(
+                "Unknown literal selection: {}".format(literal_selection)
+            )
+        for name, symbol_weight in (symbol_weights or {}).items():
+            # Only the empty clause may weigh 0, see ClauseQueue
+            if symbol_weight < 1:
+                raise ValueError(
+                    "Symbols must weigh at least 1: {} weighs {}".format(
+                        name, symbol_weight
+                    ))
+        self.max_inferences = max_inferences
+        self.selection = selection
+        self.max_weight = max_weight
+        self.symbol_weights = symbol_weights
+        self.regenerate = regenerate
+        self.ordering = ordering
+        self.literal_selection = literal_selection
+        # The eligible literals of each active clause
+        self.eligible = {}
+        self.active = set()
+        self.passive = ClauseQueue(*ratio, max_size=max_passive)
+        self.index = LiteralIndex()
+        self.subsumption = SubsumptionIndex() if subsumption else None
+        self.bindings = Bindings()
+        self.inferences = 0
+        self.discarded = 0
+        self.too_heavy = 0
+        if equality:
+            self.rewriter = Rewriter(ordering)
+            self.sides = DiscriminationTree()
+            self.subterms = DiscriminationTree()
+        else:
+            self.rewriter = None
+
+    def copy(self):
+        """
+        Get a Prover in the same state, which goes on independently. The
+        clauses are shared, the sets and indexes are copied.
+        """
+        new = Prover(self.max_inferences, self.subsumption is not None,
+                     self.selection, self.max_weight, self.ordering,
+                     self.literal_selection, self.rewriter is not None,
+                     self.symbol_weights, self.passive.max_size,
+                     self.regenerate)
+        new.passive = self.passive.copy()
+        new.inferences = self.inferences
+        new.discarded = self.discarded
+        new.too_heavy = self.too_heavy
+        for clause in self.active:
+            new.activate(clause)
+        if self.subsumption is not None:
+            for clause in self.subsumption.vectors:
+                new.subsumption.insert(clause)
+        return new
+
+    def clauses(self):
+        """
+        Get the active clauses, then the passive ones, oldest first.
+        """
+        return list(self.active) + list(self.passive)
+
+    def add(self, clause):
+        """
+        Add a clause to the passive set, unless it's a tautology, too heavy
+        or subsumed. Return whether it was added.
+        """
+        if not isinstance(clause, (Clause, Resolvent)):
+            clause = Clause(clause)
+        if clause.is_tautology():
+            return self.discard()
+        if self.max_weight is not None and \
+                clause.weight(self.symbol_weights) > self.max_weight:
+            self.too_heavy += 1
+            return self.discard()
+        if isinstance(clause, Resolvent):
+            clause = clause.clause()
+        if self.rewriter is not None:
+            simplified = self.simplified(clause)
+            if simplified is not clause:
+                clause = simplified
+                if clause.is_tautology():
+                    return self.discard()
+        if self.subsumption is not None and \
+                next(self.subsumption.subsuming(clause), None) is not None:
+            return self.discard()
+        if self.subsumption is not None:
+            self.subsumption.insert(clause)
+        if instrument.current is not None:
+            instrument.current.count('clauses.kept')
+        passive = self.passive
+        if passive.weight_picks or passive.max_size is not None:
+            weight = clause.weight(self.symbol_weights)
+        else:
+            # Only the empty clause needs a weight to come first
+            weight = 1 if clause.literals else 0
+        # Only derived clauses can be derived again after an eviction
+        evicted = passive.push(clause, weight,
+                               evictable=bool(clause.parents))
+        if evicted is not None and self.subsumption is not None:
+            self.subsumption.remove(evicted)
+        return evicted is not clause
+
+    def simplified(self, clause):
+        """
+        Get clause rewritten with the rules of the active unit equalities,
+        and without literals that say a term isn't itself. Get clause itself
+        if nothing changes.
+        """
+        used = set()
+        literals = [
+            lit for lit in self.rewriter.literals(clause.literals, used)
+            if not isinstance(lit, Not) or type(lit.content[0]) is not Equality
+            or lit.content[0].content[0] != lit.content[0].content[1]
+        ]
+        if not used and len(literals) == len(clause.literals):
+            return clause
+        return Clause(literals, (clause, ) + tuple(used), 'demodulation')
+
+    def discard(self):
+        """Count a clause that wasn't added, and return False"""
+        self.discarded += 1
+        if instrument.current is not None:
+            instrument.current.count('clauses.discarded')
+        return False
+
+    def run(self, max_inferences=None):
+        """
+        Saturate the clause set until the empty clause is derived, nothing is
+        left to do, or more than max_inferences inferences were made. After
+        evictions without regenerate, running out of passive clauses proves
+        nothing: the status is unknown, with 'max_passive' as the budget,
+        and running again makes no more inferences. The same goes for
+        running out after discarding clauses heavier than max_weight, with
+        'max_weight' as the budget.
+        """
+        if max_inferences is None:
+            max_inferences = self.max_inferences
+        start = perf_counter()
+        limit = self.inferences + max_inferences
+
+        def result(status, clause=None, budget=None):
+            return Result(
+                status, clause, self.inferences, perf_counter() - start,
+                budget
+            )
+
+        empty = self.passive.empty_clause()
+        if empty is not None:
+            return result(Result.REFUTATION, empty)
+        while True:
+            if self.inferences >= limit:
+                return result(Result.UNKNOWN)
+            if not self.passive:
+                if not self.passive.evicted:
+                    if self.too_heavy:
+                        return result(Result.UNKNOWN, budget='max_weight')
+                    break
+                if not self.regenerate:
+                    return result(Result.UNKNOWN, budget='max_passive')
+                self.passive.evicted = 0
+                for given in list(self.active):
+                    for new in self.generate(given):
+                        self.inferences += 1
+                        if not new.literals:
+                            return result(Result.REFUTATION, new.clause())
+                        self.add(new)
+                continue
+            given = self.passive.pop()
+            if not given.literals:
+                return result(Result.REFUTATION, given)
+            if self.rewriter is not None:
+                # Rules may have come since it was added
+                simplified = self.simplified(given)
+                if simplified is not given:
+                    if self.subsumption is not None:
+                        self.subsumption.remove(given)
+                    self.add(simplified)
+                    continue
+            if self.subsumption is not None:
+                for clause in self.subsumption.subsumed(given):
+                    self.retire(clause)
+            self.activate(given)
+            for new in self.generate(given):
+                self.inferences += 1
+                if instrument.current is not None:
+                    instrument.current.count('clauses.generated')
+                if not new.literals:
+                    return result(Result.REFUTATION, new.clause())
+                self.add(new)
+        return result(Result.SATURATED)
+
+    def eligible_literals(self, clause):
+        """Get the literals of clause that inferences may use"""
+        if self.literal_selection == 'negative':
+            negative = [lit for lit in clause.literals if isinstance(lit, Not)]
+            if negative:
+                # Ties are broken by name, so runs are reproducible
+                return (max(negative, key=lambda lit: (weight((lit, )),
+                                                       str(lit))), )
+        if self.ordering is None:
+            return tuple(clause.literals)
+        return tuple(self.ordering.maximal(clause.literals))
+
+    def activate(self, clause):
+        """Move a clause to the active set"""
+        self.active.add(clause)
+        # Only eligible literals are indexed, so only they are partners
+        self.eligible[clause] = eligible = self.eligible_literals(clause)
+        for lit in eligible:
+            self.index.insert(lit, (lit, clause))
+        if self.rewriter is not None:
+            self.rewriter.add(clause)
+            for tree, term, value in self.equality_entries(clause):
+                tree.insert(term, value)
+
+    def equality_entries(self, clause):
+        """
+        Get the tree, term and value of each entry of an active clause in
+        the indexes of paramodulation.
+        """
+        compare = self.rewriter.ordering.compare
+        for lit in self.eligible[clause]:
+            if type(lit) is Equality:
+                for side in (0, 1):
+                    left, right = lit.content[side], lit.content[1 - side]
+                    if not isinstance(left, Variable) and \
+                            compare(left, right) != LESS:
+                        yield self.sides, left, (lit, side, clause)
+            for term, path in subterms(atom(lit)):
+                yield self.subterms, term, (term, lit, path, clause)
+
+    def retire(self, clause):
+        """Remove a clause from the active or the passive set"""
+        if self.subsumption is not None:
+            self.subsumption.remove(clause)
+        if clause in self.active:
+            self.active.discard(clause)
+            if self.rewriter is not None:
+                self.rewriter.remove(clause)
+                for tree, term, value in self.equality_entries(clause):
+                    tree.remove(term, value)
+            for lit in self.eligible.pop(clause):
+                self.index.remove(lit, (lit, clause))
+        else:
+            self.passive.remove(clause)
+
+    def generate(self, given):
+        """
+        Get all resolvents between given and the active clauses, and all
+        factors of given, as Resolvents.
+        """
+        bindings = self.bindings
+        eligible = self.eligible[given]
+        # The renamed literals are in the order of given.literals
+        renamed = given.renamed()
+        for original, lit in zip(given.literals, renamed):
+            if original not in eligible:
+                continue
+            for other, partner in self.index.unifiable(complement(lit)):
+                mark = bindings.mark()
+                if unify(atom(lit), atom(other), bindings) is not None:
+                    literals = [
+                        literal for literal in renamed if literal is not lit
+                    ]
+                    literals.extend(
+                        o for o in partner.literals if o is not other
+                    )
+                    snapshot = bindings.snapshot()
+                    bindings.undo(mark)
+                    yield Resolvent(literals, snapshot, (given, partner))
+        for factor, snapshot in self.factors(given.literals, eligible):
+            yield Resolvent(factor, snapshot, (given, ), 'factoring')
+        if self.rewriter is not None:
+            yield from self.superpose(given, renamed, [
+                lit for original, lit in zip(given.literals, renamed)
+                if original in eligible
+            ])
+
+    def superpose(self, given, renamed, eligible):
+        """
+        Get all paramodulants between given and the active clauses, and
+        the equality resolvents and factors of given, as Resolvents.
+        renamed are the renamed literals of given, and eligible those that
+        are eligible.
+        """
+        bindings = self.bindings
+        compare = self.rewriter.ordering.compare
+
+        def inference(rest, unifiable, parents, rule, *extra):
+            # Unify the pairs, and get the Resolvent of rest and extra
+            mark = bindings.mark()
+            for left, right in unifiable:
+                if unify(left, right, bindings) is None:
+                    bindings.undo(mark)
+                    return None
+            snapshot = bindings.snapshot()
+            bindings.undo(mark)
+            return Resolvent(rest + list(extra), snapshot, parents, rule)
+
+        for lit in eligible:
+            rest = [literal for literal in renamed if literal is not lit]
+            new = []
+            if type(lit) is Equality:
+                for side in (0, 1):
+                    left, right = lit.content[side], lit.content[1 - side]
+                    if isinstance(left, Variable) or \
+                            compare(left, right) == LESS:
+                        continue
+                    # From lit into the active clauses
+                    for term, other, path, partner in \
+                            self.subterms.unifiable(left):
+                        new.append(inference(
+                            rest + [o for o in partner.literals
+                                    if o is not other],
+                            [(left, term)], (given, partner),
+                            'paramodulation', replace(other, path, right)
+                        ))
+                    # Equality factoring with the other Equality literals
+                    for other in rest:
+                        if type(other) is not Equality:
+                            continue
+                        for other_side in (0, 1):
+                            new.append(inference(
+                                rest, [(left, other.content[other_side])],
+                                (given, ), 'equality factoring',
+                                Not(Equality(
+                                    right, other.content[1 - other_side]
+                                ))
+                            ))
+            elif type(atom(lit)) is Equality:
+                new.append(inference(
+                    rest, [atom(lit).content], (given, ),
+                    'equality resolution'
+                ))
+            # From the active Equality literals into lit
+            for term, path in subterms(atom(lit)):
+                for other, side, partner in self.sides.unifiable(term):
+                    new.append(inference(
+                        rest + [o for o in partner.literals
+                                if o is not other],
+                        [(other.content[side], term)], (given, partner),
+                        'paramodulation',
+                        replace(lit, path, other.content[1 - side])
+                    ))
+            for resolvent in new:
+                if resolvent is not None:
+                    yield resolvent
+
+    def factors(self, literals, eligible=None):
+        """
+        Get the literals of all binary factors of a clause, each with the
+        Bindings that instantiate them. If eligible literals are given, one
+        of the two literals that are unified must be eligible.
+        """
+        bindings = self.bindings
+        literals = list(literals)
+        for i, lit in enumerate(literals):
+            for other in literals[i + 1:]:
+                if isinstance(lit, Not) != isinstance(other, Not):
+                    continue
+                if eligible is not None and lit not in eligible and \
+                        other not in eligible:
+                    continue
+                mark = bindings.mark()
+                if unify(lit, other, bindings) is not None:
+                    snapshot = bindings.snapshot()
+                    bindings.undo(mark)
+                    yield literals, snapshot
+
+
+def prove(axioms, goal=None, max_inferences=10000, mode='distributive',
+          preprocessing=True):
+    """
+    Try to prove goal from axioms by deriving the empty clause from the
+    axioms and the negated goal. Without goal, try to refute the axioms.
+    The mode is used to clausify, see Sentence.cnf. Equality is built in
+    when the problem has any.
+
+    The clauses are first simplified with the default steps of
+    preprocess.preprocess(), or with preprocessing, a tuple of steps, and
+    the Result has the report as its preprocessing attribute. Since the
+    relevance filter can drop clauses a proof needs, a problem it shrank
+    is never reported as saturated.
+    """
+    # preprocess imports this module
+    from preprocess import STEPS, preprocess
+    if preprocessing is True:
+        preprocessing = STEPS
+    clauses = [
+        Clause(clause) for axiom in axioms for clause in clausify(axiom, mode)
+    ]
+    if goal is not None:
+        clauses.extend(
+            Clause(clause, rule='negated goal')
+            for clause in clausify(Not(goal), mode)
+        )
+    clauses, report = preprocess(clauses, preprocessing or ())
+    prover = Prover(max_inferences, equality=has_equality(
+        clause.literals for clause in clauses
+    ))
+    for clause in clauses:
+        prover.add(clause)
+    result = prover.run()
+    if result.status == Result.SATURATED and report.get('relevance'):
+        result.status = Result.UNKNOWN
+    result.preprocessing = report
+    return result
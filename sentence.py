@@ -1,7 +1,14 @@
+import operator
+import threading
+import weakref
 from functools import wraps
+from itertools import count, product
+from types import GeneratorType
 
+import instrument
 import substitution as sub
-from util import forgiving_join
+import unification
+from util import LRUCache
 
 # To do:
 #   - Fix substitution:
@@ -11,6 +18,40 @@ from util import forgiving_join
 #   - Add XOR, NOR
 
 
+# Names of Predicates introduced by Sentence.cnf(mode='definitional')
+DEFINITION_PREFIX = "δ"
+_definitions = count()
+
+# Names of Skolem Functions, numbered per Exists object and context
+SKOLEM_PREFIX = "σ"
+_skolems = count()
+_skolem_numbers = weakref.WeakKeyDictionary()
+
+# Results of the steps of Sentence.cnf, by method, object and arguments. Use
+# cnf_cache.resize() to change its size.
+cnf_cache = LRUCache(1 << 16)
+_MISSING = object()
+
+# The steps that only depend on the object and their arguments
+_MEMOIZED = frozenset((
+    '_simplified', '_negated_inwards', '_skolemised', '_cleaned',
+    '_distributed',
+))
+
+# The free Variables of ground objects
+_NO_VARIABLES = frozenset()
+
+
+def _bit(something):
+    """Get the bit of something in the symbol and Variable bitsets"""
+    return 1 << (hash(something) & 63)
+
+
+def _variable_order(variable):
+    """The key that orders the arguments of Skolem Functions"""
+    return str(variable.name), id(variable)
+
+
 class Variable(object):
     """
     A representation for a variable.
@@ -18,6 +59,7 @@ class Variable(object):
     The name is merely for humans. Two Variable objects x and y are only
     considered equal when x is y.
     """
+    __slots__ = ('name', )
 
     def __init__(self, name):
         self.name = name
@@ -26,46 +68,242 @@ class Variable(object):
         return "$" + str(self.name)
 
 
-def recursive(f):
+def evaluate(node, method, args=()):
+    """
+    Call a step on node with args, without recursion.
+
+    A step is a method, given by its name, or a function that takes the
+    node. It either returns its result, or is a generator that yields lists
+    of (node, method, args) calls to make first. It gets the list of their
+    results back, and finally returns its own result. The calls are made
+    from an explicit stack, so the depth of a sentence is only limited by
+    memory.
+
+    The results of the steps in _MEMOIZED are kept in cnf_cache, except for
+    those of Predicates, which cost about as much to look up as to convert.
+    """
+    cache = cnf_cache
+    # Each frame is a generator, its cache key, the calls it made, the
+    # results so far and the number of calls
+    frames = []
+    calls, results, n = [(node, method, args)], [], 1
+    while True:
+        if len(results) < n:
+            node, method, args = calls[len(results)]
+            key = None
+            if method in _MEMOIZED and not isinstance(node, Predicate):
+                key = (method, node, args)
+                result = cache.get(key, _MISSING)
+                if result is not _MISSING:
+                    results.append(result)
+                    continue
+            if type(method) is str:
+                result = getattr(node, method)(*args)
+            else:
+                result = method(node, *args)
+            if type(result) is not GeneratorType:
+                if key is not None:
+                    cache[key] = result
+                results.append(result)
+                continue
+            frames.append([result, key, calls, results, n])
+            generator, sent = result, None
+        else:
+            if not frames:
+                return results[0]
+            generator, sent = frames[-1][0], results
+        try:
+            calls = generator.send(sent)
+        except StopIteration as stop:
+            _, key, calls, results, n = frames.pop()
+            if key is not None:
+                cache[key] = stop.value
+            results.append(stop.value)
+            continue
+        results, n = [], len(calls)
+
+
+def recursive(method):
+    """
+    Get a step that applies the step method to the content of an object,
+    and copies the object with the results, unless they are its content.
+    """
+    def step(self, *args):
+        content = self.content
+        new = yield [(cont, method, args) for cont in content]
+        if all(map(operator.is_, new, content)):
+            return self
+        return self.copy(new)
+    step.__name__ = method
+    return step
+
+
+def memoized(f):
+    """
+    Keep the results of a method in cnf_cache, so subformulas that occur
+    more than once are only converted once. The method must only depend on
+    the object and the hashable positional arguments.
+    """
+    method = f.__qualname__
+
     @wraps(f)
-    def inner(self, *args, **kwargs):
-        return self.copy(
-            f(sentence, *args, **kwargs)
-            for sentence in self.content
-        )
+    def inner(self, *args):
+        key = (method, self, args)
+        result = cnf_cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = cnf_cache[key] = f(self, *args)
+        return result
     return inner
 
 
-class RecursiveObject(object):
-    name = None
-    content = None
+class Interned(type):
+    """
+    Metaclass that hash-conses its instances.
+
+    Constructing an object that is structurally identical to a living one
+    returns the living one, so equality is identity and the hash only has to
+    be computed once. Because the content of an object is interned as well,
+    looking an object up only costs time proportional to its arity.
+    """
+    _instances = weakref.WeakValueDictionary()
+    # Threads must not intern two copies of one object
+    _lock = threading.Lock()
+
+    def __call__(cls, *args, **kwargs):
+        new = super(Interned, cls).__call__(*args, **kwargs)
+        key = (cls, new.name, new.content)
+        with cls._lock:
+            old = cls._instances.get(key)
+            if old is not None:
+                return old
+            new._hash = hash(key)
+            new._summarize()
+            cls._instances[key] = new
+        return new
+
+
+def summary(something):
+    """
+    Get the depth, the size, the symbol bitset and the Variable bitset of a
+    term or a sentence. Each symbol or Variable sets one of the 64 bits of
+    a bitset, so a bit that isn't set proves something doesn't occur.
+    """
+    if isinstance(something, RecursiveObject):
+        return (something._depth, something._size, something._symbols,
+                something._variables)
+    elif isinstance(something, Variable):
+        return 1, 1, 0, _bit(something)
+    return 1, 1, _bit(something), 0
+
+
+class RecursiveObject(object, metaclass=Interned):
+    """
+    A term or a sentence: a name, None for connectives, and content.
+
+    Every object carries a summary of its content, computed once from the
+    summaries of its content when it's interned: its depth, its size and
+    bitsets of the symbols and Variables in it, see summary(). Its free
+    Variables are computed once as well, when they're first needed.
+    """
+    __slots__ = ('name', 'content', '_hash', '__weakref__', '_depth',
+                 '_size', '_symbols', '_variables', '_free')
     CONNECTIVE = None
 
     def __eq__(self, other):
-        return isinstance(other, type(self)) and \
-            self.content == other.content and \
-            self.name == other.name
+        # Structurally identical objects are the same object, see Interned
+        return self is other
 
     def __hash__(self):
-        return hash(type(self)) + hash(self.name) + hash(self.content)
+        return self._hash
 
-    def __contains__(self, something):
-        if self == something:
-            return True
+    def __reduce__(self):
+        # Go through the constructor, so copies and unpickled objects are
+        # interned as well
+        if self.name is None:
+            return type(self), tuple(self.content)
         else:
-            return any(
-                something in cont if isinstance(cont, RecursiveObject)
-                else something == cont
-                for cont in self.content
-            )
+            return type(self), (self.name, ) + tuple(self.content)
+
+    def _summarize(self):
+        """Compute the summary of this object from that of its content"""
+        depth, size, symbols, variables = 0, 1, 0, 0
+        for cont in self.content:
+            if isinstance(cont, RecursiveObject):
+                if cont._depth > depth:
+                    depth = cont._depth
+                size += cont._size
+                symbols |= cont._symbols
+                variables |= cont._variables
+            else:
+                depth = depth or 1
+                size += 1
+                if isinstance(cont, Variable):
+                    variables |= _bit(cont)
+                else:
+                    symbols |= _bit(cont)
+        if isinstance(self.name, Variable):
+            variables |= _bit(self.name)
+        elif self.name is not None:
+            symbols |= _bit(self.name)
+        self._depth = depth + 1
+        self._size = size
+        self._symbols = symbols
+        self._variables = variables
+        self._free = None if variables else _NO_VARIABLES
+
+    def is_ground(self):
+        """Check whether no Variable occurs in this object"""
+        return not self._variables
+
+    def __contains__(self, something):
+        if isinstance(something, Variable):
+            if not self._variables & _bit(something):
+                return False
+            if something in self._free_variables():
+                return True
+        elif isinstance(something, RecursiveObject):
+            if something is self:
+                return True
+            if something._depth >= self._depth or \
+                    something._size >= self._size or \
+                    something._symbols & ~self._symbols or \
+                    something._variables & ~self._variables:
+                return False
+        elif not self._symbols & _bit(something):
+            return False
+        stack, seen = [self], set()
+        while stack:
+            cont = stack.pop()
+            if cont == something:
+                return True
+            if isinstance(cont, RecursiveObject) and cont not in seen:
+                seen.add(cont)
+                stack.extend(cont.content)
+        return False
 
     def __repr__(self):
-        rep = "({})".format(
-            forgiving_join(self.CONNECTIVE, self.content)
-        )
-        if self.name is not None:
-            rep = self.name + rep
-        return rep
+        # What is left to write, the next part last
+        parts, stack = [], [self]
+        while stack:
+            part = stack.pop()
+            if isinstance(part, RecursiveObject):
+                stack.extend(reversed(part._parts()))
+            else:
+                parts.append(str(part))
+        return "".join(parts)
+
+    def _parts(self):
+        """Get the strings and objects this object is written as"""
+        parts = [
+            "(" if self.name is None else str(self.name) + "("
+        ]
+        for cont in self.content:
+            parts.append(cont)
+            parts.append(self.CONNECTIVE)
+        if self.content:
+            parts.pop()
+        parts.append(")")
+        return parts
 
     def copy(self, content=None):
         content = self.content if content is None else content
@@ -74,115 +312,268 @@ class RecursiveObject(object):
         else:
             return type(self)(self.name, *content)
 
+    def free_variables(self):
+        """Get all free variables of this object"""
+        return set(self._free_variables())
+
+    def is_free(self, variable):
+        """Check whether variable occurs free in this object"""
+        return bool(self._variables & _bit(variable)) and \
+            variable in self._free_variables()
+
+    def _free_variables(self):
+        """
+        Get the frozenset of all free variables of this object. It's computed
+        only once, from those of the content.
+        """
+        if self._free is not None:
+            return self._free
+        stack = [self]
+        while stack:
+            node = stack[-1]
+            if node._free is not None:
+                stack.pop()
+                continue
+            todo = [
+                cont for cont in node.content
+                if isinstance(cont, RecursiveObject) and cont._free is None
+            ]
+            if todo:
+                stack.extend(todo)
+                continue
+            stack.pop()
+            sets = [
+                cont._free if isinstance(cont, RecursiveObject)
+                else frozenset((cont, ))
+                for cont in node.content
+                if isinstance(cont, RecursiveObject) and cont._free or
+                isinstance(cont, Variable)
+            ]
+            # Share the set of the only content with free Variables
+            free = sets[0] if len(sets) == 1 else \
+                frozenset().union(*sets)
+            if isinstance(node, Quantifier) and node.name in free:
+                free = free - {node.name}
+            node._free = free
+        return self._free
+
 
 class Function(RecursiveObject):
+    __slots__ = ()
     CONNECTIVE = ', '
 
     def __init__(self, name, *arguments):
         self.name = name
         self.content = arguments
 
-    def free_variables(self):
-        return {x for x in self.content if isinstance(x, Variable)} | \
-            {x for s in (f.free_variables() for f in self.content
-             if isinstance(f, Function)) for x in s}
+    def substitute(self, dic):
+        """
+        Apply a substitution to this Function. Subterms in which nothing is
+        substituted are shared, not copied.
+
+        The substitution is handled as if it's a dict.
+        """
+        # The new Function of each Function in this one, converting each
+        # shared subterm only once
+        done = {}
+        stack = [self]
+        while stack:
+            term = stack[-1]
+            if term in done:
+                stack.pop()
+                continue
+            todo = [
+                cont for cont in term.content
+                if isinstance(cont, Function) and cont not in done
+            ]
+            if todo:
+                stack.extend(todo)
+                continue
+            stack.pop()
+            content = [
+                done[cont] if isinstance(cont, Function)
+                else dic[cont] if isinstance(cont, Variable) and cont in dic
+                else cont
+                for cont in term.content
+            ]
+            if all(map(operator.is_, content, term.content)):
+                done[term] = term
+            else:
+                done[term] = term.copy(content)
+        return done[self]
 
     def substituted(self, dic):
         """
         Apply a substitution to this Function AND return whether anything was
         substituted.
-
-        The substitution is handled as if it's a dict.
         """
-        new_content = []
-        substituted = False
-        for cont in self.content:
-            if isinstance(cont, Variable) and cont in dic:
-                substituted = True
-                cont = dic[cont]
-            elif isinstance(cont, Function):
-                cont, newsub = cont.substituted(dic)
-                substituted |= newsub
-            new_content.append(cont)
-        return self.copy(new_content), substituted
+        new = self.substitute(dic)
+        # Interned: a Function with other content is another object
+        return new, new is not self
 
     def unify(self, other):
-        if isinstance(other, Function) and \
-                self.name == other.name and \
-                len(self.content) == len(other.content):
-            substitution = sub.Substitution()
-            for selfc, otherc in zip(self.content, other.content):
-                if selfc != otherc:
-                    if isinstance(selfc, Variable):
-                        substitution[selfc] = otherc
-                    elif isinstance(otherc, Variable):
-                        substitution[otherc] = selfc
-                    else:
-                        return None
-            return substitution
+        """Get a most general unifier with other, or None"""
+        return unification.mgu(self, other)
 
 
 class Sentence(RecursiveObject):
-    def free_variables(self):
-        """Get all free variables of this sentence"""
-        return {x for c in self.content for x in c.free_variables()}
+    __slots__ = ()
 
-    @recursive
     def substitute(self, subst):
         """Apply a substitution to this Sentence"""
-        return self.substitute(subst)
+        return evaluate(self, '_substitute', (subst, ))
 
-    @recursive
     def simplified(self):
         """
         Get a logical equivalent copy of this sentence using only And, Or, Not,
         Quantifier and Predicate.
         """
-        return self.simplified()
+        return evaluate(self, '_simplified')
+
+    def negated_inwards(self, negate=False):
+        """
+        Negate this sentence, pushing occurrences of Not inwards until they
+        hit a Predicate.
+        """
+        return evaluate(self, '_negated_inwards', (negate, ))
 
-    @recursive
-    def skolemised(self, variables=tuple()):
+    def skolemised(self, variables=()):
         """
-        Replace existentially quantified variables by a Function of the
-        universally quantified variables in this scope. Drop universal
-        quantifiers.
+        Replace existentially quantified variables by their Skolem terms,
+        see Quantifier.skolem_term(). Drop universal quantifiers.
+
+        The universally quantified variables in this scope, a tuple from the
+        outside in, are no longer needed: Skolem terms only take the free
+        variables of their Exists. So variables is passed on as it is.
         """
-        return self.skolemised(variables)
+        return evaluate(self, '_skolemised', (variables, ))
 
-    @recursive
     def distributed(self):
         """
         Distribute And over Or
         """
-        return self.distributed()
+        return evaluate(self, '_distributed')
 
-    @recursive
     def cleaned(self):
         """Remove any meaningless parts of this Sentence"""
-        return self.cleaned()
+        return evaluate(self, '_cleaned')
 
-    def cnf(self):
-        """Convert sentence to conjunctive normal form"""
-        return self.simplified().negated_inwards().skolemised().cleaned() \
-            .distributed()
+    def defined(self, definitions, limit):
+        """
+        Replace subformulas by definitions, until distributing this sentence
+        produces at most limit clauses. Return the new sentence and the
+        number of clauses it distributes to.
+
+        Only works on sentences in negation normal form without quantifiers.
+        """
+        return evaluate(self, '_defined', (definitions, limit))
+
+    _substitute = recursive('_substitute')
+    _simplified = recursive('_simplified')
+    _skolemised = recursive('_skolemised')
+    _distributed = recursive('_distributed')
+    _cleaned = recursive('_cleaned')
+
+    def _defined(self, definitions, limit):
+        return self, 1
+
+    def cnf(self, mode='distributive', limit=4):
+        """
+        Convert sentence to conjunctive normal form.
+
+        In 'distributive' mode, Or is distributed over And, which can make the
+        result exponentially larger. In 'definitional' mode, any subformula
+        that would be distributed into more than limit clauses is renamed
+        instead, so the result is linear in the size of the sentence. That
+        result is equisatisfiable rather than equivalent. The limit must be
+        at least 1.
+        """
+        if mode == 'definitional' and limit < 1:
+            raise ValueError("The limit must be at least 1: {}".format(limit))
+        timed = instrument.timed
+        nnf = self
+        for phase in ('simplified', 'negated_inwards', 'skolemised',
+                      'cleaned'):
+            nnf = timed('cnf.' + phase, getattr(nnf, phase))
+        if mode == 'distributive':
+            return timed('cnf.distributed', nnf.distributed)
+        elif mode == 'definitional':
+            definitions = []
+            defined, _ = timed('cnf.defined', nnf.defined, definitions, limit)
+            joined = And.joined([defined] + definitions)
+            return timed('cnf.distributed', joined.distributed)
+        else:
+            raise ValueError("Unknown cnf mode: {}".format(mode))
+
+    @memoized
+    def clauses(self):
+        """
+        Get the clauses of the distributive conjunctive normal form of this
+        sentence, as a tuple of frozensets of literals.
+
+        This does all steps of cnf() in a single pass, which tracks whether
+        the current subformula occurs negated and which Variables are
+        universally quantified, instead of building a sentence for each
+        step. The result is the same as that of cnf(), except for the names
+        of Skolem Functions.
+        """
+        skolems = sub.ScopedSubstitution()
+        return tuple(evaluate(self, _clauses, (True, skolems)))
 
 
 class Quantifier(Sentence):
+    __slots__ = ()
     SYMBOL = None
 
     def __init__(self, variable, sentence):
         self.name = variable
         self.content = (sentence, )
 
-    def __repr__(self):
-        return "{} {} [{}]".format(self.SYMBOL, self.name, self.content[0])
+    def _parts(self):
+        return ["{} {} [".format(self.SYMBOL, self.name), self.content[0], "]"]
 
-    def free_variables(self):
-        frees = super(Quantifier, self).free_variables()
-        frees.discard(self.name)
-        return frees
-
-    def substitute(self, subst):
+    def skolem_name(self, context=()):
+        """
+        Get the name of the Skolem Function of this sentence, where context
+        is the tuple of the terms its free Variables stand for, if any. It's
+        the same for as long as this sentence lives, and never used for
+        another sentence or context.
+        """
+        numbers = _skolem_numbers.get(self)
+        if numbers is None:
+            numbers = _skolem_numbers[self] = {}
+        number = numbers.get(context)
+        if number is None:
+            number = numbers[context] = next(_skolems)
+        return SKOLEM_PREFIX + str(number)
+
+    def skolem_term(self, skolems=None):
+        """
+        Get the Skolem term of this sentence: its Skolem Function applied to
+        the free variables of this sentence, ordered by name. An interned
+        sentence may occur in several scopes, and this way each occurrence
+        gets the witnesses of the same formula.
+
+        Free variables that are bound in skolems, a ScopedSubstitution of
+        enclosing Skolem terms, count as the variables of their terms
+        instead. Their terms are the context of the Skolem Function, as
+        this sentence with them substituted is another formula.
+        """
+        variables = self._free_variables()
+        context = ()
+        if skolems:
+            replaced = sorted(
+                (x for x in variables if x in skolems), key=_variable_order
+            )
+            context = tuple(skolems[x] for x in replaced)
+            variables = variables.difference(replaced).union(*(
+                term._free_variables() for term in context
+            ))
+        return Function(self.skolem_name(context), *sorted(
+            variables, key=_variable_order
+        ))
+
+    def _substitute(self, subst):
         """
         Apply a substitution to this sentence
         """
@@ -193,164 +584,237 @@ class Quantifier(Sentence):
             )
             # subst = subst.copy()
             # del subst[self.name]
-        return super(Quantifier, self).substitute(subst)
+        return (yield from super(Quantifier, self)._substitute(subst))
 
-    def negated_inwards(self, negate, negative, positive):
+    def _negated_inwards(self, negate, negative, positive):
         """
         Negate this sentence, pushing occurrences of Not inwards until they
         hit a Predicate.
         """
+        body, = yield [(self.content[0], '_negated_inwards', (negate, ))]
         if negate:
-            return negative(
-                self.name,
-                self.content[0].negated_inwards(True)
-            )
+            return negative(self.name, body)
         else:
-            return positive(
-                self.name,
-                self.content[0].negated_inwards(False)
-            )
+            return positive(self.name, body)
 
     # It feels like the following function can be wrapped with recursive
-    def cleaned(self):
-        if self.name in super(Quantifier, self).free_variables():
-            return super(Quantifier, self).cleaned()
+    def _cleaned(self):
+        if self.content[0].is_free(self.name):
+            return (yield from super(Quantifier, self)._cleaned())
         else:
-            return self.content[0].cleaned()
+            return (yield [(self.content[0], '_cleaned', ())])[0]
 
 
 class ForAll(Quantifier):
+    __slots__ = ()
     SYMBOL = "∀"
 
-    def negated_inwards(self, negate=False):
-        """
-        Negate this sentence, pushing occurrences of Not inwards until they
-        hit a Predicate.
-        """
-        return super(ForAll, self).negated_inwards(negate, Exists, ForAll)
+    def _negated_inwards(self, negate=False):
+        return (yield from super(ForAll, self)._negated_inwards(
+            negate, Exists, ForAll
+        ))
 
-    def skolemised(self, variables=tuple()):
-        return self.content[0].skolemised({self.name}.union(variables))
+    def _skolemised(self, variables=()):
+        return (yield [(self.content[0], '_skolemised', (variables, ))])[0]
 
 
 class Exists(Quantifier):
+    __slots__ = ()
     SYMBOL = "∃"
 
-    def negated_inwards(self, negate=False):
-        """
-        Negate this sentence, pushing occurrences of Not inwards until they
-        hit a Predicate.
-        """
-        return super(Exists, self).negated_inwards(negate, ForAll, Exists)
+    def _negated_inwards(self, negate=False):
+        return (yield from super(Exists, self)._negated_inwards(
+            negate, ForAll, Exists
+        ))
 
-    def skolemised(self, variables=tuple()):
-        # Replace my variable with a function
-        s = sub.Substitution({self.name: Function(str(id(self)), *variables)})
-        return self.content[0].substitute(s).skolemised(variables)
+    def _skolemised(self, variables=()):
+        # Replace my variable with a function, and those of the Exists
+        # objects in my scope as they come
+        skolems = sub.ScopedSubstitution()
+        skolems.bind(self.name, self.skolem_term())
+        return (yield [
+            (self.content[0], _skolemised, (variables, skolems))
+        ])[0]
 
 
 class IFF(Sentence):
+    __slots__ = ()
     CONNECTIVE = ' <=> '
 
     def __init__(self, formula1, formula2):
+        self.name = None
         self.content = frozenset((formula1, formula2))
         # The following happens when (formula1 is formula2) is True
         if len(self.content) == 1:
             self.content = (formula1, formula2)
 
-    def simplified(self):
-        cont = tuple(self.content)
-        return And(
-            Implies(*cont).simplified(),
-            Implies(*reversed(cont)).simplified()
-        )
+    def _simplified(self):
+        left, right = yield [
+            (cont, '_simplified', ()) for cont in self.content
+        ]
+        return And(Or(Not(left), right), Or(Not(right), left))
 
 
 class Implies(Sentence):
+    __slots__ = ()
     CONNECTIVE = ' => '
 
     def __init__(self, formula1, formula2):
+        self.name = None
         self.content = (formula1, formula2)
 
-    def simplified(self):
-        return Or(
-            Not(self.content[0].simplified()),
-            self.content[1].simplified()
-        )
+    def _simplified(self):
+        left, right = yield [
+            (cont, '_simplified', ()) for cont in self.content
+        ]
+        return Or(Not(left), right)
 
 
 class AssociativeCommutativeBinaryOperator(Sentence):
+    __slots__ = ()
+
     def __init__(self, formula1, *formulas):
+        self.name = None
         formulas = (formula1, ) + formulas
         self.content = frozenset(formulas)
 
-    def simplified(self):
-        return super(
-            AssociativeCommutativeBinaryOperator,
-            self
-        ).simplified()
-
-    def cleaned(self):
-        new = super(AssociativeCommutativeBinaryOperator, self).cleaned()
-        if len(new.content) == 1:
-            return next(iter(new.content)).cleaned()
-        newcont = set()
-        for cont in new.content:
-            if type(cont) == type(new):
-                newcont.update(cont.content)
-            else:
-                newcont.add(cont)
-        return type(self)(*newcont)
-
-    def negated_inwards(self, negate, negative, positive):
+    def _gathered(self):
+        """
+        Get the content of this sentence, with that of any sentences using
+        this operator in it merged in, all the way down. Steps that flatten
+        their result take those operands at once, rather than flattening at
+        every level of a chain.
+        """
+        operands, seen, stack = set(), set(), list(self.content)
+        while stack:
+            cont = stack.pop()
+            if type(cont) is not type(self):
+                operands.add(cont)
+            elif cont not in seen:
+                seen.add(cont)
+                stack.extend(cont.content)
+        return operands
+
+    def _cleaned(self):
+        return type(self).joined((yield [
+            (cont, '_cleaned', ()) for cont in self._gathered()
+        ]))
+
+    def _negated_inwards(self, negate, negative, positive):
+        content = yield [
+            (cont, '_negated_inwards', (negate, )) for cont in self.content
+        ]
         if negate:
-            return negative(
-                *[cont.negated_inwards(True) for cont in self.content]
-            )
+            return negative(*content)
         else:
-            return positive(
-                *[cont.negated_inwards(False) for cont in self.content]
-            )
+            return positive(*content)
 
-    def distributed(self, otherType):
-        ...
+    @classmethod
+    def joined(cls, formulas):
+        """
+        Combine formulas with this operator, merging in any formulas that use
+        this operator themselves.
+        """
+        content = set()
+        for formula in formulas:
+            if type(formula) == cls:
+                content.update(formula.content)
+            else:
+                content.add(formula)
+        if len(content) == 1:
+            return next(iter(content))
+        return cls(*content)
+
+    def _distributed(self, otherType=None):
+        """
+        Distribute this operator over otherType, so the result is an otherType
+        of formulas using this operator. Without otherType only flatten.
+        """
+        content = type(self).joined((yield [
+            (cont, '_distributed', ()) for cont in self._gathered()
+        ]))
+        if otherType is None or type(content) != type(self):
+            return content
+        groups = [
+            cont.content if type(cont) == otherType else (cont, )
+            for cont in content.content
+        ]
+        return otherType.joined(
+            type(self).joined(combination) for combination in product(*groups)
+        )
 
 
 class And(AssociativeCommutativeBinaryOperator):
+    __slots__ = ()
     CONNECTIVE = " ∧ "
 
-    def negated_inwards(self, negate=False):
-        """
-        Negate this sentence, pushing occurrences of Not inwards until they
-        hit a Predicate.
-        """
-        return super(And, self).negated_inwards(negate, Or, And)
+    def _negated_inwards(self, negate=False):
+        return (yield from super(And, self)._negated_inwards(negate, Or, And))
+
+    def _distributed(self):
+        return (yield from super(And, self)._distributed())
+
+    def _defined(self, definitions, limit):
+        content = yield [
+            (cont, '_defined', (definitions, limit)) for cont in self.content
+        ]
+        return (
+            And.joined(cont for cont, _ in content),
+            sum(clauses for _, clauses in content)
+        )
 
 
 class Or(AssociativeCommutativeBinaryOperator):
+    __slots__ = ()
     CONNECTIVE = " ∨ "
 
-    def negated_inwards(self, negate=False):
-        """
-        Negate this sentence, pushing occurrences of Not inwards until they
-        hit a Predicate.
-        """
-        return super(Or, self).negated_inwards(negate, And, Or)
+    def _negated_inwards(self, negate=False):
+        return (yield from super(Or, self)._negated_inwards(negate, And, Or))
+
+    def _distributed(self):
+        return (yield from super(Or, self)._distributed(And))
+
+    def _defined(self, definitions, limit):
+        content = yield [
+            (cont, '_defined', (definitions, limit)) for cont in self.content
+        ]
+        clauses = 1
+        for _, n in content:
+            clauses *= n
+        while clauses > limit:
+            # Rename the disjunct that distributes into most clauses. In
+            # negation normal form every subformula occurs positively, so
+            # the definition only needs to imply the subformula.
+            i = max(range(len(content)), key=lambda i: content[i][1])
+            cont, n = content[i]
+            definition = Predicate(
+                DEFINITION_PREFIX + str(next(_definitions)),
+                *cont.free_variables()
+            )
+            definitions.append(Or.joined((Not(definition), cont)))
+            content[i] = definition, 1
+            clauses //= n
+        return Or.joined(cont for cont, _ in content), clauses
 
 
 class Not(Sentence):
+    __slots__ = ()
+
     def __init__(self, sentence):
+        self.name = None
         self.content = (sentence, )
 
-    def __repr__(self):
-        return "¬{}".format(self.content[0])
+    def _parts(self):
+        return ["¬", self.content[0]]
 
     def unify(self, other):
-        if isinstance(other, Not):
-            return self.content[0].unify(other.content[0])
+        """Get a most general unifier with other, or None"""
+        return unification.mgu(self, other)
 
-    def negated_inwards(self, negate=False):
-        return self.content[0].negated_inwards(not negate)
+    def _negated_inwards(self, negate=False):
+        return (yield [
+            (self.content[0], '_negated_inwards', (not negate, ))
+        ])[0]
 
     # def cnf(self):
     #     if isinstance(self.content, Not):
@@ -363,6 +827,7 @@ class Not(Sentence):
 
 
 class Predicate(Sentence):
+    __slots__ = ()
     CONNECTIVE = ', '
 
     def __init__(self, name, *arguments):
@@ -370,46 +835,195 @@ class Predicate(Sentence):
         self.content = arguments
 
     def unify(self, other):
-        if isinstance(other, Predicate) and \
-                self.name == other.name and \
-                len(self.content) == len(other.content):
-            substitution = sub.Substitution()
-            for selfc, otherc in zip(self.content, other.content):
-                if selfc != otherc:
-                    if isinstance(selfc, Variable):
-                        substitution[selfc] = otherc
-                    elif isinstance(otherc, Variable):
-                        substitution[otherc] = selfc
-                    elif isinstance(selfc, Function) and \
-                            isinstance(otherc, Function):
-                        substitution &= selfc.unify(otherc)
-                    else:
-                        return None
-            return substitution
-
-    free_variables = Function.free_variables
+        """Get a most general unifier with other, or None"""
+        return unification.mgu(self, other)
 
     def substitute(self, substitution):
         return self.copy(
-            cont.substituted(substitution)[0] if isinstance(cont, Function)
+            cont.substitute(substitution) if isinstance(cont, Function)
             else substitution[cont]
             for cont in self.content
         )
 
-    def simplified(self):
-        return self.copy()
+    # Called directly rather than through evaluate, as it doesn't recurse
+    _substitute = substitute
 
-    def cleaned(self):
-        return self.copy()
+    # A copy would be this very Predicate, see Interned
 
-    def skolemised(self, variables=tuple()):
-        return self.copy()
+    def _simplified(self):
+        return self
 
-    def negated_inwards(self, negate=False):
-        if negate:
-            return Not(self.copy())
-        else:
-            return self.copy()
+    def _cleaned(self):
+        return self
+
+    def _distributed(self):
+        return self
+
+    def _skolemised(self, variables=()):
+        return self
+
+    def _negated_inwards(self, negate=False):
+        return Not(self) if negate else self
 
     # def cnf(self):
     #     return self
+
+
+class Equality(Predicate):
+    """
+    The equality of two terms, which provers reason about with built-in
+    rules rather than axioms.
+    """
+    __slots__ = ()
+    NAME = '='
+
+    def __init__(self, left, right):
+        self.name = self.NAME
+        self.content = (left, right)
+
+    def __reduce__(self):
+        return Equality, self.content
+
+    def copy(self, content=None):
+        return Equality(*(self.content if content is None else content))
+
+
+def _skolemised(sentence, variables, skolems):
+    """
+    The step of Sentence.skolemised in the scope of an Exists: skolemise
+    sentence, and replace the Variables bound in skolems, a
+    ScopedSubstitution of the enclosing existentially quantified
+    Variables, by their Skolem terms.
+
+    Only the Predicates are substituted, as they come, so a chain of Exists
+    objects is skolemised in one pass. The Skolem terms of the Exists
+    objects on the way are bound in skolems while their scope is
+    skolemised, so the same skolems are used all along. Parts that contain
+    no bound Variables are skolemised as usual, and cached.
+    """
+    if not any(x in skolems for x in sentence._free_variables()):
+        return (yield [(sentence, '_skolemised', (variables, ))])[0]
+    kind = type(sentence)
+    if kind is Predicate or kind is Equality:
+        return sentence.substitute(skolems)
+    elif kind is ForAll or kind is Exists:
+        if sentence.name in skolems:
+            raise ValueError(
+                "Can't substitute a quantified variable. ({}, {})"
+                .format(sentence, skolems)
+            )
+        if kind is ForAll:
+            return (yield [
+                (sentence.content[0], _skolemised, (variables, skolems))
+            ])[0]
+        mark = skolems.mark()
+        skolems.bind(sentence.name, sentence.skolem_term(skolems))
+        body, = yield [
+            (sentence.content[0], _skolemised, (variables, skolems))
+        ]
+        skolems.undo(mark)
+        return body
+    content = sentence.content
+    new = yield [(cont, _skolemised, (variables, skolems)) for cont in content]
+    if all(map(operator.is_, new, content)):
+        return sentence
+    return sentence.copy(new)
+
+
+def _operands(sentence, positive):
+    """
+    Get whether sentence, or its negation when positive is False, is a
+    conjunction, and its operands as (sentence, positive) pairs. Get None
+    and no operands for a literal.
+    """
+    kind = type(sentence)
+    if kind is And or kind is Or:
+        return (kind is And) == positive, [
+            (operand, positive) for operand in sentence.content
+        ]
+    elif kind is Implies:
+        left, right = sentence.content
+        return not positive, [(left, not positive), (right, positive)]
+    elif kind is IFF:
+        left, right = sentence.content
+        if positive:
+            return True, [
+                (Or(Not(left), right), True), (Or(Not(right), left), True)
+            ]
+        return False, [
+            (And(left, Not(right)), True), (And(right, Not(left)), True)
+        ]
+    return None, ()
+
+
+def _clauses(sentence, positive, skolems):
+    """
+    The step of Sentence.clauses: get the clauses of sentence, or of its
+    negation when positive is False, where skolems is a ScopedSubstitution
+    of the existentially quantified Variables around it by their Skolem
+    terms.
+
+    Nested conjunctions are all gathered in one step, and so are nested
+    disjunctions, so only a disjunction in a conjunction or the other way
+    around takes a step of its own. The operands are converted one after
+    the other, with the Skolem terms of the quantifiers between them and
+    this sentence bound in skolems meanwhile, so the same skolems are used
+    all along.
+    """
+    # Whether this step gathers a conjunction, once it's known
+    conjunction = None
+    results = []
+    stack = [(sentence, positive)]
+    while stack:
+        sentence, positive = stack.pop()
+        if sentence is None:
+            # All operands under some quantifiers are done
+            skolems.undo(positive)
+            continue
+        # Negations and quantifiers have a single operand: go down to the
+        # first other sentence right away
+        kind, mark = type(sentence), None
+        while kind is Not or kind is ForAll or kind is Exists:
+            if kind is Not:
+                positive = not positive
+            elif (kind is Exists) == positive:
+                term = sentence.skolem_term(skolems)
+                if mark is None:
+                    mark = skolems.mark()
+                skolems.bind(sentence.name, term)
+            sentence = sentence.content[0]
+            kind = type(sentence)
+        junction, operands = _operands(sentence, positive)
+        if junction is not None and conjunction is None:
+            conjunction = junction
+        if junction is None:
+            if not sentence.is_ground():
+                sentence = sentence.substitute(skolems)
+            result = [frozenset((sentence if positive else Not(sentence), ))]
+        elif junction == conjunction:
+            if mark is not None:
+                stack.append((None, mark))
+            stack.extend(reversed(operands))
+            continue
+        else:
+            result, = yield [(sentence, _clauses, (positive, skolems))]
+        if mark is not None:
+            skolems.undo(mark)
+        results.append(result)
+    if conjunction is False:
+        # Literals of operands with a single clause are in every clause
+        literals, others = set(), []
+        for result in results:
+            if len(result) == 1:
+                literals.update(result[0])
+            else:
+                others.append(result)
+        clauses = [frozenset(literals)]
+        for result in others:
+            clauses = list(dict.fromkeys(
+                clause | other for other in result for clause in clauses
+            ))
+        return clauses
+    return list(dict.fromkeys(
+        clause for result in results for clause in result
+    ))
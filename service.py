@@ -0,0 +1,270 @@
+#! /usr/bin/env python3
+"""
+An asyncio service that proves goals from shared axioms.
+
+Run this file to serve the axioms of a TPTP file on a local socket:
+
+    python3 service.py axioms.p --port 8765
+
+Each request is a line of JSON with an "op", and gets a line of JSON back
+with the same "id". Requests on one connection are handled concurrently:
+
+    {"id": 1, "op": "query", "goal": "Mortal(socrates)", "timeout": 1}
+    {"id": 2, "op": "add", "axiom": "Man(plato)"}
+    {"id": 3, "op": "retract", "axiom": 0}
+
+Formulas are in the notation of Sentence.__repr__, see parse_formula().
+"""
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from knowledge import KnowledgeBase
+from resolution import Result
+from tptp import parse_formula, problem, read_tptp
+
+
+class ProvingService(object):
+    """
+    Answers queries against shared axioms in an asyncio program, without
+    blocking the event loop.
+
+    The axioms are kept in a KnowledgeBase. Each query runs on a copy of
+    its Prover in the executor, step inferences at a time. Between steps it
+    checks its budgets and lets other queries run, so a hard query never
+    holds the executor for long, and cancelling a query stops it within
+    step inferences.
+
+    A query may take up to timeout seconds, max_inferences inferences and
+    max_clauses kept clauses, which bounds its memory. Each budget may be
+    None for no limit, and can be overridden per query. A query that runs
+    out of a budget gets an unknown Result, with the exhausted budget as
+    its budget attribute and the state of the search as its stats. So does
+    a query whose Prover gives up, like one that evicted clauses without
+    regenerate, with the budget of its Result.
+
+    The default executor is a single thread, so queries take turns. The
+    options are the keyword arguments of KnowledgeBase.
+    """
+    BUDGETS = ('timeout', 'max_inferences', 'max_clauses')
+
+    def __init__(self, axioms=(), step=100, timeout=None,
+                 max_inferences=10000, max_clauses=None, executor=None,
+                 **options):
+        self.step = step
+        self.budgets = {
+            'timeout': timeout,
+            'max_inferences': max_inferences,
+            'max_clauses': max_clauses,
+        }
+        self.own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(1)
+        self.executor = executor
+        self.knowledge = KnowledgeBase(axioms, **options)
+        # Held while the KnowledgeBase is used, which happens both in the
+        # event loop and in the executor
+        self.lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.own_executor:
+            self.executor.shutdown(wait=False)
+
+    async def _call(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def add(self, axiom):
+        """Add an axiom, and get its id to retract it with"""
+        async with self.lock:
+            return await self._call(self.knowledge.add, axiom)
+
+    async def retract(self, id):
+        """Remove the axiom with id, see KnowledgeBase.retract"""
+        async with self.lock:
+            await self._call(self.knowledge.retract, id)
+
+    async def query(self, goal, **budgets):
+        """
+        Try to prove goal from the axioms, within the budgets given as
+        keyword arguments and the service's budgets otherwise, and get the
+        Result. Results that don't depend on the budgets are cached.
+        """
+        for name in budgets:
+            if name not in self.BUDGETS:
+                raise TypeError("Unknown budget: {}".format(name))
+        budgets = dict(self.budgets, **budgets)
+        start = perf_counter()
+        knowledge = self.knowledge
+        async with self.lock:
+            result = knowledge.cache.get(goal)
+            if result is not None:
+                return result
+            prover = await self._call(knowledge.prover_for, goal)
+            if prover is None:
+                return knowledge.refutation
+        first = prover.inferences
+        budget = None
+        while True:
+            step = self.step
+            if budgets['max_inferences'] is not None:
+                step = min(step, first + budgets['max_inferences'] -
+                           prover.inferences)
+            before = prover.inferences
+            result = await self._call(prover.run, step)
+            if result.status != Result.UNKNOWN:
+                break
+            if result.budget is not None:
+                # The Prover itself gave up, see Prover.run
+                budget = result.budget
+            elif budgets['max_inferences'] is not None and \
+                    prover.inferences - first >= budgets['max_inferences']:
+                budget = 'max_inferences'
+            elif budgets['timeout'] is not None and \
+                    perf_counter() - start >= budgets['timeout']:
+                budget = 'timeout'
+            elif budgets['max_clauses'] is not None and \
+                    len(prover.active) + len(prover.passive) > \
+                    budgets['max_clauses']:
+                budget = 'max_clauses'
+            elif prover.inferences == before:
+                # Another step wouldn't get any further either
+                break
+            if budget is not None:
+                break
+        result.inferences = prover.inferences - first
+        result.seconds = perf_counter() - start
+        result.budget = budget
+        result.stats = {
+            'active': len(prover.active),
+            'passive': len(prover.passive),
+            'discarded': prover.discarded,
+        }
+        if result.status != Result.UNKNOWN:
+            async with self.lock:
+                knowledge.cache[goal] = result
+        return result
+
+
+def _response(result):
+    """Get the JSON response to a query"""
+    return {
+        'status': result.status,
+        'inferences': result.inferences,
+        'seconds': result.seconds,
+        'budget': result.budget,
+        'stats': getattr(result, 'stats', None),
+        'proof': [repr(clause) for clause in result.proof()],
+    }
+
+
+async def handle(service, request):
+    """Get the response to a request, a dict decoded from JSON"""
+    op = request.get('op')
+    if op == 'query':
+        budgets = {
+            name: request[name] for name in service.BUDGETS
+            if name in request
+        }
+        result = await service.query(
+            parse_formula(request['goal']), **budgets
+        )
+        return _response(result)
+    elif op == 'add':
+        return {'axiom': await service.add(parse_formula(request['axiom']))}
+    elif op == 'retract':
+        await service.retract(request['axiom'])
+        return {}
+    raise ValueError("Unknown op: {}".format(op))
+
+
+async def serve(service, host='127.0.0.1', port=0):
+    """
+    Start a server that answers requests for service, see this module.
+    Get the asyncio Server.
+    """
+    async def connection(reader, writer):
+        tasks = set()
+
+        async def answer(line):
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                request, response = {}, {'error': str(error)}
+            else:
+                try:
+                    response = await handle(service, request)
+                except Exception as error:
+                    response = {'error': str(error)}
+            if isinstance(request, dict) and 'id' in request:
+                response['id'] = request['id']
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    return await asyncio.start_server(connection, host, port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('axioms', nargs='?',
+                        help="TPTP file with the axioms, none by default")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--step', type=int, default=100,
+                        help="inferences between checks of the budgets")
+    parser.add_argument('--timeout', type=float,
+                        help="seconds each query may take")
+    parser.add_argument('--max-inferences', type=int, default=10000,
+                        help="inferences each query may make")
+    parser.add_argument('--max-clauses', type=int,
+                        help="clauses each query may keep")
+    args = parser.parse_args(argv)
+    axioms = []
+    if args.axioms:
+        with open(args.axioms) as f:
+            axioms, _ = problem(read_tptp(f))
+
+    async def run():
+        async with ProvingService(
+                axioms, args.step, args.timeout, args.max_inferences,
+                args.max_clauses) as service:
+            server = await serve(service, args.host, args.port)
+            print("Serving on {}:{}".format(
+                *server.sockets[0].getsockname()[:2]
+            ))
+            async with server:
+                await server.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+A binary file format for clause sets and Prover checkpoints, which is read
+through a memory map.
+
+A file is a magic number, a JSON header and then flat arrays of integers,
+each aligned to 8 bytes. The header holds the Signature, the rules, the
+options and counters of a Prover, and the length of every array. The
+clauses are encoded like in a ClauseArray, so they are only decoded when
+they are read, and checkpoints have the derivation of every clause, so
+proofs still go back to the input after a restore.
+
+The arrays are in the byte order of the machine that wrote them.
+"""
+import json
+import mmap
+import os
+import sys
+from array import array
+from itertools import count
+
+from compact import ClauseArray, Signature, decode, encode
+from ordering import KBO
+from resolution import Clause, Prover
+
+MAGIC = b'CLAUSES\x01'
+
+# The name and typecode of each array, in the order they're stored
+SECTIONS = (
+    ('offsets', 'q'),
+    ('data', 'i'),
+    # The rule of each clause, as a position in the list of rules
+    ('rules', 'i'),
+    # The parents of clause i are parents[parent_offsets[i]:...[i + 1]]
+    ('parent_offsets', 'q'),
+    ('parents', 'q'),
+    ('active', 'q'),
+    # The passive clauses, with their ages and weights, and those of them
+    # that can be evicted
+    ('passive', 'q'),
+    ('ages', 'q'),
+    ('weights', 'q'),
+    ('evictable', 'q'),
+    # The clauses in the SubsumptionIndex
+    ('kept', 'q'),
+)
+
+
+def _padding(size):
+    return -size % 8
+
+
+def _write(path, header, arrays):
+    """
+    Write a file, through a temporary file that replaces path once it's
+    complete, so an interrupted checkpoint never destroys the last one.
+    """
+    header = dict(header, byteorder=sys.byteorder, lengths={
+        name: len(arrays.get(name, ())) for name, _ in SECTIONS
+    })
+    encoded = json.dumps(header).encode()
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(MAGIC)
+        f.write(array('q', [len(encoded)]).tobytes())
+        f.write(encoded + bytes(_padding(len(encoded))))
+        for name, typecode in SECTIONS:
+            values = arrays.get(name, array(typecode))
+            if not isinstance(values, array) or values.typecode != typecode:
+                values = array(typecode, values)
+            values.tofile(f)
+            f.write(bytes(_padding(len(values) * values.itemsize)))
+    os.replace(temporary, path)
+
+
+def write_clauses(path, clauses):
+    """
+    Store clauses, a ClauseArray or lists of literals. A ClauseArray is
+    written as is, without encoding its clauses again.
+    """
+    if not isinstance(clauses, ClauseArray):
+        signature, data, offsets = Signature(), array('i'), array('q', [0])
+        for literals in clauses:
+            encode(literals, signature, data)
+            offsets.append(len(data))
+    else:
+        signature, data, offsets = \
+            clauses.signature, clauses.data, clauses.offsets
+    _write(path, {'symbols': signature.symbols}, {
+        'offsets': offsets, 'data': data,
+    })
+
+
+def checkpoint(prover, path):
+    """
+    Store the state of a Prover: its options and counters, its active and
+    passive clauses and all clauses they were derived from.
+    The indexes aren't stored, restore() builds them again.
+    """
+    if prover.ordering is None:
+        ordering = None
+    elif type(prover.ordering) is KBO:
+        ordering = {
+            'precedence': prover.ordering.precedence,
+            'weights': prover.ordering.weights,
+        }
+    else:
+        raise TypeError(
+            "Can't store the ordering {!r}".format(prover.ordering)
+        )
+    # Number the clauses so parents come before their children
+    numbers, order = {}, []
+    passive = prover.passive.items()
+    roots = list(prover.active) + [item[0] for item in passive]
+    for root in roots:
+        stack = [root]
+        while stack:
+            clause = stack[-1]
+            if clause in numbers:
+                stack.pop()
+                continue
+            todo = [p for p in clause.parents if p not in numbers]
+            if todo:
+                stack.extend(todo)
+                continue
+            stack.pop()
+            numbers[clause] = len(order)
+            order.append(clause)
+    signature, rules = Signature(), {}
+    arrays = {name: array(typecode) for name, typecode in SECTIONS}
+    arrays['offsets'].append(0)
+    arrays['parent_offsets'].append(0)
+    for clause in order:
+        encode(clause.literals, signature, arrays['data'])
+        arrays['offsets'].append(len(arrays['data']))
+        arrays['rules'].append(rules.setdefault(clause.rule, len(rules)))
+        arrays['parents'].extend(numbers[p] for p in clause.parents)
+        arrays['parent_offsets'].append(len(arrays['parents']))
+    arrays['active'].extend(numbers[clause] for clause in prover.active)
+    for clause, weight, age, evictable in passive:
+        if evictable:
+            arrays['evictable'].append(numbers[clause])
+        arrays['passive'].append(numbers[clause])
+        arrays['ages'].append(age)
+        arrays['weights'].append(weight)
+    if prover.subsumption is not None:
+        arrays['kept'].extend(
+            numbers[clause] for clause in prover.subsumption.vectors
+        )
+    _write(path, {
+        'symbols': signature.symbols,
+        'rules': sorted(rules, key=rules.get),
+        'options': {
+            'max_inferences': prover.max_inferences,
+            'subsumption': prover.subsumption is not None,
+            'selection': prover.selection,
+            'max_weight': prover.max_weight,
+            'ordering': ordering,
+            'literal_selection': prover.literal_selection,
+            'equality': prover.rewriter is not None,
+            'symbol_weights': prover.symbol_weights,
+            'max_passive': prover.passive.max_size,
+            'regenerate': prover.regenerate,
+        },
+        'counters': {
+            # Later clauses must still be younger than the stored ones
+            'age': next(prover.passive.age),
+            'picks': prover.passive.picks,
+            'evicted': prover.passive.evicted,
+            'inferences': prover.inferences,
+            'discarded': prover.discarded,
+            'too_heavy': prover.too_heavy,
+        },
+    }, arrays)
+
+
+def restore(path):
+    """Get a Prover in the state stored in path by checkpoint()"""
+    with ClauseStore(path) as store:
+        return store.prover()
+
+
+class ClauseStore(object):
+    """
+    A file written by write_clauses() or checkpoint(), mapped into memory.
+
+    Opening it only reads the header, and indexing it decodes just the
+    clause at that position, like a ClauseArray. Close it, or use it in a
+    with statement, once done.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.views = []
+        try:
+            self._read()
+        except Exception:
+            self.close()
+            raise
+
+    def _read(self):
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a clause store")
+        start = len(MAGIC)
+        length = self._view(start, 1, 'q')[0]
+        start += 8
+        header = json.loads(bytes(self.map[start:start + length]))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(
+                "The store is {}-endian".format(header['byteorder'])
+            )
+        start += length + _padding(length)
+        self.signature = Signature(map(tuple, header['symbols']))
+        # The names of the rules, which the rules array numbers
+        self.rule_names = header.get('rules', [])
+        self.options = header.get('options')
+        self.counters = header.get('counters')
+        for name, typecode in SECTIONS:
+            length = header['lengths'][name]
+            setattr(self, name, self._view(start, length, typecode))
+            size = length * array(typecode).itemsize
+            start += size + _padding(size)
+
+    def _view(self, start, length, typecode):
+        view = memoryview(self.map)
+        self.views.append(view)
+        size = array(typecode).itemsize
+        view = view[start:start + length * size].cast(typecode)
+        self.views.append(view)
+        return view
+
+    def close(self):
+        # The map can only be closed once nothing views it
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return decode(
+            self.data, self.signature, self.offsets[i], self.offsets[i + 1]
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def raw(self, i):
+        """Get the encoding of a clause"""
+        return array('i', self.data[self.offsets[i]:self.offsets[i + 1]])
+
+    def clauses(self):
+        """Get every clause as a Clause, with its rule and parents"""
+        clauses = []
+        offsets, parents = self.parent_offsets, self.parents
+        for i, literals in enumerate(self):
+            rule = self.rule_names[self.rules[i]] if self.rules else 'input'
+            clauses.append(Clause(literals, tuple(
+                clauses[p] for p in parents[offsets[i]:offsets[i + 1]]
+            ), rule))
+        return clauses
+
+    def prover(self):
+        """Get a Prover in the stored state"""
+        if self.options is None:
+            raise ValueError("The store isn't a checkpoint")
+        options = dict(self.options)
+        if options['ordering'] is not None:
+            options['ordering'] = KBO(**options['ordering'])
+        prover = Prover(**options)
+        clauses = self.clauses()
+        for i in self.active:
+            prover.activate(clauses[i])
+        passive, evictable = prover.passive, set(self.evictable)
+        for i, age, weight in zip(self.passive, self.ages, self.weights):
+            passive.push(clauses[i], weight, age, i in evictable)
+        passive.evicted = self.counters['evicted']
+        passive.age = count(self.counters['age'])
+        passive.picks = self.counters['picks']
+        for i in self.kept:
+            prover.subsumption.insert(clauses[i])
+        prover.inferences = self.counters['inferences']
+        prover.discarded = self.counters['discarded']
+        prover.too_heavy = self.counters['too_heavy']
+        return prover
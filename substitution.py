@@ -1,3 +1,6 @@
+import operator
+
+import instrument
 import sentence
 
 
@@ -47,8 +50,14 @@ class Substitution(dict):
     @staticmethod
     def _compress(dic):
         substituted = True
+        iterations = 0
         while substituted:
             substituted = False
+            iterations += 1
+            # The bits of the keys, to skip values that contain none of them
+            keys = 0
+            for key in dic:
+                keys |= sentence.summary(key)[3]
             for key, value in list(dic.items()):
                 if key == value:
                     # Choosing either one of two variables isn't a problem
@@ -57,6 +66,9 @@ class Substitution(dict):
                     if key in value:
                         # This is really a circular substitution
                         raise ValueError("Circular substitution")
+                    elif value.is_ground() or \
+                            not sentence.summary(value)[3] & keys:
+                        continue
                     else:
                         # substitute it
                         dic[key], subst = value.substituted(dic)
@@ -64,6 +76,8 @@ class Substitution(dict):
                 elif value in dic:
                     substituted = True
                     dic[key] = dic[value]
+        if instrument.current is not None:
+            instrument.current.count('compress.iterations', iterations)
         return dic
 
     def copy(self):
@@ -79,3 +93,255 @@ class Substitution(dict):
     #         return self
     #     else:
     #         return NotImplemented
+
+
+_MISSING = object()
+
+
+class ScopedSubstitution(dict):
+    """
+    A substitution whose bindings are made and undone in stack order, as
+    the scopes of quantifiers are entered and left.
+
+    Unlike a Substitution it's never compressed, so the terms Variables are
+    bound to must not contain bound Variables, which holds for Skolem
+    terms. Binding a Variable and looking one up take O(1). Lookups behave
+    like those on a Substitution, so it can be passed to
+    Sentence.substitute and Function.substituted.
+    """
+    __slots__ = ('_trail', )
+
+    def __init__(self):
+        super(ScopedSubstitution, self).__init__()
+        self._trail = []
+
+    def __missing__(self, key):
+        return key
+
+    def __bool__(self):
+        return True
+
+    def mark(self):
+        """Get a mark to undo() to"""
+        return len(self._trail)
+
+    def undo(self, mark=0):
+        """Undo all bindings made since mark"""
+        trail = self._trail
+        while len(trail) > mark:
+            del self[trail.pop()]
+
+    def bind(self, variable, term):
+        """Bind an unbound variable to term"""
+        if variable in self:
+            raise ValueError("{} is already bound".format(variable))
+        self._trail.append(variable)
+        self[variable] = term
+
+
+class Bindings(object):
+    """
+    A triangular substitution, stored as a union-find forest of Variables.
+
+    Bound variables are merged into classes, and a class can additionally be
+    bound to a term that isn't a Variable. Binding or dereferencing a Variable
+    takes O(α(n)), and the bindings are only applied to a term when it is
+    looked up. Every change is recorded on a trail, so all bindings made
+    since a mark() can be undone in time proportional to their number.
+
+    Lookups behave like those on a Substitution, so Bindings can be passed to
+    Sentence.substitute and Function.substituted.
+    """
+
+    def __init__(self):
+        self._parent = {}
+        self._rank = {}
+        self._term = {}
+        self._trail = []
+
+    def _set(self, dic, key, value):
+        self._trail.append((dic, key, dic.get(key, _MISSING)))
+        dic[key] = value
+
+    def mark(self):
+        """Get a mark to undo() to"""
+        return len(self._trail)
+
+    def undo(self, mark=0):
+        """Undo all changes made since mark"""
+        trail = self._trail
+        while len(trail) > mark:
+            dic, key, value = trail.pop()
+            if value is _MISSING:
+                del dic[key]
+            else:
+                dic[key] = value
+
+    def find(self, variable):
+        """Get the Variable that represents the class of variable"""
+        parent = self._parent
+        root = variable
+        while root in parent:
+            root = parent[root]
+        # Compress the path, on the trail so undo() keeps working
+        while variable is not root:
+            up = parent[variable]
+            if up is not root:
+                self._set(parent, variable, root)
+            variable = up
+        return root
+
+    def deref(self, term):
+        """
+        Get the term a Variable is bound to, or the Variable that represents
+        its class if it is only bound to other Variables. Anything else is
+        returned as is.
+        """
+        if isinstance(term, sentence.Variable):
+            root = self.find(term)
+            return self._term.get(root, root)
+        return term
+
+    def bind(self, variable, term):
+        """
+        Bind an unbound variable to term. Binding a Variable to another
+        Variable merges their classes.
+        """
+        root = self.find(variable)
+        if root in self._term:
+            raise ValueError("{} is already bound".format(variable))
+        term = self.deref(term)
+        if term is root:
+            return
+        if isinstance(term, sentence.Variable):
+            rank, other_rank = self._rank.get(root, 0), self._rank.get(term, 0)
+            if rank > other_rank:
+                root, term = term, root
+            elif rank == other_rank:
+                self._set(self._rank, term, rank + 1)
+            self._set(self._parent, root, term)
+        else:
+            self._set(self._term, root, term)
+
+    def apply(self, term):
+        """
+        Get term with all bound variables replaced. Parts of term in which
+        nothing is replaced are shared, not copied.
+        """
+        # The result for each object in term, converting each shared
+        # subterm only once
+        root, done = term, {}
+        stack = [root]
+        while stack:
+            term = stack[-1]
+            if term in done:
+                stack.pop()
+                continue
+            new = self.deref(term)
+            if not isinstance(new, sentence.RecursiveObject):
+                stack.pop()
+                done[term] = new
+                continue
+            todo = [
+                cont for cont in new.content
+                if cont not in done and (
+                    isinstance(cont, sentence.RecursiveObject) or
+                    isinstance(cont, sentence.Variable)
+                )
+            ]
+            if todo:
+                stack.extend(todo)
+                continue
+            stack.pop()
+            content = [done.get(cont, cont) for cont in new.content]
+            if any(map(operator.is_not, content, new.content)):
+                new = new.copy(content)
+            done[term] = new
+        return done[root]
+
+    def snapshot(self):
+        """
+        Get a copy of these Bindings, which later changes to them don't
+        affect. Only the bindings are copied, no terms.
+        """
+        copy = Bindings()
+        copy._parent = dict(self._parent)
+        copy._rank = dict(self._rank)
+        copy._term = dict(self._term)
+        return copy
+
+    def size(self, term, weights=None):
+        """
+        Get the number of objects, Variables and constants in the result of
+        apply(term), without building it. With weights, a dict, objects and
+        constants count as the weight of their name instead, 1 by default.
+        """
+        # The size of each object in term, counting each shared subterm
+        # only once
+        root, sizes = term, {}
+        stack = [root]
+        while stack:
+            term = stack[-1]
+            if term in sizes:
+                stack.pop()
+                continue
+            new = self.deref(term)
+            if not isinstance(new, sentence.RecursiveObject):
+                stack.pop()
+                if weights is None or isinstance(new, sentence.Variable):
+                    sizes[term] = 1
+                else:
+                    sizes[term] = weights.get(new, 1)
+                continue
+            todo = [cont for cont in new.content if cont not in sizes]
+            if todo:
+                stack.extend(todo)
+                continue
+            stack.pop()
+            own = 1 if weights is None else weights.get(new.name, 1)
+            sizes[term] = own + sum(sizes[cont] for cont in new.content)
+        return sizes[root]
+
+    def equal(self, left, right):
+        """
+        Check whether apply(left) is apply(right), without building them.
+        Only works on terms and literals, whose content is ordered.
+        """
+        stack = [(left, right)]
+        while stack:
+            left, right = stack.pop()
+            left, right = self.deref(left), self.deref(right)
+            if left == right:
+                continue
+            if type(left) is not type(right) or \
+                    not isinstance(left, sentence.RecursiveObject) or \
+                    left.name != right.name or \
+                    len(left.content) != len(right.content):
+                return False
+            stack.extend(zip(left.content, right.content))
+        return True
+
+    def variables(self):
+        """Get all Variables that are bound"""
+        return set(self._parent) | set(self._term)
+
+    def substitution(self):
+        """Get the equivalent idempotent Substitution"""
+        return Substitution({x: self.apply(x) for x in self.variables()})
+
+    def __contains__(self, variable):
+        return self.deref(variable) is not variable
+
+    def __getitem__(self, term):
+        return self.apply(term)
+
+    def __bool__(self):
+        return True
+
+    def __len__(self):
+        return len(self.variables())
+
+    def __repr__(self):
+        return "Bindings({})".format(
+            {x: self.apply(x) for x in self.variables()}
+        )
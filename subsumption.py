@@ -0,0 +1,315 @@
+from time import perf_counter
+
+from index import LiteralIndex, symbol
+from sentence import Not, RecursiveObject, Variable, summary
+from unification import variables
+
+# Number of buckets symbol occurrences are counted in, per sign
+BUCKETS = 8
+
+_UNBOUND = object()
+
+
+def subsumes(general, specific):
+    """
+    Check whether general subsumes specific, i.e. whether one substitution
+    maps the literals of general to distinct literals of specific.
+
+    Requiring distinct literals (multiset subsumption) keeps a clause from
+    subsuming its own factors, and makes every feature in features() a
+    necessary condition.
+    """
+    if len(general) > len(specific):
+        return False
+    return _keyed_subsumes(_keyed(general), _grouped(specific))
+
+
+def _key(literal):
+    if isinstance(literal, Not):
+        return True, symbol(literal.content[0])
+    return False, symbol(literal)
+
+
+def _keyed(literals):
+    """
+    Get each of literals with its key and its depth, size and symbol
+    bitset, see sentence.summary(), as a tuple.
+    """
+    return tuple(
+        (lit, _key(lit), lit._depth, lit._size, lit._symbols)
+        for lit in literals
+    )
+
+
+def _grouped(literals):
+    """
+    Get the lists of literals with each key, each with its depth, size and
+    symbol bitset.
+    """
+    grouped = {}
+    for lit in literals:
+        grouped.setdefault(_key(lit), []).append(
+            (lit, lit._depth, lit._size, lit._symbols)
+        )
+    return grouped
+
+
+def _most_specific(literals):
+    """
+    Get literals as a tuple, those that the fewest literals generalise
+    first: those with the most symbols, then the largest ones. Matching
+    them first finds out soonest when a clause doesn't subsume another.
+    """
+    def specificity(lit):
+        size = summary(lit)[1]
+        return size - len(variables(lit)), size
+    return tuple(sorted(literals, key=specificity, reverse=True))
+
+
+def _keyed_subsumes(general, grouped):
+    """
+    Check whether general, given by _keyed(), subsumes the literals given
+    by _grouped(), so a clause that is checked against many others only
+    has its literals grouped once.
+    """
+    # Every literal must at least match some literal on its own. Trying the
+    # literals with the fewest options first keeps the backtracking small.
+    # The bindings of each match are kept, so the backtracking only has to
+    # check that they agree.
+    # An instance of a literal is no shallower and no smaller, and has all
+    # of its symbols
+    options = []
+    for lit, key, depth, size, symbols in general:
+        matching = []
+        for other, other_depth, other_size, other_symbols in \
+                grouped.get(key, ()):
+            if depth <= other_depth and size <= other_size and \
+                    not symbols & ~other_symbols:
+                bindings = _match_arguments(lit, other)
+                if bindings is not None:
+                    matching.append((other, bindings))
+        if not matching:
+            return False
+        options.append(matching)
+    options.sort(key=len)
+    return _subsumes(options, 0, set(), {})
+
+
+def _match_arguments(literal, other):
+    """
+    Get the substitution, a dict, that maps literal to other, which has the
+    same key, or None if there is none. Like unification.match(), only
+    without comparing the predicates.
+    """
+    if type(literal) is Not:
+        literal, other = literal.content[0], other.content[0]
+    substitution = {}
+    stack = list(zip(literal.content, other.content))
+    while stack:
+        pattern, target = stack.pop()
+        if isinstance(pattern, Variable):
+            bound = substitution.get(pattern, _UNBOUND)
+            if bound is _UNBOUND:
+                substitution[pattern] = target
+            elif bound is not target and bound != target:
+                return None
+        elif pattern is target:
+            if isinstance(pattern, RecursiveObject) and \
+                    not pattern.is_ground():
+                # Its Variables must still map to themselves
+                stack.extend(zip(pattern.content, target.content))
+        elif isinstance(pattern, RecursiveObject):
+            if type(pattern) is not type(target) or \
+                    pattern.name != target.name or \
+                    len(pattern.content) != len(target.content):
+                return None
+            stack.extend(zip(pattern.content, target.content))
+        elif isinstance(target, RecursiveObject) or pattern != target:
+            return None
+    return substitution
+
+
+def _subsumes(options, i, used, substitution):
+    if i == len(options):
+        return True
+    for other, bindings in options[i]:
+        if other in used:
+            continue
+        added = []
+        for var, value in bindings.items():
+            bound = substitution.get(var, _UNBOUND)
+            if bound is _UNBOUND:
+                substitution[var] = value
+                added.append(var)
+            elif bound is not value and bound != value:
+                break
+        else:
+            used.add(other)
+            if _subsumes(options, i + 1, used, substitution):
+                return True
+            used.discard(other)
+        for var in added:
+            del substitution[var]
+    return False
+
+
+def features(literals):
+    """
+    Get the feature vector of a clause: the numbers of positive and negative
+    literals, the largest depths of positive and negative literals, and the
+    number of occurrences of symbols in positive and negative literals,
+    counted in BUCKETS buckets each.
+
+    If a clause subsumes another, each of its features is at most as large
+    as that of the other.
+    """
+    vector = [0] * (4 + 2 * BUCKETS)
+    for lit in literals:
+        negative = isinstance(lit, Not)
+        if negative:
+            lit = lit.content[0]
+        vector[negative] += 1
+        offset = 4 + negative * BUCKETS
+        stack = [(lit, 1)]
+        while stack:
+            term, depth = stack.pop()
+            if isinstance(term, Variable):
+                continue
+            vector[offset + hash(symbol(term)) % BUCKETS] += 1
+            if depth > vector[2 + negative]:
+                vector[2 + negative] = depth
+            if isinstance(term, RecursiveObject):
+                stack.extend((cont, depth + 1) for cont in term.content)
+    return tuple(vector)
+
+
+class SubsumptionIndex(object):
+    """
+    An index of clauses for forward and backward subsumption.
+
+    Clauses are stored in a trie of their feature vectors. Only clauses with
+    a compatible feature vector are ever tested with subsumes(). The stats
+    count how many stored clauses were pruned that way, in the queries
+    that were run to the end: a query that's stopped early, like one that
+    only looks for the first subsuming clause, skips the clauses it never
+    got to rather than pruning them.
+
+    For forward subsumption, the most specific literal of each stored
+    clause is also kept in a LiteralIndex. A stored clause is only a
+    candidate when that literal is among the generalisations of some
+    literal of the query, which rules out most clauses before any
+    matching.
+    """
+
+    def __init__(self):
+        self.root = {}
+        self.vectors = {}
+        # The literals of each clause with their keys, most specific first
+        self.ordered = {}
+        self.literals = LiteralIndex()
+        self.stats = dict.fromkeys((
+            'queries', 'pruned', 'checks', 'subsumed', 'seconds'
+        ), 0)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def __contains__(self, clause):
+        return clause in self.vectors
+
+    def insert(self, clause):
+        vector = features(clause.literals)
+        self.vectors[clause] = vector
+        node = self.root
+        for value in vector[:-1]:
+            node = node.setdefault(value, {})
+        node.setdefault(vector[-1], set()).add(clause)
+        ordered = _most_specific(clause.literals)
+        self.ordered[clause] = _keyed(ordered)
+        if ordered:
+            self.literals.insert(ordered[0], clause)
+
+    def remove(self, clause):
+        vector = self.vectors.pop(clause, None)
+        if vector is None:
+            return
+        ordered = self.ordered.pop(clause)
+        if ordered:
+            self.literals.remove(ordered[0][0], clause)
+        path = [self.root]
+        for value in vector[:-1]:
+            path.append(path[-1][value])
+        leaf = path[-1][vector[-1]]
+        leaf.discard(clause)
+        if not leaf:
+            for node, value in zip(reversed(path), reversed(vector)):
+                del node[value]
+                if node:
+                    break
+
+    def _candidates(self, vector, smaller):
+        stack = [(self.root, 0)]
+        last = len(vector) - 1
+        while stack:
+            node, i = stack.pop()
+            for value, child in node.items():
+                if (value <= vector[i]) if smaller else (value >= vector[i]):
+                    if i == last:
+                        yield from child
+                    else:
+                        stack.append((child, i + 1))
+
+    def _generalising(self, clause, vector):
+        """
+        Get the stored clauses with a smaller feature vector whose most
+        specific literal might generalise a literal of clause.
+        """
+        vectors, seen = self.vectors, set()
+        for lit in clause.literals:
+            for other in self.literals.generalisations(lit):
+                if other not in seen:
+                    seen.add(other)
+                    if all(a <= b
+                           for a, b in zip(vectors[other], vector)):
+                        yield other
+
+    def _query(self, clause, smaller):
+        start = perf_counter()
+        stats = self.stats
+        stats['queries'] += 1
+        candidates, finished = 0, False
+        try:
+            vector = features(clause.literals)
+            # The feature vectors rule out general clauses that are longer
+            if smaller:
+                others = self._generalising(clause, vector)
+                grouped = _grouped(clause.literals)
+            else:
+                others = self._candidates(vector, smaller)
+                keyed = _keyed(_most_specific(clause.literals))
+            for other in others:
+                if other is clause:
+                    continue
+                candidates += 1
+                stats['checks'] += 1
+                if smaller:
+                    found = _keyed_subsumes(self.ordered[other], grouped)
+                else:
+                    found = _keyed_subsumes(keyed, _grouped(other.literals))
+                if found:
+                    stats['subsumed'] += 1
+                    yield other
+            finished = True
+        finally:
+            if finished:
+                stored = len(self.vectors) - (clause in self.vectors)
+                stats['pruned'] += stored - candidates
+            stats['seconds'] += perf_counter() - start
+
+    def subsuming(self, clause):
+        """Get the stored clauses that subsume clause"""
+        return self._query(clause, True)
+
+    def subsumed(self, clause):
+        """Get the stored clauses that clause subsumes"""
+        return list(self._query(clause, False))
@@ -1,11 +1,41 @@
 #! /usr/bin/env python3
+import asyncio
+import copy
+import io
+import json
+import os
+import pickle
+import tempfile
 import unittest
+from time import perf_counter
 from hypothesis import given, example, reject
 from hypothesis.strategies import dictionaries, text
 
-from substitution import Substitution
+import batch
+import sentence
+from substitution import Substitution, Bindings, ScopedSubstitution
 from sentence import Variable, Function, Predicate, And, Or, Not, IFF, ForAll
-from sentence import Exists
+from sentence import Equality, Exists, Implies
+from index import DiscriminationTree, LiteralIndex
+from batch import LiteralBatch
+from unification import may_unify, unify
+from subsumption import SubsumptionIndex, subsumes
+from compact import ClauseArray, Signature
+from tptp import (
+    Parser, Tokens, parse_formula, parse_tptp, problem, read_formulas
+)
+from resolution import (
+    Clause, ClauseQueue, Prover, Resolvent, Result, clausify, prove
+)
+from portfolio import STRATEGIES, prove_portfolio
+from knowledge import KnowledgeBase
+from service import ProvingService, serve
+from store import ClauseStore, checkpoint, restore, write_clauses
+from ordering import KBO, EQUAL, GREATER, INCOMPARABLE, LESS
+from equality import Rewriter, replace, subterms
+from preprocess import STEPS, preprocess
+import benchmarks
+import instrument
 
 
 class TestSubstitution(unittest.TestCase):
@@ -117,6 +147,88 @@ class TestSubstitution(unittest.TestCase):
         self.assertEqual(s['e'], 'e')
 
 
+class TestBindings(unittest.TestCase):
+    def test_bind(self):
+        a, b, c, d = (Variable(name) for name in 'abcd')
+        bindings = Bindings()
+        bindings.bind(a, b)
+        bindings.bind(c, a)
+        self.assertIs(bindings.find(a), bindings.find(c))
+        self.assertNotIn(d, bindings)
+        bindings.bind(b, Function('F', d))
+        self.assertEqual(bindings[c], Function('F', d))
+        self.assertRaises(ValueError, lambda: bindings.bind(a, 'x'))
+        bindings.bind(d, 'x')
+        self.assertEqual(bindings[Predicate('P', a, d)],
+                         Predicate('P', Function('F', 'x'), 'x'))
+        self.assertEqual(
+            bindings.substitution(),
+            Substitution({a: Function('F', 'x'), b: Function('F', 'x'),
+                          c: Function('F', 'x'), d: 'x'})
+        )
+        # Sentences can use Bindings as a Substitution
+        self.assertEqual(Not(Predicate('P', a)).substitute(bindings),
+                         Not(Predicate('P', Function('F', 'x'))))
+
+    def test_undo(self):
+        variables = [Variable(str(i)) for i in range(100)]
+        bindings = Bindings()
+        for x, y in zip(variables, variables[1:50]):
+            bindings.bind(x, y)
+        mark = bindings.mark()
+        for x, y in zip(variables[50:], variables[51:]):
+            bindings.bind(x, y)
+        bindings.bind(variables[0], variables[-1])
+        bindings.bind(variables[99], 'a')
+        self.assertEqual(bindings[variables[0]], 'a')
+        bindings.undo(mark)
+        self.assertIsInstance(bindings[variables[0]], Variable)
+        self.assertNotIn(variables[50], bindings)
+        self.assertIs(bindings[variables[0]], bindings[variables[49]])
+        self.assertEqual(len(bindings), 49)
+        bindings.undo()
+        self.assertEqual(len(bindings), 0)
+
+    def test_sharing(self):
+        x, y = Variable('x'), Variable('y')
+        bindings = Bindings()
+        bindings.bind(x, 'a')
+        unchanged = Function('G', Function('F', y))
+        term = Function('H', unchanged, x)
+        self.assertIs(bindings[unchanged], unchanged)
+        self.assertIs(bindings[term].content[0], unchanged)
+
+    def test_lazy(self):
+        x, y = Variable('x'), Variable('y')
+        bindings = unify(Function('F', x), Function('F', Function('G', y)))
+        snapshot = bindings.snapshot()
+        bindings.undo()
+        self.assertEqual(snapshot[x], Function('G', y))
+        self.assertNotIn(x, bindings)
+        literal = Not(Predicate('P', x, x))
+        self.assertEqual(snapshot.size(literal), 6)
+        self.assertTrue(snapshot.equal(
+            Predicate('P', x), Predicate('P', Function('G', y))
+        ))
+        self.assertFalse(snapshot.equal(Predicate('P', x), Predicate('P', y)))
+
+    def test_scoped(self):
+        x, y, z = Variable('x'), Variable('y'), Variable('z')
+        scoped = ScopedSubstitution()
+        scoped.bind(x, Function('F', z))
+        mark = scoped.mark()
+        scoped.bind(y, 'a')
+        self.assertRaises(ValueError, lambda: scoped.bind(x, 'b'))
+        self.assertEqual(Predicate('P', x, y, z, 'c').substitute(scoped),
+                         Predicate('P', Function('F', z), 'a', z, 'c'))
+        scoped.undo(mark)
+        self.assertNotIn(y, scoped)
+        self.assertEqual(Predicate('P', x, y).substitute(scoped),
+                         Predicate('P', Function('F', z), y))
+        scoped.undo()
+        self.assertEqual(len(scoped), 0)
+
+
 class TestSentence(unittest.TestCase):
     def test_substitution(self):
         x = Variable('x')
@@ -240,7 +352,7 @@ class TestSentence(unittest.TestCase):
         happyy = Predicate('Happy', Function('F', y))
 
         sent = Exists(x, happyx)
-        excpectedf = str(id(sent))
+        excpectedf = sent.skolem_name()
         self.assertEqual(
             sent.skolemised(),
             Predicate('Happy', Function(excpectedf))
@@ -250,15 +362,170 @@ class TestSentence(unittest.TestCase):
             1
         )
         # skoled = ForAll(y, Or(happyy, sent)).skolemised()
+        # The Skolem Function only takes the free variables of the Exists
         self.assertEqual(
             ForAll(y, Or(happyy, sent)).skolemised(),
-            Or(happyy, Predicate('Happy', Function(excpectedf, y)))
+            Or(happyy, Predicate('Happy', Function(excpectedf)))
+        )
+        z = Variable('z')
+        sent = Exists(x, Predicate('Loves', y, x))
+        self.assertEqual(
+            ForAll(z, ForAll(y, sent)).skolemised(),
+            Predicate('Loves', y, Function(sent.skolem_name(), y))
         )
         # self.assertEqual(
         #     ForAll(x, Or(happyx, happyy)).free_variables(),
         #     {y}
         # )
 
+    def test_skolem_names(self):
+        x, y = Variable('x'), Variable('y')
+        sent = ForAll(y, Exists(x, Predicate('Loves', y, x)))
+        self.assertIs(sent.cnf(), sent.cnf())
+        name = sent.content[0].skolem_name()
+        self.assertEqual(sent.content[0].skolem_name(), name)
+        self.assertEqual(
+            sent.cnf(), Predicate('Loves', y, Function(name, y))
+        )
+        # Names are never handed out twice, not even after the Exists
+        # object is gone
+        names = {Exists(x, Predicate('Happy', x)).skolem_name()
+                 for _ in range(3)}
+        self.assertEqual(len(names), 3)
+        self.assertNotIn(name, names)
+
+    def test_shared_skolem(self):
+        # One interned Exists in two scopes, whose witnesses only depend on x
+        x, y, z = Variable('x'), Variable('y'), Variable('z')
+        u, v, w = Variable('u'), Variable('v'), Variable('w')
+        inner = Exists(y, Predicate('Q', x, y))
+        shared = And(ForAll(x, ForAll(z, inner)), ForAll(z, ForAll(x, inner)))
+        witness = Function(inner.skolem_name(), x)
+        self.assertEqual(shared.clauses(),
+                         (frozenset((Predicate('Q', x, witness), )), ))
+        self.assertEqual(shared.cnf(), Predicate('Q', x, witness))
+        # Satisfiable with Q, E and S all equality, and c and d distinct
+        axioms = [
+            shared,
+            ForAll(u, ForAll(v, Implies(Predicate('Q', u, v),
+                                        Predicate('E', u, v)))),
+            ForAll(u, ForAll(v, ForAll(w, Implies(
+                And(Predicate('E', u, v), Predicate('E', w, v)),
+                Predicate('S', u, w)
+            )))),
+            Not(Predicate('S', 'c', 'd')),
+        ]
+        self.assertEqual(prove(axioms, preprocessing=False).status,
+                         Result.SATURATED)
+        # One interned Exists under different substitutions is a different
+        # formula each time, so the witnesses differ
+        inner = Exists(y, Predicate('P', x, y, z))
+        shared = And(ForAll(z, Exists(x, inner)), ForAll(x, Exists(z, inner)))
+
+        def skolem_names(clauses):
+            return {
+                term.name for clause in clauses for lit in clause
+                for term in lit.content if isinstance(term, Function)
+            }
+
+        cnf = [(lit, ) for lit in shared.cnf().content]
+        self.assertEqual(len(skolem_names(shared.clauses())), 4)
+        self.assertEqual(len(skolem_names(cnf)), 4)
+        # Satisfiable with M and L the converse of each other, and P true
+        # everywhere
+        a, b, c = Variable('a'), Variable('b'), Variable('c')
+        axioms = [
+            shared,
+            ForAll(a, ForAll(b, ForAll(c, Implies(
+                Predicate('P', a, b, c), Predicate('M', b, c)
+            )))),
+            ForAll(a, ForAll(b, ForAll(c, Implies(
+                Predicate('P', a, b, c), Predicate('L', a, b)
+            )))),
+            ForAll(u, ForAll(v, Not(And(Predicate('M', v, u),
+                                        Predicate('L', u, v))))),
+        ]
+        self.assertEqual(prove(axioms, preprocessing=False).status,
+                         Result.SATURATED)
+
+    def test_clauses(self):
+        x, y, z = Variable('x'), Variable('y'), Variable('z')
+        p, q = Predicate('P', x), Predicate('Q', x, y)
+        r = Predicate('R', Function('F', y), z)
+
+        def erased(term):
+            # Skolem Functions without their numbers
+            if isinstance(term, Function):
+                name = term.name
+                if name.startswith(sentence.SKOLEM_PREFIX):
+                    name = sentence.SKOLEM_PREFIX
+                return Function(name, *map(erased, term.content))
+            elif isinstance(term, Not):
+                return Not(erased(term.content[0]))
+            elif isinstance(term, Predicate):
+                return Predicate(term.name, *map(erased, term.content))
+            return term
+
+        def clause_set(clauses):
+            return {frozenset(map(erased, clause)) for clause in clauses}
+
+        sentences = [
+            p,
+            Not(And(p, Or(q, Not(p)))),
+            IFF(p, And(q, r)),
+            Not(IFF(Or(p, q), r)),
+            Implies(Not(Implies(p, q)), IFF(r, r)),
+            ForAll(x, Exists(y, Implies(p, ForAll(z, Or(q, r))))),
+            Not(ForAll(x, Exists(y, Or(p, And(q, Not(r)))))),
+            ForAll(x, IFF(Exists(y, q), p)),
+            ForAll(y, Implies(Exists(x, Not(Exists(z, And(q, r)))), p)),
+            benchmarks.nested_quantifiers(5),
+        ]
+        for sent in sentences:
+            cnf = sent.cnf()
+            conjuncts = cnf.content if isinstance(cnf, And) else (cnf, )
+            self.assertEqual(
+                clause_set(sent.clauses()),
+                clause_set(
+                    c.content if isinstance(c, Or) else (c, )
+                    for c in conjuncts
+                ),
+                sent
+            )
+        self.assertEqual(clausify(p), [frozenset((p, ))])
+
+    def test_cnf_cache(self):
+        x = Variable('x')
+        shared = ForAll(x, Implies(
+            Predicate('Man', x), And(Predicate('Mortal', x), Predicate('Q'))
+        ))
+        cache = sentence.cnf_cache
+        size = cache.size
+        try:
+            cache.clear()
+            first = Or(shared, Predicate('A')).cnf()
+            misses = cache.misses
+            second = And(shared, Predicate('B')).cnf()
+            self.assertGreater(cache.hits, 0)
+            # Only the new parts are converted
+            self.assertLess(cache.misses - misses, misses)
+            self.assertEqual(first, Or(shared, Predicate('A')).cnf())
+            man = Not(Predicate('Man', x))
+            self.assertEqual(second, And(
+                Predicate('B'),
+                Or(man, Predicate('Mortal', x)),
+                Or(man, Predicate('Q'))
+            ))
+            cache.resize(4)
+            self.assertLessEqual(len(cache), 4)
+            And(shared, Predicate('C')).cnf()
+            self.assertLessEqual(len(cache), 4)
+            cache.resize(0)
+            And(shared, Predicate('D')).cnf()
+            self.assertEqual(len(cache), 0)
+        finally:
+            cache.resize(size)
+
     def test_unification(self):
         x = Variable('x')
         y = Variable('y')
@@ -274,6 +541,41 @@ class TestSentence(unittest.TestCase):
             Substitution({x: Function('F', y)})
         )
 
+    def test_unification_nested(self):
+        x, y, z = Variable('x'), Variable('y'), Variable('z')
+        f, g = (lambda *a: Function('F', *a)), (lambda *a: Function('G', *a))
+        self.assertEqual(
+            Predicate('P', x, f(x)).unify(Predicate('P', y, f('a'))),
+            Substitution({x: 'a', y: 'a'})
+        )
+        self.assertEqual(
+            f(g(x), y).unify(f(z, g(z))),
+            Substitution({z: g(x), y: g(g(x))})
+        )
+        self.assertIsNone(f(g(x), 'a').unify(f(g(y), 'b')))
+        self.assertIsNone(Not(Predicate('P', x)).unify(Predicate('P', x)))
+        # Occurs check, also through other bindings
+        self.assertIsNone(Predicate('P', x).unify(Predicate('P', f(x))))
+        self.assertIsNone(
+            Predicate('P', x, y).unify(Predicate('P', f(y), g(x)))
+        )
+        # Cyclic bindings must not decompose the same terms forever
+        u = Variable('u')
+        left, right = Predicate('P', x, x, f(x)), Predicate('P', u, f(u), u)
+        self.assertIsNone(left.unify(right))
+        self.assertFalse(prove([ForAll(x, left)], Exists(u, right)))
+
+    def test_unification_bindings(self):
+        x, y = Variable('x'), Variable('y')
+        bindings = unify(Function('F', x, 'a'), Function('F', 'b', y))
+        mark = bindings.mark()
+        self.assertIsNone(unify(x, 'c', bindings))
+        self.assertEqual(bindings.mark(), mark)
+        self.assertIs(unify(y, 'a', bindings), bindings)
+        self.assertEqual(
+            bindings[Function('G', x, y)], Function('G', 'b', 'a')
+        )
+
     def test_contains(self):
         self.assertIn(
             'a',
@@ -292,5 +594,1117 @@ class TestSentence(unittest.TestCase):
             Predicate('Happy', 'a')
         )
 
+    def test_distributed(self):
+        x = Variable('x')
+        a, b, c, d = (Predicate(name, x) for name in 'ABCD')
+        self.assertEqual(
+            Or(And(a, b), And(c, d)).distributed(),
+            And(Or(a, c), Or(a, d), Or(b, c), Or(b, d))
+        )
+        self.assertEqual(
+            Or(a, And(b, Or(c, d))).distributed(),
+            And(Or(a, b), Or(a, c, d))
+        )
+        self.assertEqual(And(a, And(b, c)).distributed(), And(a, b, c))
+
+    def test_deep(self):
+        # Far deeper than the recursion limit
+        depth = 20000
+        x = Variable('x')
+        term = x
+        for _ in range(depth):
+            term = Function('F', term)
+        atom = Predicate('P', term)
+        self.assertIn(x, atom)
+        self.assertEqual(atom.free_variables(), {x})
+        self.assertTrue(repr(atom).endswith('x' + ')' * (depth + 1)))
+        self.assertEqual(
+            atom.substitute(Substitution({x: 'a'})),
+            Predicate('P', term.substituted(Substitution({x: 'a'}))[0])
+        )
+        self.assertIsNone(atom.unify(Predicate('P', x)))
+        sent = Predicate('A', x)
+        for i in range(3000):
+            y = Variable('y' + str(i))
+            sent = Not(Or(Predicate('B', x), Not(sent))) if i % 2 \
+                else ForAll(y, And(Predicate('C', y), sent))
+        self.assertEqual(len(sent.clauses()), 1502)
+        self.assertIsInstance(sent.cnf(), And)
+        # Hundreds of thousands deep, in time linear in the depth
+        levels = 30000
+        x = [Variable('x' + str(i)) for i in range(levels + 1)]
+        sent = Predicate('A', x[levels])
+        for i in reversed(range(levels)):
+            if i % 2:
+                sent = Not(Or(Predicate('B', x[i + 1]), Not(sent)))
+            quantifier = Exists if i % 3 else ForAll
+            sent = quantifier(
+                x[i + 1], And(Predicate('C', x[i + 1], x[i]), sent)
+            )
+        sent = ForAll(x[0], sent)
+        self.assertGreater(sent._depth, 100000)
+        start = perf_counter()
+        self.assertEqual(len(sent.clauses()), 45001)
+        self.assertLess(perf_counter() - start, 60)
+        chain = Predicate('P', x[0])
+        for i in range(100000):
+            chain = Implies(Predicate('Q' + str(i % 7), x[0]), chain)
+        start = perf_counter()
+        clause, = chain.clauses()
+        self.assertEqual(len(clause), 8)
+        self.assertEqual(len(chain.cnf().content), 8)
+        self.assertLess(perf_counter() - start, 60)
+
+
+class TestResolution(unittest.TestCase):
+    def test_clausify(self):
+        x = Variable('x')
+        man, mortal = Predicate('Man', x), Predicate('Mortal', x)
+        self.assertEqual(
+            clausify(ForAll(x, Implies(man, mortal))),
+            [frozenset((Not(man), mortal))]
+        )
+        self.assertEqual(
+            set(clausify(ForAll(x, IFF(man, mortal)))),
+            {frozenset((Not(man), mortal)), frozenset((Not(mortal), man))}
+        )
+
+    def test_prove(self):
+        x = Variable('x')
+        axioms = [
+            ForAll(x, Implies(Predicate('Man', x), Predicate('Mortal', x))),
+            Predicate('Man', 'socrates'),
+        ]
+        result = prove(axioms, Predicate('Mortal', 'socrates'))
+        self.assertEqual(result.status, Result.REFUTATION)
+        self.assertEqual(len(result.clause), 0)
+        proof = result.proof()
+        self.assertIs(proof[-1], result.clause)
+        self.assertEqual(
+            sum(1 for clause in proof if clause.rule == 'negated goal'), 1
+        )
+        self.assertEqual(
+            prove(axioms, Predicate('Mortal', 'zeus')).status,
+            Result.SATURATED
+        )
+
+    def test_definitional(self):
+        x = Variable('x')
+        disjuncts = [
+            And(Predicate('A' + str(i), x), Predicate('B' + str(i), x))
+            for i in range(8)
+        ]
+        sent = ForAll(x, Or(*disjuncts))
+        self.assertEqual(len(sent.cnf().content), 2 ** 8)
+        defined = sent.cnf('definitional')
+        self.assertLessEqual(len(defined.content), 2 * 8 + 4)
+        self.assertTrue(all(
+            len(clause.content) <= 8 for clause in defined.content
+        ))
+        self.assertRaises(ValueError, lambda: sent.cnf('magic'))
+        self.assertRaises(ValueError,
+                          lambda: sent.cnf('definitional', limit=0))
+        self.assertLessEqual(
+            len(sent.cnf('definitional', limit=1).content), 2 * 8 + 4
+        )
+        sent = ForAll(x, Or(*disjuncts[:3]))
+        goal = Exists(x, Or(*(Predicate('B' + str(i), x) for i in range(3))))
+        self.assertTrue(prove([sent], goal, mode='definitional'))
+        self.assertFalse(prove(
+            [sent], Predicate('A0', 'a'), mode='definitional'
+        ))
+
+    def test_prove_existential(self):
+        x, y = Variable('x'), Variable('y')
+        self.assertTrue(prove(
+            [Exists(x, ForAll(y, Predicate('Loves', x, y)))],
+            ForAll(y, Exists(x, Predicate('Loves', x, y)))
+        ))
+        self.assertFalse(prove(
+            [ForAll(y, Exists(x, Predicate('Loves', x, y)))],
+            Exists(x, ForAll(y, Predicate('Loves', x, y))),
+            max_inferences=100
+        ))
+
+    def test_factoring(self):
+        x, y = Variable('x'), Variable('y')
+        prover = Prover()
+        prover.add(Clause((Predicate('P', x), Predicate('P', y))))
+        prover.add(Clause((Not(Predicate('P', x)), Not(Predicate('P', y)))))
+        result = prover.run()
+        self.assertTrue(result)
+        self.assertIn('factoring', {clause.rule for clause in result.proof()})
+
+    def test_selection(self):
+        x, y, z = Variable('x'), Variable('y'), Variable('z')
+        clauses = [
+            (Not(Predicate('R', x, y)), Not(Predicate('R', y, z)),
+             Predicate('R', x, z)),
+            (Predicate('R', 'a', 'b'), ),
+            (Predicate('R', 'b', 'c'), ),
+            (Not(Predicate('R', 'a', 'c')), ),
+        ]
+        for selection in Prover.SELECTIONS:
+            prover = Prover(selection=selection)
+            for clause in clauses:
+                prover.add(clause)
+            self.assertTrue(prover.run())
+        self.assertRaises(ValueError, lambda: Prover(selection='magic'))
+        # A clause that weighs 0 would be taken for the empty clause
+        self.assertRaises(ValueError, lambda: Prover(
+            selection='lightest', symbol_weights={'P': 0}
+        ))
+        self.assertEqual(Clause(clauses[0]).weight(), 9)
+
+    def test_queue(self):
+        clauses = [Clause([Predicate('P', 'c' + str(i))], rule=str(i))
+                   for i in range(6)]
+        queue = ClauseQueue(1, 2)
+        for clause, weight in zip(clauses, (5, 1, 4, 2, 3, 6)):
+            queue.push(clause, weight)
+        self.assertEqual(len(queue), 6)
+        # The oldest, then the two lightest, and so on
+        picked = [queue.pop() for _ in range(4)]
+        self.assertEqual(picked, [clauses[i] for i in (0, 1, 3, 2)])
+        self.assertTrue(queue.remove(clauses[5]))
+        self.assertFalse(queue.remove(clauses[5]))
+        empty = Clause([])
+        queue.push(empty, 0)
+        self.assertIs(queue.empty_clause(), empty)
+        self.assertEqual([queue.pop(), queue.pop()], [empty, clauses[4]])
+        self.assertRaises(IndexError, queue.pop)
+        self.assertRaises(ValueError, lambda: ClauseQueue(0, 0))
+        # Only evictable clauses count towards the size, and the heaviest
+        # of them go first
+        queue = ClauseQueue(max_size=2)
+        self.assertIsNone(queue.push(clauses[0], 9, evictable=False))
+        for clause, weight in zip(clauses[1:3], (3, 5)):
+            self.assertIsNone(queue.push(clause, weight))
+        self.assertIs(queue.push(clauses[3], 4), clauses[2])
+        self.assertEqual(list(queue), [clauses[0], clauses[1], clauses[3]])
+        self.assertEqual(queue.evicted, 1)
+
+    def test_max_passive(self):
+        axioms, _ = benchmarks.transitive_chain(6)
+        active = {}
+        for max_passive, regenerate in ((None, True), (5, True), (5, False)):
+            prover = Prover(selection=(1, 4), max_passive=max_passive,
+                            regenerate=regenerate,
+                            literal_selection='negative',
+                            symbol_weights={'R': 2})
+            for axiom in axioms:
+                for clause in clausify(axiom):
+                    prover.add(clause)
+            result = prover.run(10000)
+            active[max_passive, regenerate] = len(prover.active)
+            if regenerate:
+                self.assertEqual(result.status, Result.SATURATED)
+            else:
+                # Evicted clauses may have been needed
+                self.assertEqual(result.status, Result.UNKNOWN)
+                self.assertEqual(result.budget, 'max_passive')
+                inferences = prover.inferences
+                self.assertEqual(prover.run(10000).budget, 'max_passive')
+                self.assertEqual(prover.inferences, inferences)
+        self.assertEqual(active[5, True], active[None, True])
+        clause = Clause([Predicate('R', 'a', Function('F', 'b'))])
+        self.assertEqual(clause.weight({'R': 2}), 5)
+
+    def test_resolvent(self):
+        x, y = Variable('x'), Variable('y')
+        given = Clause([Not(Predicate('P', x)), Predicate('Q', x, x)])
+        partner = Clause([Predicate('P', Function('F', y)),
+                          Predicate('Q', Function('F', y), y)])
+        bindings = unify(Predicate('P', x), Predicate('P', Function('F', y)))
+        resolvent = Resolvent(
+            [Predicate('Q', x, x), Predicate('Q', Function('F', y), y)],
+            bindings.snapshot(), (given, partner)
+        )
+        bindings.undo()
+        clause = resolvent.clause()
+        self.assertEqual(clause.literals, {
+            Predicate('Q', Function('F', y), Function('F', y)),
+            Predicate('Q', Function('F', y), y)
+        })
+        self.assertEqual(resolvent.weight(), clause.weight())
+        self.assertFalse(resolvent.is_tautology())
+        factor = Resolvent(
+            [Predicate('Q', x, x), Not(Predicate('Q', Function('F', y), y))],
+            unify(x, y), (partner, )
+        )
+        self.assertFalse(factor.is_tautology())
+        bindings = unify(x, Function('F', y))
+        self.assertTrue(Resolvent(
+            [Predicate('P', x), Not(Predicate('P', Function('F', y)))],
+            bindings
+        ).is_tautology())
+        self.assertEqual(
+            len(Resolvent([Predicate('P', x), Predicate('P', y)],
+                          unify(x, y)).distinct()), 1
+        )
+        # Too heavy clauses are discarded before they are built
+        prover = Prover(max_weight=3)
+        self.assertTrue(prover.add(Clause([Predicate('P', x, y)])))
+        self.assertFalse(prover.add(Clause([Predicate('P', x, x, y)])))
+        self.assertEqual(prover.discarded, 1)
+        # Without them, running out of clauses doesn't mean saturation
+        f = lambda term: Function('F', term)
+        clauses = [
+            Clause([Predicate('P', 'a')]),
+            Clause([Not(Predicate('P', x)), Predicate('P', f(x))]),
+            Clause([Not(Predicate('P', f(f(f(f('a'))))))]),
+        ]
+        prover = Prover(max_weight=5)
+        for clause in clauses:
+            prover.add(clause)
+        result = prover.run()
+        self.assertEqual(result.status, Result.UNKNOWN)
+        self.assertEqual(result.budget, 'max_weight')
+        self.assertGreater(prover.too_heavy, 0)
+        self.assertEqual(prover.copy().too_heavy, prover.too_heavy)
+        prover = Prover()
+        for clause in clauses:
+            prover.add(clause)
+        self.assertTrue(prover.run())
+
+    def test_portfolio(self):
+        x = Variable('x')
+        axioms = [
+            ForAll(x, Implies(Predicate('Man', x), Predicate('Mortal', x))),
+            Predicate('Man', 'socrates'),
+        ]
+        result = prove_portfolio(axioms, Predicate('Mortal', 'socrates'))
+        self.assertTrue(result)
+        self.assertIn(result.strategy, STRATEGIES)
+        self.assertEqual(
+            sum(1 for c in result.proof() if c.rule == 'negated goal'), 1
+        )
+        result = prove_portfolio(
+            axioms, Predicate('Mortal', 'zeus'), processes=2
+        )
+        self.assertEqual(result.status, Result.SATURATED)
+
+
+class TestKnowledge(unittest.TestCase):
+    def test_query(self):
+        x = Variable('x')
+        rule = ForAll(x, Implies(Predicate('Man', x), Predicate('Mortal', x)))
+        kb = KnowledgeBase([rule], presaturation=10)
+        goal = Predicate('Mortal', 'socrates')
+        self.assertEqual(kb.query(goal).status, Result.SATURATED)
+        fact = kb.add(Predicate('Man', 'socrates'))
+        result = kb.query(goal)
+        self.assertTrue(result)
+        self.assertIs(kb.query(goal), result)
+        self.assertEqual(kb.support(result.clause), set(kb.axioms))
+        # Retracting an axiom drops the proofs it supports
+        kb.add(Predicate('Man', 'plato'))
+        other = kb.query(Predicate('Mortal', 'plato'))
+        kb.retract(fact)
+        self.assertNotIn(fact, kb)
+        self.assertEqual(kb.query(goal).status, Result.SATURATED)
+        self.assertIs(kb.query(Predicate('Mortal', 'plato')), other)
+        kb.add(Not(Predicate('Mortal', 'plato')))
+        self.assertTrue(kb.query(Predicate('Mortal', 'zeus')))
+
+    def test_unknown(self):
+        axioms, goal = benchmarks.transitive_chain(2)
+        kb = KnowledgeBase(axioms, presaturation=0)
+        # Running out of inferences isn't cached
+        self.assertEqual(kb.query(goal, max_inferences=5).status,
+                         Result.UNKNOWN)
+        result = kb.query(goal, max_inferences=100000)
+        self.assertTrue(result)
+        self.assertIs(kb.query(goal, max_inferences=5), result)
+        # Neither is giving up after discarding heavy clauses
+        x = Variable('x')
+        f = lambda term: Function('F', term)
+        kb = KnowledgeBase([
+            Predicate('P', 'a'),
+            ForAll(x, Implies(Predicate('P', x), Predicate('P', f(x)))),
+        ], presaturation=0, max_weight=5)
+        goal = Predicate('P', f(f(f(f('a')))))
+        result = kb.query(goal)
+        self.assertEqual(result.status, Result.UNKNOWN)
+        self.assertEqual(result.budget, 'max_weight')
+        self.assertIsNone(kb.cache.get(goal))
+
+
+class TestService(unittest.TestCase):
+    def test_query(self):
+        x = Variable('x')
+        axioms = [
+            ForAll(x, Implies(Predicate('Man', x), Predicate('Mortal', x))),
+            Predicate('Man', 'socrates'),
+        ]
+        hard_axioms, hard_goal = benchmarks.transitive_chain(30)
+
+        async def run():
+            async with ProvingService(axioms, step=20) as service:
+                result = await service.query(Predicate('Mortal', 'socrates'))
+                self.assertTrue(result)
+                self.assertIsNone(result.budget)
+                for axiom in hard_axioms:
+                    await service.add(axiom)
+                result = await service.query(hard_goal, max_inferences=50)
+                self.assertEqual(result.status, Result.UNKNOWN)
+                self.assertEqual(result.budget, 'max_inferences')
+                self.assertGreaterEqual(result.inferences, 50)
+                self.assertIn('passive', result.stats)
+                result = await service.query(hard_goal, max_clauses=50)
+                self.assertEqual(result.budget, 'max_clauses')
+                # A hard query doesn't hold up easy ones, and stops when
+                # it's cancelled
+                hard = asyncio.ensure_future(service.query(
+                    hard_goal, max_inferences=None, timeout=60
+                ))
+                await asyncio.sleep(0)
+                self.assertTrue(
+                    await service.query(Predicate('Mortal', 'socrates'))
+                )
+                self.assertFalse(hard.done())
+                hard.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await hard
+                with self.assertRaises(TypeError):
+                    await service.query(hard_goal, memory=1)
+        asyncio.run(run())
+
+    def test_give_up(self):
+        axioms, _ = benchmarks.transitive_chain(6)
+        goal = Predicate('R', 'c6', 'c0')
+
+        async def run():
+            async with ProvingService(
+                    axioms, selection=(1, 4), max_passive=5,
+                    regenerate=False, literal_selection='negative',
+                    presaturation=0) as service:
+                return await asyncio.wait_for(service.query(goal), 60)
+        result = asyncio.run(run())
+        self.assertEqual(result.status, Result.UNKNOWN)
+        self.assertEqual(result.budget, 'max_passive')
+
+    def test_serve(self):
+        async def run():
+            async with ProvingService() as service:
+                server = await serve(service)
+                port = server.sockets[0].getsockname()[1]
+                reader, writer = await asyncio.open_connection(
+                    '127.0.0.1', port
+                )
+                requests = [
+                    {'id': 1, 'op': 'add', 'axiom': 'P(a)'},
+                    {'id': 2, 'op': 'query', 'goal': 'P(a)'},
+                    {'id': 3, 'op': 'magic'},
+                ]
+                for request in requests:
+                    writer.write(json.dumps(request).encode() + b'\n')
+                    await writer.drain()
+                    response = json.loads(await reader.readline())
+                    self.assertEqual(response['id'], request['id'])
+                    if request['op'] == 'query':
+                        self.assertEqual(response['status'], 'refutation')
+                    elif request['op'] == 'magic':
+                        self.assertIn('error', response)
+                writer.close()
+                await writer.wait_closed()
+                server.close()
+                await server.wait_closed()
+        asyncio.run(run())
+
+
+class TestOrdering(unittest.TestCase):
+    def test_kbo(self):
+        x, y = Variable('x'), Variable('y')
+        f, g = (lambda *a: Function('F', *a)), (lambda *a: Function('G', *a))
+        kbo = KBO(precedence={'G': 1})
+        self.assertEqual(kbo.compare(f(x), x), GREATER)
+        self.assertEqual(kbo.compare(x, f(f(x))), LESS)
+        self.assertEqual(kbo.compare(f(x), f(y)), INCOMPARABLE)
+        self.assertEqual(kbo.compare(f(x, 'a'), g(x)), GREATER)
+        # Same weight: the precedence decides, then the arguments
+        self.assertEqual(kbo.compare(g(x), f(x)), GREATER)
+        self.assertEqual(kbo.compare(f(g(x), x), f(f(x), x)), GREATER)
+        self.assertEqual(kbo.compare(f('a', 'b'), f('a', 'b')), EQUAL)
+        self.assertEqual(kbo.compare(f(x, y), f(y, x)), INCOMPARABLE)
+        self.assertEqual(kbo.summary(f(x, g(x)))[1], {x: 2})
+        deep = x
+        for _ in range(5000):
+            deep = f(deep)
+        self.assertEqual(kbo.compare(f(deep), deep), GREATER)
+        # Summaries only live as long as their terms
+        self.assertGreaterEqual(len(kbo.summaries), 5000)
+        del deep
+        self.assertLess(len(kbo.summaries), 100)
+        self.assertEqual(pickle.loads(pickle.dumps(kbo)).precedence,
+                         {'G': 1})
+        self.assertRaises(ValueError, lambda: KBO(weights={'F': 0}))
+        p = Predicate('P', f(x))
+        self.assertEqual(kbo.compare_literals(Not(p), p), GREATER)
+        self.assertEqual(
+            kbo.maximal([p, Predicate('P', x), Not(Predicate('Q', x))]), [p]
+        )
+
+    def test_ordered_resolution(self):
+        for literal_selection in Prover.LITERAL_SELECTIONS:
+            prover = Prover(ordering=KBO(), selection='lightest',
+                            literal_selection=literal_selection)
+            for axiom in benchmarks.pigeonhole(3):
+                for clause in clausify(axiom):
+                    prover.add(clause)
+            result = prover.run(1000)
+            self.assertTrue(result)
+        self.assertRaises(
+            ValueError, lambda: Prover(literal_selection='magic')
+        )
+
+
+class TestEquality(unittest.TestCase):
+    def test_rewriter(self):
+        x = Variable('x')
+        f, g = (lambda *a: Function('F', *a)), (lambda *a: Function('G', *a))
+        literal = Not(Predicate('P', f(g('a')), 'b'))
+        self.assertEqual(
+            {path: term for term, path in subterms(literal.content[0])},
+            {(0, ): f(g('a')), (0, 0): g('a'), (0, 0, 0): 'a', (1, ): 'b'}
+        )
+        self.assertEqual(replace(literal, (0, 0), 'c'),
+                         Not(Predicate('P', f('c'), 'b')))
+        rewriter = Rewriter()
+        # Rules are oriented by the ordering, whichever side is on the left
+        rules = [Clause([Equality(x, f(g(x)))]),
+                 Clause([Equality(g('a'), 'b')])]
+        for rule in rules:
+            self.assertTrue(rewriter.add(rule))
+        y = Variable('y')
+        self.assertFalse(rewriter.add(Clause([Equality(f(x), y)])))
+        used = set()
+        self.assertEqual(rewriter.normalize(f(g(g('a'))), used), 'b')
+        self.assertEqual(used, set(rules))
+        rewriter.remove(rules[1])
+        self.assertEqual(rewriter.normalize(f(g('a')), set()), 'a')
+
+    def test_prove(self):
+        x, y, z = Variable('x'), Variable('y'), Variable('z')
+        self.assertTrue(prove(
+            [Equality('a', 'b'), Equality('b', 'c'), Predicate('P', 'a')],
+            Predicate('P', 'c')
+        ))
+        self.assertTrue(prove([Equality('a', 'b')], Equality('b', 'a')))
+        self.assertTrue(prove(
+            [Or(Equality('a', 'b'), Equality('a', 'c')),
+             Not(Equality('a', 'b'))],
+            Equality('a', 'c')
+        ))
+        self.assertFalse(prove([Equality('a', 'b')], Equality('a', 'c')))
+        # Groups in which every element is its own inverse are commutative
+        m = lambda *a: Function('M', *a)
+        group = [
+            ForAll(x, Equality(m('e', x), x)),
+            ForAll(x, Equality(m(Function('I', x), x), 'e')),
+            ForAll(x, ForAll(y, ForAll(z, Equality(m(m(x, y), z),
+                                                   m(x, m(y, z)))))),
+            ForAll(x, Equality(m(x, x), 'e')),
+        ]
+        goal = ForAll(x, ForAll(y, Equality(m(x, y), m(y, x))))
+        prover = Prover(ordering=KBO(), selection='lightest', equality=True)
+        for axiom in group:
+            for clause in clausify(axiom):
+                prover.add(clause)
+        for clause in clausify(Not(goal)):
+            prover.add(Clause(clause, rule='negated goal'))
+        result = prover.run(2000)
+        self.assertTrue(result)
+        self.assertFalse(result.clause.literals)
+        clauses = ClauseArray(clauses=[[Not(Equality('b', m('a', 'b')))]])
+        self.assertEqual(clauses[0], [Not(Equality('b', m('a', 'b')))])
+
+
+class TestIndex(unittest.TestCase):
+    def test_retrieve(self):
+        x, y = Variable('x'), Variable('y')
+        f = Function('F', x)
+        terms = {
+            'var': x,
+            'fx': f,
+            'fa': Function('F', 'a'),
+            'ffa': Function('F', Function('F', 'a')),
+            'gxy': Function('G', x, y),
+            'gfa': Function('G', f, 'a'),
+            'a': 'a',
+        }
+        tree = DiscriminationTree()
+        for name, term in terms.items():
+            tree.insert(term, name)
+        self.assertEqual(len(tree), len(terms))
+        self.assertEqual(
+            set(tree.unifiable(Function('F', 'a'))),
+            {'var', 'fx', 'fa'}
+        )
+        self.assertEqual(
+            set(tree.unifiable(Function('G', 'b', y))),
+            {'var', 'gxy'}
+        )
+        self.assertEqual(
+            set(tree.generalisations(Function('F', Function('F', 'a')))),
+            {'var', 'fx', 'ffa'}
+        )
+        self.assertEqual(
+            set(tree.instances(Function('F', y))),
+            {'fx', 'fa', 'ffa'}
+        )
+        self.assertEqual(set(tree.instances(y)), set(terms))
+        tree.remove(Function('F', 'a'), 'fa')
+        tree.remove(Function('F', 'a'), 'fa')
+        tree.remove(Function('F', 'b'), 'fb')
+        self.assertEqual(len(tree), len(terms) - 1)
+        self.assertEqual(
+            set(tree.unifiable(Function('F', 'a'))), {'var', 'fx'}
+        )
+        for name, term in terms.items():
+            tree.remove(term, name)
+        self.assertEqual(tree.root.children, {})
+
+    def test_literals(self):
+        x = Variable('x')
+        index = LiteralIndex()
+        happy, sad = Predicate('Happy', x), Predicate('Sad', 'a')
+        index.insert(happy, 1)
+        index.insert(Not(happy), 2)
+        index.insert(sad, 3)
+        self.assertEqual(set(index.unifiable(Predicate('Happy', 'a'))), {1})
+        self.assertEqual(set(index.unifiable(Not(happy))), {2})
+        self.assertEqual(set(index.instances(Predicate('Happy', 'a'))), set())
+        self.assertEqual(set(index.generalisations(sad)), {3})
+        self.assertEqual(
+            set(index.unifiable(Predicate('Sad', 'a', 'b'))), set()
+        )
+
+
+class TestBatch(unittest.TestCase):
+    def test_unifiers(self):
+        x, y, z = Variable('x'), Variable('y'), Variable('z')
+        f = lambda *a: Function('F', *a)
+        literals = [
+            Predicate('P', f(x), 'a'),
+            Predicate('P', y, 'b'),
+            Predicate('P', f(f(z)), z),
+            Not(Predicate('P', f('a'), 'a')),
+            Predicate('Q', f('a'), 'a'),
+            Predicate('P', 'a', 'a'),
+            Predicate('P', f('a')),
+        ]
+        v = Variable('v')
+        query = Predicate('P', f(v), 'a')
+        backends = ['array'] if batch.numpy is None else LiteralBatch.BACKENDS
+        for backend in backends:
+            literals_batch = LiteralBatch(literals, backend)
+            self.assertEqual(len(literals_batch), len(literals))
+            self.assertEqual(literals_batch.candidates(query), [0, 2])
+            unifiers = literals_batch.unifiers(query)
+            self.assertEqual([i for i, _ in unifiers], [0, 2])
+            for i, unifier in unifiers:
+                self.assertEqual(query.substitute(unifier),
+                                 literals[i].substitute(unifier))
+            self.assertEqual(unifiers[1][1][v], f('a'))
+            self.assertEqual(literals_batch.candidates(Predicate('R', v)), [])
+            self.assertEqual(
+                literals_batch.candidates(Not(Predicate('P', v, 'a'))), [3]
+            )
+        self.assertRaises(ValueError, lambda: LiteralBatch(backend='magic'))
+
+
+class TestSubsumption(unittest.TestCase):
+    def test_subsumes(self):
+        x, y = Variable('x'), Variable('y')
+        p, q = (lambda *a: Predicate('P', *a)), (lambda *a: Predicate('Q', *a))
+        self.assertTrue(subsumes([p(x)], [p('a'), q('b')]))
+        self.assertTrue(subsumes([p(x), Not(q(x))], [Not(q('a')), p('a')]))
+        self.assertFalse(subsumes([p(x), Not(q(x))], [Not(q('a')), p('b')]))
+        self.assertFalse(subsumes([p(x)], [Not(p('a'))]))
+        self.assertTrue(subsumes([p(x, y)], [p(y, x)]))
+        self.assertFalse(subsumes([p(x, x)], [p(x, y)]))
+        # Multiset subsumption: no clause subsumes its own factors
+        self.assertFalse(subsumes([p(x), p(y)], [p('a')]))
+        self.assertTrue(subsumes([p(x), p(y)], [p('a'), p('b')]))
+        # Shared subterms with Variables still have to map consistently
+        f = lambda *a: Function('F', *a)
+        self.assertTrue(subsumes([p(f(x), x)], [p(f(x), x)]))
+        self.assertFalse(subsumes([p(f(x), x)], [p(f(x), y)]))
+        self.assertTrue(subsumes([p(f(x), y)], [p(f(x), x)]))
+
+    def test_index(self):
+        x = Variable('x')
+        clauses = {
+            'px': Clause([Predicate('P', x)]),
+            'pa_qa': Clause([Predicate('P', 'a'), Predicate('Q', 'a')]),
+            'pfa': Clause([Predicate('P', Function('F', 'a'))]),
+            'qx': Clause([Not(Predicate('Q', x))]),
+        }
+        names = {clause: name for name, clause in clauses.items()}
+        index = SubsumptionIndex()
+        for clause in clauses.values():
+            index.insert(clause)
+        self.assertEqual(
+            {names[c] for c in index.subsumed(clauses['px'])},
+            {'pa_qa', 'pfa'}
+        )
+        self.assertEqual(
+            {names[c] for c in index.subsuming(clauses['pfa'])}, {'px'}
+        )
+        self.assertEqual(list(index.subsuming(clauses['qx'])), [])
+        self.assertGreater(index.stats['pruned'], 0)
+        self.assertEqual(index.stats['subsumed'], 3)
+        # The clauses after the first subsuming one are never looked at
+        pruned = index.stats['pruned']
+        self.assertIsNotNone(next(index.subsuming(clauses['pfa']), None))
+        self.assertEqual(index.stats['pruned'], pruned)
+        index.remove(clauses['px'])
+        self.assertEqual(list(index.subsuming(clauses['pfa'])), [])
+        self.assertNotIn(clauses['px'], index)
+        # Only the most specific literal of a clause is indexed
+        clauses['px_qa'] = Clause([Predicate('P', x), Predicate('Q', 'a')])
+        names[clauses['px_qa']] = 'px_qa'
+        index.insert(clauses['px_qa'])
+        specific = Clause([
+            Predicate('Q', 'a'), Predicate('P', 'b'), Predicate('R', 'c')
+        ])
+        self.assertEqual(
+            {names[c] for c in index.subsuming(specific)}, {'px_qa'}
+        )
+        index.remove(clauses['px_qa'])
+        self.assertEqual(list(index.subsuming(specific)), [])
+
+    def test_prover(self):
+        x, y, z = Variable('x'), Variable('y'), Variable('z')
+        r = lambda *a: Predicate('R', *a)
+        prover = Prover()
+        prover.add(Clause([Not(r(x, y)), Not(r(y, z)), r(x, z)]))
+        for i in range(2):
+            prover.add(Clause([r('c' + str(i), 'c' + str(i + 1))]))
+        prover.add(Clause([Not(r('c0', 'c2'))]))
+        self.assertTrue(prover.run())
+        self.assertGreater(prover.discarded, 0)
+
+
+class TestCompact(unittest.TestCase):
+    def test_roundtrip(self):
+        x, y = Variable('x'), Variable('y')
+        clause = frozenset((
+            Predicate('P', Function('F', x), 'a', Function('K')),
+            Not(Predicate('Q', x, Function('G', y, Function('F', 'b')))),
+            Predicate('R'),
+        ))
+        clauses = ClauseArray(clauses=[clause, [Not(Predicate('R'))], []])
+        self.assertEqual(len(clauses), 3)
+        decoded = clauses[0]
+        self.assertTrue(subsumes(decoded, clause))
+        self.assertTrue(subsumes(clause, decoded))
+        self.assertEqual(set(decoded) & clause, {Predicate('R')})
+        self.assertEqual(clauses[1], [Not(Predicate('R'))])
+        self.assertEqual(clauses[-1], [])
+        # Variants encode the same, so they can be compared without decoding
+        clauses.append(decoded)
+        self.assertEqual(clauses.raw(0), clauses.raw(3))
+        self.assertNotEqual(clauses.raw(0), clauses.raw(1))
+
+    def test_signature(self):
+        signature = Signature()
+        clauses = ClauseArray(signature)
+        clauses.append([Predicate('P', 'a'), Not(Predicate('P', 'b'))])
+        clauses.append([Predicate('P', Function('a'))])
+        self.assertEqual(len(signature), 4)
+        copy = ClauseArray(Signature(signature.symbols))
+        copy.data, copy.offsets = clauses.data, clauses.offsets
+        self.assertEqual(list(copy), list(clauses))
+        copy = pickle.loads(pickle.dumps(clauses))
+        self.assertEqual(copy.signature.numbers, signature.numbers)
+        self.assertEqual(list(copy), list(clauses))
+
+    def test_slots(self):
+        x = Variable('x')
+        happy = Predicate('Happy', x)
+        for obj in (x, Function('F', x), Not(happy), And(happy, Not(happy)),
+                    ForAll(x, happy), Clause([happy])):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+
+class TestPreprocess(unittest.TestCase):
+    def test_steps(self):
+        x, y = Variable('x'), Variable('y')
+        P, Q, R = (lambda *a: Predicate('P', *a)), \
+            (lambda *a: Predicate('Q', *a)), (lambda *a: Predicate('R', *a))
+        clauses = [
+            Clause([P(x), Not(P(x))]),
+            Clause([P('a'), Q(x)]),
+            Clause([P('a'), Q(x)]),
+            # R is pure, and then Q is
+            Clause([R(x), Not(Q(x))]),
+            Clause([P(x)]),
+            Clause([Not(P('b')), P(y)]),
+        ]
+        kept, report = preprocess(clauses)
+        self.assertEqual(kept, [clauses[4]])
+        self.assertEqual(report, {
+            'tautologies': 1, 'duplicates': 1, 'pure': 2, 'units': 1,
+            'simplified': 0, 'subsumption': 0,
+        })
+        with self.assertRaises(ValueError):
+            preprocess(clauses, ('simplification', ))
+        # Units cut the complements of their instances, until none is left
+        clauses = [
+            Clause([P(x)]),
+            Clause([Not(P('a')), Q('a')]),
+            Clause([Not(Q('a')), R('a'), Not(P('b'))]),
+            Clause([Not(R(y))]),
+        ]
+        kept, report = preprocess(clauses, ('units', ))
+        self.assertEqual(len(kept), 4)
+        self.assertEqual(report, {'units': 0, 'simplified': 2})
+        self.assertEqual(kept[1].literals, {Q('a')})
+        self.assertEqual(kept[1].parents, (clauses[1], clauses[0]))
+        self.assertEqual(kept[2].rule, 'unit simplification')
+        self.assertFalse(kept[2].literals)
+        # Of variants only the first is kept
+        kept, report = preprocess(
+            [Clause([P(x), Q(x)]), Clause([Q(y), P(y)]), Clause([P(y)])],
+            ('subsumption', )
+        )
+        self.assertEqual(len(kept), 1)
+        self.assertEqual(report, {'subsumption': 2})
+
+    def test_relevance(self):
+        x = Variable('x')
+        chain = [
+            Implies(Predicate('P{}'.format(i), x),
+                    Predicate('P{}'.format(i + 1), x))
+            for i in range(4)
+        ]
+        noise = [
+            Implies(Predicate('Q{}'.format(i), x),
+                    Predicate('Q{}'.format(i + 1), x))
+            for i in range(20)
+        ]
+        axioms = [ForAll(x, axiom) for axiom in chain + noise]
+        axioms.append(Predicate('P0', 'a'))
+        goal = Predicate('P4', 'a')
+        clauses = [
+            Clause(literals) for axiom in axioms
+            for literals in clausify(axiom)
+        ] + [Clause([Not(goal)], rule='negated goal')]
+        kept, report = preprocess(clauses, ('relevance', ))
+        self.assertEqual(len(kept), 6)
+        self.assertEqual(report, {'relevance': 20})
+        # Two steps from the goal reach P3 and P0, but not P2 nor P1
+        kept, _ = preprocess(clauses, ('relevance', ), depth=2)
+        self.assertEqual(len(kept), 5)
+        result = prove(axioms, goal, preprocessing=STEPS + ('relevance', ))
+        self.assertTrue(result)
+        self.assertEqual(result.preprocessing['relevance'], 20)
+        # Without the filter this would saturate
+        result = prove(axioms[:-1], goal,
+                       preprocessing=STEPS + ('relevance', ))
+        self.assertEqual(result.status, Result.UNKNOWN)
+        self.assertEqual(prove(axioms[:-1], goal).status, Result.SATURATED)
+
+
+class TestStore(unittest.TestCase):
+    def test_clauses(self):
+        x = Variable('x')
+        clauses = ClauseArray(clauses=[
+            [Predicate('P', Function('F', x), 'a'), Not(Predicate('Q', x))],
+            [Not(Equality('a', 'b'))],
+            [],
+        ])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'clauses')
+            for written in (list(clauses), clauses):
+                write_clauses(path, written)
+                with ClauseStore(path) as store:
+                    self.assertEqual(len(store), 3)
+                    self.assertEqual(store[1], [Not(Equality('a', 'b'))])
+                    self.assertEqual(store[-1], [])
+                    self.assertEqual(len(store[0]), 2)
+            # A ClauseArray is stored as is
+            write_clauses(path, clauses)
+            with ClauseStore(path) as store:
+                self.assertEqual(store.raw(0), clauses.raw(0))
+                self.assertRaises(ValueError, store.prover)
+            with open(path, 'wb') as f:
+                f.write(b'not a store')
+            self.assertRaises(ValueError, lambda: ClauseStore(path))
+
+    def test_checkpoint(self):
+        prover = Prover(selection='lightest', ordering=KBO({'P': 1}))
+        for axiom in benchmarks.pigeonhole(3):
+            for clause in clausify(axiom):
+                prover.add(clause)
+        self.assertFalse(prover.run(20))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint')
+            checkpoint(prover, path)
+            restored = restore(path)
+        self.assertEqual(restored.inferences, prover.inferences)
+        self.assertEqual(restored.too_heavy, prover.too_heavy)
+        self.assertEqual(restored.ordering.precedence, {'P': 1})
+        self.assertEqual(len(restored.active), len(prover.active))
+        self.assertEqual(
+            sorted(len(clause) for clause in restored.clauses()),
+            sorted(len(clause) for clause in prover.clauses())
+        )
+        result = restored.run(1000)
+        self.assertTrue(result)
+        # The proof still goes back to the input clauses
+        self.assertIn('input', {clause.rule for clause in result.proof()})
+
+
+class TestTPTP(unittest.TestCase):
+    PROBLEM = """
+        % Socrates
+        fof(man, axiom, ! [X] : (man(X) => mortal(X))).
+        fof(socrates, axiom, man(socrates)).
+        /* a block
+           comment */
+        cnf(c, axiom, ~ p(X, f(Y)) | 'Q'(Y), file('x', y)).
+        fof(goal, conjecture, ? [X] : mortal(X)).
+    """
+
+    def test_statements(self):
+        statements = parse_tptp(self.PROBLEM)
+        self.assertEqual(
+            [(s.language, s.name, s.role) for s in statements],
+            [('fof', 'man', 'axiom'), ('fof', 'socrates', 'axiom'),
+             ('cnf', 'c', 'axiom'), ('fof', 'goal', 'conjecture')]
+        )
+        man = statements[0].sentence
+        x = man.name
+        self.assertEqual(
+            man,
+            ForAll(x, Implies(Predicate('man', x), Predicate('mortal', x)))
+        )
+        c = statements[2].sentence
+        x, y = c.name, c.content[0].name
+        self.assertEqual(c, ForAll(x, ForAll(y, Or(
+            Not(Predicate('p', x, Function('f', y))), Predicate('Q', y)
+        ))))
+        axioms, goal = problem(statements)
+        self.assertEqual(len(axioms), 3)
+        self.assertTrue(prove(axioms, goal))
+
+    def test_streaming(self):
+        parser = Parser(Tokens(io.StringIO(self.PROBLEM), chunk_size=3))
+        # The order in which And and Or print their content may differ
+        self.assertEqual(
+            [sorted(repr(s)) for s in parser.statements()],
+            [sorted(repr(s)) for s in parse_tptp(self.PROBLEM)]
+        )
+
+    def test_connectives(self):
+        p, q = Predicate('p'), Predicate('q')
+        x = Variable('X')
+        for source, expected in [
+                ('p & q & p', And(p, q)),
+                ('p | (q)', Or(p, q)),
+                ('p <= q', Implies(q, p)),
+                ('p <~> q', Not(IFF(p, q))),
+                ('~p ~| q', Not(Or(Not(p), q))),
+                ('a = b', Equality('a', 'b')),
+                ('a != f(b)', Not(Equality('a', Function('f', 'b')))),
+        ]:
+            statement, = parse_tptp('fof(f, axiom, {}).'.format(source))
+            self.assertEqual(statement.sentence, expected)
+        statement, = parse_tptp('fof(f, axiom, ? [X, Y] : r(Y, X)).')
+        x = statement.sentence.name
+        y = statement.sentence.content[0].name
+        self.assertEqual(
+            statement.sentence, Exists(x, Exists(y, Predicate('r', y, x)))
+        )
+        self.assertRaises(ValueError, parse_tptp, 'fof(f, axiom, $true).')
+        self.assertRaises(ValueError, parse_tptp, 'fof(f, axiom, p & ).')
+        self.assertRaises(ValueError, parse_tptp, 'thf(f, axiom, p).')
+
+    def test_include(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'axioms.ax'), 'w') as axioms:
+                axioms.write('fof(a, axiom, p).')
+            statements = parse_tptp(
+                "include('axioms.ax').\nfof(b, conjecture, p).", directory
+            )
+        self.assertEqual([s.name for s in statements], ['a', 'b'])
+
+    def test_repr(self):
+        x, y = Variable('x'), Variable('y')
+        sentence = ForAll(x, Exists(y, IFF(
+            Predicate('P', x, Function('F', y, 'a')),
+            Not(Or(Predicate('Q'), Implies(
+                Predicate('R', y), And(Predicate('S', x), Predicate('T', x))
+            )))
+        )))
+        parsed = parse_formula(repr(sentence))
+        x, y = parsed.name, parsed.content[0].name
+        self.assertEqual(parsed, ForAll(x, Exists(y, IFF(
+            Predicate('P', x, Function('F', y, 'a')),
+            Not(Or(Predicate('Q'), Implies(
+                Predicate('R', y), And(Predicate('S', x), Predicate('T', x))
+            )))
+        ))))
+        # Free variables with the same name are the same Variable
+        formulas = list(read_formulas(io.StringIO(
+            "% comment\n\n(P($x) ∨ ¬Q(F($x)))\nP($x)\n"
+        )))
+        self.assertEqual(len(formulas), 2)
+        x, = formulas[0].free_variables()
+        self.assertEqual(formulas[0], Or(
+            Predicate('P', x), Not(Predicate('Q', Function('F', x)))
+        ))
+        self.assertIsNot(formulas[1].free_variables().pop(), x)
+        self.assertRaises(ValueError, parse_formula, '(P() ? Q())')
+
+
+class TestInterning(unittest.TestCase):
+    def test_identity(self):
+        x = Variable('x')
+        self.assertIs(
+            Predicate('Happy', Function('F', x)),
+            Predicate('Happy', Function('F', x))
+        )
+        self.assertIsNot(
+            Predicate('Happy', Variable('x')),
+            Predicate('Happy', Variable('x'))
+        )
+        happy, angry = Predicate('Happy', x), Predicate('Angry', x)
+        self.assertIs(And(happy, angry), And(angry, happy))
+        self.assertIsNot(And(happy, angry), Or(happy, angry))
+        self.assertIs(ForAll(x, Not(happy)), ForAll(x, Not(happy)))
+
+    def test_hash(self):
+        x = Variable('x')
+        happy = Predicate('Happy', Function('F', x))
+        self.assertEqual(
+            hash(happy), hash(Predicate('Happy', Function('F', x)))
+        )
+        self.assertEqual(len({happy, Predicate('Happy', Function('F', x))}), 1)
+
+    def test_copies(self):
+        x = Variable('x')
+        sent = ForAll(x, IFF(Predicate('Happy', x), Not(Predicate('Sad', x))))
+        self.assertIs(sent.copy(), sent)
+        self.assertIs(copy.copy(sent), sent)
+        # Pickling keeps Variables apart, but the result is interned too
+        loaded = pickle.loads(pickle.dumps(sent))
+        y = loaded.name
+        self.assertIsNot(y, x)
+        self.assertIs(
+            loaded,
+            ForAll(y, IFF(Predicate('Happy', y), Not(Predicate('Sad', y))))
+        )
+        self.assertIs(
+            pickle.loads(pickle.dumps(Predicate('Happy', Function('F', 'a')))),
+            Predicate('Happy', Function('F', 'a'))
+        )
+
+    def test_summary(self):
+        x, y = Variable('x'), Variable('y')
+        term = Function('F', Function('G', x), 'a')
+        self.assertEqual(sentence.summary(term)[:2], (3, 4))
+        self.assertFalse(term.is_ground())
+        self.assertTrue(Function('G', 'a').is_ground())
+        self.assertIn(x, term)
+        self.assertNotIn(y, term)
+        self.assertIn(Function('G', x), term)
+        self.assertNotIn(Function('G', 'a'), term)
+        self.assertNotIn('b', term)
+        sent = ForAll(x, And(Predicate('P', x, y), Predicate('Q', term)))
+        self.assertTrue(sent.is_free(y))
+        self.assertFalse(sent.is_free(x))
+        self.assertIn(x, sent)
+        self.assertEqual(sent.free_variables(), {y})
+        self.assertEqual(sent.content[0].free_variables(), {x, y})
+        # Ground objects only unify with themselves, and never with
+        # deeper objects or ones with other symbols
+        self.assertFalse(may_unify(Function('G', 'a'), Function('G', 'b')))
+        self.assertFalse(may_unify(term, Function('F', 'b', 'a')))
+        self.assertFalse(may_unify(Function('F', x, x), Function('F', 'a')))
+        self.assertTrue(may_unify(term, Function('F', y, 'a')))
+        self.assertTrue(
+            may_unify(term, Function('F', Function('G', 'b'), 'a'))
+        )
+        self.assertIsNone(unify(term, Function('F', Function('G', 'b'), 'b')))
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_generators(self):
+        self.assertTrue(prove(benchmarks.pigeonhole(2)))
+        self.assertTrue(prove(*benchmarks.transitive_chain(2)))
+        left, right = benchmarks.variable_chain(20)
+        self.assertIsNotNone(unify(left, right))
+        left, right = benchmarks.wide_term(3, 3)
+        self.assertIsNotNone(unify(left, right))
+        sentence = benchmarks.nested_quantifiers(6)
+        self.assertEqual(len(sentence.cnf().content), 7)
+
+    def test_suite(self):
+        results = benchmarks.run_suite(['unify_chain'], [5, 10], repeat=3)
+        self.assertEqual(set(results), {'unify_chain/5', 'unify_chain/10'})
+        stats = results['unify_chain/5']
+        self.assertEqual(stats['runs'], 3)
+        self.assertLessEqual(stats['p50'], stats['p99'])
+        self.assertLessEqual(stats['p99'], stats['max'])
+        self.assertGreater(stats['peak_memory'], 0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            benchmarks.save(results, path)
+            self.assertEqual(benchmarks.load(path), results)
+        slower = {key: dict(value, p50=value['p50'] * 2)
+                  for key, value in results.items()}
+        self.assertEqual(benchmarks.compare(results, results), [])
+        self.assertEqual(
+            [(key, metric) for key, metric, _, _ in
+             benchmarks.compare(results, slower)],
+            [('unify_chain/10', 'p50'), ('unify_chain/5', 'p50')]
+        )
+
+
+class TestInstrument(unittest.TestCase):
+    def test_disabled(self):
+        self.assertIsNone(instrument.current)
+        self.assertTrue(prove([Predicate('P'), Not(Predicate('P'))]))
+        self.assertIsNone(instrument.current)
+
+    def test_collecting(self):
+        x = Variable('x')
+        events = []
+        axioms = [
+            ForAll(x, Implies(Predicate('Man', x), Predicate('Mortal', x))),
+            Predicate('Man', 'socrates'),
+        ]
+        with instrument.collecting() as stats:
+            stats.callbacks.append(lambda name, value: events.append(name))
+            self.assertIs(instrument.current, stats)
+            self.assertTrue(prove(axioms, Predicate('Mortal', 'socrates')))
+            axioms[0].cnf()
+            self.assertIsNone(unify(Predicate('P', 'a'), Predicate('P', 'b')))
+            Substitution({x: Function('F', 'a')})
+        self.assertIsNone(instrument.current)
+        counters = stats.counters
+        self.assertGreaterEqual(counters['unify.success'], 1)
+        self.assertGreaterEqual(counters['unify.failure'], 1)
+        self.assertGreaterEqual(counters['compress.iterations'], 1)
+        self.assertGreaterEqual(counters['clauses.kept'], 3)
+        self.assertGreaterEqual(counters['clauses.generated'], 1)
+        self.assertEqual(
+            set(stats.timers),
+            {'cnf.' + phase for phase in (
+                'simplified', 'negated_inwards', 'skolemised', 'cleaned',
+                'distributed', 'clauses'
+            )} | {'preprocess.' + step for step in STEPS}
+        )
+        self.assertEqual(
+            events.count('unify.success'), counters['unify.success']
+        )
+        stats.reset()
+        self.assertFalse(stats.counters)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,393 @@
+import io
+import os
+import re
+import sys
+
+from sentence import (
+    Variable, Function, Predicate, Equality, Not, And, Or, IFF, Implies,
+    ForAll, Exists
+)
+
+TOKEN = re.compile(r"""
+    (?P<space>\s+|%[^\n]*|/\*.*?\*/)
+    |(?P<quoted>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    |(?P<word>\$?\$?\w+)
+    |(?P<symbol><=>|<~>|=>|<=|~\||~&|!=|[!?~&|=:,()\[\].∀∃∧∨¬])
+""", re.VERBOSE | re.DOTALL)
+
+# TPTP connectives that take exactly two formulas
+BINARY = {
+    '<=>': IFF,
+    '=>': Implies,
+    '<=': lambda left, right: Implies(right, left),
+    '<~>': lambda left, right: Not(IFF(left, right)),
+    '~|': lambda left, right: Not(Or(left, right)),
+    '~&': lambda left, right: Not(And(left, right)),
+}
+
+# Connectives in the notation of Sentence.__repr__
+CONNECTIVES = {
+    '∧': And,
+    '∨': Or,
+    '<=>': IFF,
+    '=>': Implies,
+}
+
+QUANTIFIERS = {
+    '!': ForAll,
+    '?': Exists,
+    '∀': ForAll,
+    '∃': Exists,
+}
+
+
+class Tokens(object):
+    """
+    The tokens in a text stream, which is read in chunks of chunk_size
+    characters, so only the unread part of the current token is kept in
+    memory.
+    """
+
+    def __init__(self, stream, chunk_size=1 << 16):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.line = 1
+        self.peeked = None
+
+    def _read(self):
+        while True:
+            match = TOKEN.match(self.buffer, self.pos)
+            if not self.eof and \
+                    (match is None or match.end() == len(self.buffer)):
+                # The token might continue in the next chunk
+                chunk = self.stream.read(self.chunk_size)
+                self.eof = not chunk
+                self.buffer = self.buffer[self.pos:] + chunk
+                self.pos = 0
+                continue
+            if match is None:
+                if self.pos == len(self.buffer):
+                    return None
+                raise self.error(
+                    "Unexpected {!r}".format(self.buffer[self.pos])
+                )
+            self.pos = match.end()
+            self.line += match.group().count('\n')
+            if match.lastgroup != 'space':
+                return match.lastgroup, match.group()
+
+    def peek(self):
+        """Get the next token without consuming it, or None at the end"""
+        if self.peeked is None:
+            self.peeked = self._read()
+        return self.peeked
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise self.error("Unexpected end of input")
+        self.peeked = None
+        return token
+
+    def accept(self, text):
+        """Consume the next token if it is text, and return whether it was"""
+        token = self.peek()
+        if token is not None and token[1] == text:
+            self.peeked = None
+            return True
+        return False
+
+    def expect(self, text):
+        if not self.accept(text):
+            token = self.peek()
+            raise self.error("Expected {!r} but got {!r}".format(
+                text, token[1] if token else 'end of input'
+            ))
+
+    def error(self, message):
+        return ValueError("Line {}: {}".format(self.line, message))
+
+
+class Statement(object):
+    """
+    An annotated formula from a TPTP file: its language ('fof' or 'cnf'),
+    name, role and Sentence.
+    """
+    __slots__ = ('language', 'name', 'role', 'sentence')
+
+    def __init__(self, language, name, role, sentence):
+        self.language = language
+        self.name = name
+        self.role = role
+        self.sentence = sentence
+
+    def __repr__(self):
+        return "{}({}, {}, {})".format(
+            self.language, self.name, self.role, self.sentence
+        )
+
+
+class Parser(object):
+    """
+    A recursive descent parser for first order formulas in TPTP FOF and CNF
+    syntax, and in the notation of Sentence.__repr__.
+
+    Symbol names are interned. Variables are scoped by their quantifiers;
+    free Variables with the same name within one formula are the same
+    Variable.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.scopes = []
+        self.free = {}
+
+    def variable(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        variable = self.free.get(name)
+        if variable is None:
+            variable = self.free[name] = Variable(name)
+        return variable
+
+    def name(self):
+        kind, text = self.tokens.next()
+        if kind == 'quoted':
+            text = text[1:-1]
+        elif kind != 'word':
+            raise self.tokens.error("Expected a name, got {!r}".format(text))
+        return sys.intern(text)
+
+    def arguments(self, term):
+        """Parse the arguments after a name, if there are any"""
+        arguments = []
+        if self.tokens.accept('('):
+            if not self.tokens.accept(')'):
+                arguments.append(term())
+                while self.tokens.accept(','):
+                    arguments.append(term())
+                self.tokens.expect(')')
+            return arguments
+        return None
+
+    def closed(self, sentence):
+        """Universally quantify the free Variables of sentence"""
+        for variable in reversed(list(self.free.values())):
+            sentence = ForAll(variable, sentence)
+        self.free = {}
+        return sentence
+
+    # TPTP
+
+    def statements(self, directory=None):
+        """
+        Parse TPTP statements one at a time. Included files are looked up in
+        directory, which defaults to the TPTP environment variable.
+        """
+        while self.tokens.peek() is not None:
+            language = self.name()
+            self.tokens.expect('(')
+            if language == 'include':
+                path = self.name()
+                self.skip()
+                self.tokens.expect('.')
+                if directory is None:
+                    directory = os.environ.get('TPTP', os.curdir)
+                with open(os.path.join(directory, path)) as included:
+                    yield from read_tptp(included, directory)
+                continue
+            if language not in ('fof', 'cnf'):
+                raise self.tokens.error(
+                    "Unsupported language {!r}".format(language)
+                )
+            name = self.name()
+            self.tokens.expect(',')
+            role = self.name()
+            self.tokens.expect(',')
+            sentence = self.closed(self.tptp_formula())
+            self.skip()
+            self.tokens.expect('.')
+            yield Statement(language, name, role, sentence)
+
+    def skip(self):
+        """Skip annotations, up to the closing parenthesis"""
+        depth = 1
+        while depth:
+            text = self.tokens.next()[1]
+            if text in ('(', '['):
+                depth += 1
+            elif text in (')', ']'):
+                depth -= 1
+
+    def tptp_formula(self):
+        left = self.tptp_unit()
+        token = self.tokens.peek()
+        text = token[1] if token else None
+        if text in ('&', '|'):
+            formulas = [left]
+            while self.tokens.accept(text):
+                formulas.append(self.tptp_unit())
+            return (And if text == '&' else Or)(*formulas)
+        elif text in BINARY:
+            self.tokens.next()
+            return BINARY[text](left, self.tptp_unit())
+        return left
+
+    def tptp_unit(self):
+        tokens = self.tokens
+        if tokens.accept('('):
+            formula = self.tptp_formula()
+            tokens.expect(')')
+            return formula
+        elif tokens.accept('~'):
+            return Not(self.tptp_unit())
+        text = tokens.peek()[1] if tokens.peek() else None
+        if text in ('!', '?'):
+            tokens.next()
+            tokens.expect('[')
+            variables = [Variable(self.name())]
+            while tokens.accept(','):
+                variables.append(Variable(self.name()))
+            tokens.expect(']')
+            tokens.expect(':')
+            self.scopes.append({x.name: x for x in variables})
+            formula = self.tptp_unit()
+            self.scopes.pop()
+            for variable in reversed(variables):
+                formula = QUANTIFIERS[text](variable, formula)
+            return formula
+        return self.tptp_atom()
+
+    def tptp_atom(self):
+        left = self.tptp_term()
+        if self.tokens.accept('='):
+            return Equality(left, self.tptp_term())
+        elif self.tokens.accept('!='):
+            return Not(Equality(left, self.tptp_term()))
+        elif isinstance(left, Function):
+            return Predicate(left.name, *left.content)
+        elif isinstance(left, Variable):
+            raise self.tokens.error("Variable {} used as formula".format(left))
+        elif left in ('$true', '$false'):
+            raise self.tokens.error("{} is not supported".format(left))
+        return Predicate(left)
+
+    def tptp_term(self):
+        kind = self.tokens.peek()[0]
+        name = self.name()
+        if kind == 'word' and (name[0].isupper() or name[0] == '_'):
+            return self.variable(name)
+        arguments = self.arguments(self.tptp_term)
+        if arguments:
+            return Function(name, *arguments)
+        return name
+
+    # Sentence.__repr__
+
+    def formula(self):
+        tokens = self.tokens
+        if tokens.accept('('):
+            formula = self.formula()
+            if tokens.accept(')'):
+                return formula
+            connective = tokens.next()[1]
+            if connective not in CONNECTIVES:
+                raise tokens.error(
+                    "Unknown connective {!r}".format(connective)
+                )
+            formulas = [formula, self.formula()]
+            while tokens.accept(connective):
+                formulas.append(self.formula())
+            tokens.expect(')')
+            return CONNECTIVES[connective](*formulas)
+        elif tokens.accept('¬'):
+            return Not(self.formula())
+        text = tokens.peek()[1] if tokens.peek() else None
+        if text in ('∀', '∃'):
+            tokens.next()
+            name = self.name()
+            if name[0] != '$':
+                raise tokens.error("Expected a variable, got {}".format(name))
+            variable = Variable(name[1:])
+            tokens.expect('[')
+            self.scopes.append({variable.name: variable})
+            formula = QUANTIFIERS[text](variable, self.formula())
+            self.scopes.pop()
+            tokens.expect(']')
+            return formula
+        if tokens.accept(Equality.NAME):
+            arguments = self.arguments(self.term)
+            if arguments is None or len(arguments) != 2:
+                raise tokens.error("Expected two terms to be equal")
+            return Equality(*arguments)
+        name = self.name()
+        arguments = self.arguments(self.term)
+        if arguments is None:
+            raise tokens.error("Expected arguments of {}".format(name))
+        return Predicate(name, *arguments)
+
+    def term(self):
+        name = self.name()
+        if name[0] == '$':
+            return self.variable(name[1:])
+        arguments = self.arguments(self.term)
+        if arguments is None:
+            return name
+        return Function(name, *arguments)
+
+
+def read_tptp(stream, directory=None):
+    """
+    Parse the statements in a TPTP file one at a time, following includes.
+    Free Variables are universally quantified.
+    """
+    return Parser(Tokens(stream)).statements(directory)
+
+
+def parse_tptp(text, directory=None):
+    """Parse all statements in a TPTP string"""
+    return list(read_tptp(io.StringIO(text), directory))
+
+
+def read_formulas(stream):
+    """
+    Parse formulas in the notation of Sentence.__repr__, one per line, one
+    line at a time. Empty lines and lines starting with % are skipped.
+    """
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('%'):
+            yield parse_formula(line)
+
+
+def parse_formula(text):
+    """Parse one formula in the notation of Sentence.__repr__"""
+    parser = Parser(Tokens(io.StringIO(text)))
+    formula = parser.formula()
+    if parser.tokens.peek() is not None:
+        raise parser.tokens.error(
+            "Unexpected {!r}".format(parser.tokens.peek()[1])
+        )
+    return formula
+
+
+def problem(statements):
+    """
+    Split TPTP statements into axioms and a goal, the conjunction of all
+    conjectures, or None if there are none.
+    """
+    axioms, conjectures = [], []
+    for statement in statements:
+        if statement.role == 'conjecture':
+            conjectures.append(statement.sentence)
+        else:
+            axioms.append(statement.sentence)
+    if not conjectures:
+        return axioms, None
+    elif len(conjectures) == 1:
+        return axioms, conjectures[0]
+    return axioms, And(*conjectures)
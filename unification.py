@@ -0,0 +1,183 @@
+import instrument
+import sentence
+import substitution as sub
+
+
+def unify(left, right, bindings=None):
+    """
+    Extend bindings to a most general unifier of two terms or literals.
+
+    Return the extended bindings, or None when there is no unifier, in which
+    case bindings are left as they were. Without bindings, new Bindings are
+    used.
+
+    This is the Martelli-Montanari algorithm on top of the union-find
+    Bindings: pairs of terms are taken from a stack, dereferenced and either
+    bound or decomposed. No intermediate Substitution is ever built. Instead
+    of checking occurrences at every binding, the bindings are checked for
+    cycles once at the end, which takes time linear in the size of the
+    bound terms. Until then, cyclic bindings can lead back to a pair of
+    terms that was already decomposed, so such pairs are skipped.
+    """
+    if bindings is None:
+        bindings = sub.Bindings()
+    if not may_unify(left, right):
+        if instrument.current is not None:
+            instrument.current.count('unify.failure')
+            instrument.current.count('unify.pruned')
+        return None
+    mark = bindings.mark()
+    bound = []
+    # The pairs of terms that were decomposed
+    decomposed = set()
+    stack = [(left, right)]
+    while stack:
+        left, right = stack.pop()
+        left, right = bindings.deref(left), bindings.deref(right)
+        if left is right:
+            continue
+        if isinstance(left, sentence.Variable):
+            bindings.bind(left, right)
+            if not isinstance(right, sentence.Variable):
+                bound.append(left)
+        elif isinstance(right, sentence.Variable):
+            bindings.bind(right, left)
+            bound.append(right)
+        elif isinstance(left, sentence.RecursiveObject):
+            if type(left) is not type(right) or \
+                    left.name != right.name or \
+                    len(left.content) != len(right.content) or \
+                    not isinstance(left.content, tuple):
+                break
+            if (left, right) in decomposed:
+                continue
+            decomposed.add((left, right))
+            stack.extend(zip(left.content, right.content))
+        elif isinstance(right, sentence.RecursiveObject) or left != right:
+            break
+    else:
+        if not bound or acyclic(bindings, bound):
+            if instrument.current is not None:
+                instrument.current.count('unify.success')
+            return bindings
+    bindings.undo(mark)
+    if instrument.current is not None:
+        instrument.current.count('unify.failure')
+    return None
+
+
+def may_unify(left, right):
+    """
+    Check the summaries of two terms or literals for a reason they can't
+    unify, in constant time. Get False if there is one, True otherwise.
+
+    Two ground objects only unify if they're the same. An object only
+    unifies with a ground one if it's no deeper or larger, and has no
+    symbols that one doesn't have.
+    """
+    if left is right:
+        return True
+    left_depth, left_size, left_symbols, left_variables = \
+        sentence.summary(left)
+    right_depth, right_size, right_symbols, right_variables = \
+        sentence.summary(right)
+    if not right_variables:
+        if not left_variables:
+            return left == right
+        return left_depth <= right_depth and left_size <= right_size and \
+            not left_symbols & ~right_symbols
+    if not left_variables:
+        return right_depth <= left_depth and right_size <= left_size and \
+            not right_symbols & ~left_symbols
+    return True
+
+
+def variables(term):
+    """Get all Variables that occur in a term"""
+    found, stack = [], [term]
+    while stack:
+        term = stack.pop()
+        if isinstance(term, sentence.Variable):
+            found.append(term)
+        elif isinstance(term, sentence.RecursiveObject):
+            stack.extend(term.content)
+    return found
+
+
+def acyclic(bindings, roots):
+    """
+    Check that none of the Variables in roots is bound to a term that,
+    after applying the bindings, contains that Variable itself.
+    """
+    done, path = set(), set()
+    for root in roots:
+        stack = [(bindings.find(root), False)]
+        while stack:
+            var, leaving = stack.pop()
+            if leaving:
+                path.discard(var)
+                done.add(var)
+                continue
+            if var in done:
+                continue
+            if var in path:
+                return False
+            path.add(var)
+            stack.append((var, True))
+            for occurring in variables(bindings.deref(var)):
+                occurring = bindings.find(occurring)
+                if bindings.deref(occurring) is not occurring:
+                    stack.append((occurring, False))
+    return True
+
+
+def mgu(left, right):
+    """
+    Get a most general unifier of two terms or literals as a Substitution, or
+    None if they don't unify.
+    """
+    bindings = unify(left, right)
+    if bindings is not None:
+        return bindings.substitution()
+
+
+_UNBOUND = object()
+
+
+def match(pattern, target, substitution=None):
+    """
+    Extend substitution, a dict, so that applying it to pattern gives target.
+
+    Return the extended substitution, or None when there is no such
+    substitution, in which case substitution is left as it was. Variables in
+    target are never bound, so pattern and target may share Variables.
+    """
+    if substitution is None:
+        substitution = {}
+    added = []
+    stack = [(pattern, target)]
+    while stack:
+        pattern, target = stack.pop()
+        if isinstance(pattern, sentence.Variable):
+            bound = substitution.get(pattern, _UNBOUND)
+            if bound is _UNBOUND:
+                substitution[pattern] = target
+                added.append(pattern)
+                continue
+            elif bound is target or bound == target:
+                continue
+        elif isinstance(pattern, sentence.RecursiveObject):
+            if pattern is target and pattern.is_ground():
+                continue
+            if type(pattern) is type(target) and \
+                    pattern.name == target.name and \
+                    len(pattern.content) == len(target.content):
+                stack.extend(zip(pattern.content, target.content))
+                continue
+        elif not isinstance(target, sentence.RecursiveObject) and \
+                pattern == target:
+            continue
+        for var in added:
+            del substitution[var]
+        return None
+    return substitution
@@ -1,6 +1,60 @@
+from collections import OrderedDict
+
+
 def forgiving_join(seperator, iterator):
     """
     A join function that is more forgiving about the type of objects the
     iterator returns.
     """
     return seperator.join(str(it) for it in iterator)
+
+
+class LRUCache(object):
+    """
+    A mapping that holds at most size items. When it's full, the least
+    recently used item is dropped. A size of 0 disables the cache.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        try:
+            value = self.items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __delitem__(self, key):
+        del self.items[key]
+
+    def __setitem__(self, key, value):
+        if self.size <= 0:
+            return
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def resize(self, size):
+        """Change the size, dropping the least recently used items"""
+        self.size = size
+        while len(self.items) > max(size, 0):
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+        self.hits = 0
+        self.misses = 0